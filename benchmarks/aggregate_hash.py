@@ -0,0 +1,96 @@
+"""Microbenchmark for hashing domain models.
+
+Compares the previous ``__hash__`` implementations, where ``Aggregate`` looked its
+primary key up in the pydantic JSON schema with pydash on every call, against the
+identity functions computed once per class in ``base_types.ModelMetadata``.
+
+Run with::
+
+    python -m benchmarks.aggregate_hash
+"""
+import timeit
+from typing import Any, Callable, Dict, List
+
+import pydash
+
+from benchmarks import domain_models
+from src.allocation.domain.model import aggregate
+
+_NUMBER = 100_000
+
+
+def _legacy_aggregate_hash(self: Any) -> int:
+    _properties = self.schema().get("properties")
+    _fields: List[str] = _properties.keys()
+    _filter: Callable[[str], bool] = (
+        lambda x: _properties[x].get("primary_key") is True
+    )
+    _pk: Any = pydash.collections.find(_fields, _filter)
+    return hash(self.__class__) + hash(_pk)
+
+
+def _legacy_entity_hash(self: Any) -> int:
+    return hash(self.__class__) + hash(self.id)
+
+
+def _legacy_value_object_hash(self: Any) -> int:
+    return hash((type(self),) + tuple(self.__dict__.values()))
+
+
+class _LegacyProduct(aggregate.Product):
+    ...
+
+
+class _LegacyBatch(domain_models.PydanticBatch):
+    ...
+
+
+class _LegacyOrderLine(domain_models.PydanticOrderLine):
+    ...
+
+
+# Set after class creation, domain models install their hash when subclassed
+setattr(_LegacyProduct, "__hash__", _legacy_aggregate_hash)
+setattr(_LegacyBatch, "__hash__", _legacy_entity_hash)
+setattr(_LegacyOrderLine, "__hash__", _legacy_value_object_hash)
+
+
+def _time(model: Any, number: int) -> float:
+    return min(timeit.repeat(lambda: hash(model), number=number, repeat=5)) / number
+
+
+def run(number: int = _NUMBER) -> Dict[str, Dict[str, float]]:
+    batch_fields: Dict[str, Any] = dict(
+        id="b1", sku="BENCH-SKU", purchased_quantity=10, eta=None
+    )
+    line_fields: Dict[str, Any] = dict(order_id="o1", sku="BENCH-SKU", qty=1)
+    cases = {
+        "Aggregate.__hash__": (
+            _LegacyProduct(sku="BENCH-SKU"),
+            aggregate.Product(sku="BENCH-SKU"),
+        ),
+        "Entity.__hash__": (
+            _LegacyBatch(**batch_fields),
+            aggregate.Batch(**batch_fields),
+        ),
+        "ValueObject.__hash__": (
+            _LegacyOrderLine(**line_fields),
+            aggregate.OrderLine(**line_fields),
+        ),
+    }
+    return {
+        name: {
+            "before_ns": _time(before, number) * 1e9,
+            "after_ns": _time(after, number) * 1e9,
+        }
+        for name, (before, after) in cases.items()
+    }
+
+
+if __name__ == "__main__":
+    for name, result in run().items():
+        print(
+            f"{name:<22} before {result['before_ns']:>9.1f} ns"
+            f"  after {result['after_ns']:>7.1f} ns"
+            f"  ({result['before_ns'] / result['after_ns']:.1f}x)"
+        )
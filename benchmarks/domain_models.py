@@ -0,0 +1,131 @@
+"""Construction time and memory of the slotted domain models.
+
+Compares ``OrderLine`` and ``Batch``, slotted dataclasses validated at the HTTP
+edge, against the pydantic models they replaced, which validated every field
+on each construction and ORM hydration and kept a ``__dict__`` per instance.
+
+Run with::
+
+    python -m benchmarks.domain_models
+"""
+import datetime
+import gc
+import timeit
+import tracemalloc
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import pydantic
+
+from benchmarks import fixtures
+from src.allocation.adapters import orm
+from src.allocation.domain.model import aggregate
+from src.allocation.lib import base_types
+
+_NUMBER = 20_000
+_LINES = 50_000
+
+
+class PydanticOrderLine(base_types.DomainBaseModel):
+    """``OrderLine`` as it was before the slotted domain models"""
+
+    sku: str
+    order_id: str
+    qty: int = pydantic.Field(..., gt=0)
+
+
+class PydanticBatch(base_types.DomainBaseModel):
+    """``Batch`` fields and allocations as they were before the slotted domain
+    models"""
+
+    id: str
+    sku: str
+    eta: Optional[datetime.date]
+    purchased_quantity: int
+    _allocations: Dict[PydanticOrderLine, None] = pydantic.PrivateAttr(
+        default_factory=dict
+    )
+
+    class Config(base_types.DomainBaseModel.Config):
+        frozen: bool = False
+
+    @classmethod
+    def _identity_fields(cls) -> Optional[Tuple[str, ...]]:
+        return ("id",)
+
+
+def _time(operation: Callable[[], Any], number: int = _NUMBER) -> float:
+    """Best time per operation, in nanoseconds"""
+    return min(timeit.repeat(operation, number=number, repeat=5)) / number * 1e9
+
+
+def _memory(build: Callable[[int], Any], count: int = _LINES) -> float:
+    """Bytes allocated per instance to build and keep ``count`` instances"""
+    gc.collect()
+    tracemalloc.start()
+    _snapshot = tracemalloc.take_snapshot()
+    _kept = build(count)
+    _allocated = sum(
+        stat.size_diff
+        for stat in tracemalloc.take_snapshot().compare_to(_snapshot, "filename")
+    )
+    tracemalloc.stop()
+    del _kept
+    return _allocated / count
+
+
+def _allocations(line: Any) -> Callable[[int], Any]:
+    # Order lines as a batch holds them, keyed in an insertion ordered dict
+    return lambda count: dict.fromkeys(
+        line(sku=fixtures.SKU, order_id=f"order-{i}", qty=1) for i in range(count)
+    )
+
+
+def run() -> Dict[str, Dict[str, float]]:
+    _line_fields: Dict[str, Any] = dict(order_id="o1", sku=fixtures.SKU, qty=1)
+    _batch_fields: Dict[str, Any] = dict(
+        id="b1", sku=fixtures.SKU, purchased_quantity=10, eta=None
+    )
+    _line_mapper = orm.OrderLineMapper(**_line_fields)
+    _pydantic_line = PydanticOrderLine(**_line_fields)
+    _line = aggregate.OrderLine(**_line_fields)
+    _time_ns = {
+        "OrderLine()": (
+            lambda: PydanticOrderLine(**_line_fields),
+            lambda: aggregate.OrderLine(**_line_fields),
+        ),
+        "OrderLine.from_orm": (
+            lambda: PydanticOrderLine.from_orm(_line_mapper),
+            lambda: aggregate.OrderLine.from_orm(_line_mapper),
+        ),
+        "OrderLine.__hash__": (
+            lambda: hash(_pydantic_line),
+            lambda: hash(_line),
+        ),
+        "OrderLine.column_values": (
+            _pydantic_line.column_values,
+            _line.column_values,
+        ),
+        "Batch()": (
+            lambda: PydanticBatch(**_batch_fields),
+            lambda: aggregate.Batch(**_batch_fields),
+        ),
+    }
+    _results = {
+        name: {"before": _time(before), "after": _time(after)}
+        for name, (before, after) in _time_ns.items()
+    }
+    _results[f"bytes/allocated line[{_LINES}]"] = {
+        "before": _memory(_allocations(PydanticOrderLine)),
+        "after": _memory(_allocations(aggregate.OrderLine)),
+    }
+    return _results
+
+
+if __name__ == "__main__":
+    for name, result in run().items():
+        _unit = "B" if name.startswith("bytes") else "ns"
+        print(
+            f"{name:<32} before {result['before']:>9.1f} {_unit}"
+            f"  after {result['after']:>7.1f} {_unit}"
+            f"  ({result['before'] / result['after']:.1f}x)"
+        )
@@ -0,0 +1,61 @@
+"""Reproducible fixture data for the benchmarks.
+
+Every builder draws from its own seeded generator, so two runs time the same
+products, batches and order lines.
+"""
+import datetime
+import random
+from typing import List
+
+from src.allocation.domain.model import aggregate
+
+SEED = 20230401
+SKU = "BENCH-SKU"
+
+
+def order_lines(
+    count: int, start: int = 0, qty: int = 1
+) -> List[aggregate.OrderLine]:
+    return [
+        aggregate.OrderLine(order_id=f"order-{i}", sku=SKU, qty=qty)
+        for i in range(start, start + count)
+    ]
+
+
+def product(
+    batches: int, allocations: int, quantity: int = 1_000_000, persisted: bool = True
+) -> aggregate.Product:
+    """Product with its allocations spread over its batches
+
+    Args:
+        batches (int): Batches of the product, with shuffled ETAs
+        allocations (int): Order lines of one unit allocated beforehand
+        quantity (int): Purchased quantity of each batch
+        persisted (bool): Whether the product looks loaded from storage, or new
+
+    Returns:
+        Product: Product without events
+    """
+    _random = random.Random(SEED)
+    _today = datetime.date(2023, 4, 1)
+    _product = aggregate.Product(
+        sku=SKU,
+        batches=[
+            aggregate.Batch(
+                id=f"batch-{i}",
+                sku=SKU,
+                purchased_quantity=quantity,
+                eta=None
+                if i == 0
+                else _today + datetime.timedelta(days=_random.randint(1, 365)),
+            )
+            for i in range(batches)
+        ],
+    )
+    _batches = list(_product.batches)
+    for line in order_lines(allocations):
+        _random.choice(_batches).allocate(line)
+    if persisted:
+        _product.mark_persisted()
+    _product.events.clear()
+    return _product
@@ -0,0 +1,306 @@
+"""Microbenchmarks of the domain model and repository hot paths.
+
+Each case rebuilds its fixture before every repeat, outside of the timing, and
+reports the best and median time per operation over the repeats. Results can
+be saved as a baseline and later runs compared against it, failing when a case
+got slower than the allowed ratio.
+
+Run with::
+
+    python -m benchmarks.hot_paths
+    python -m benchmarks.hot_paths --save .benchmarks/baseline.json
+    python -m benchmarks.hot_paths --compare .benchmarks/baseline.json
+"""
+import argparse
+import asyncio
+import copy
+import dataclasses
+import json
+import pathlib
+import platform
+import statistics
+import sys
+import timeit
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks import fixtures
+from src.allocation import repositories
+from src.allocation.adapters import orm
+from src.allocation.domain.model import aggregate
+from src.allocation.domain.model.deallocation import DeallocationPolicy
+
+# Builds the fixture of a repeat and returns the operation to time
+Setup = Callable[[], Callable[[], Any]]
+
+
+@dataclasses.dataclass(frozen=True)
+class Case:
+    """Benchmarked operation
+
+    Attributes:
+        name (str): Operation and fixture parameters.
+        setup (Setup): Builds a fresh fixture, returns the operation to time.
+        number (int): Operations timed on each repeat.
+    """
+
+    name: str
+    setup: Setup
+    number: int
+
+
+def _allocate(batches: int, allocations: int) -> Setup:
+    def _setup() -> Callable[[], Any]:
+        _product = fixtures.product(batches=batches, allocations=allocations)
+        _lines = iter(fixtures.order_lines(1000, start=allocations))
+        return lambda: _product.allocate(next(_lines))
+
+    return _setup
+
+
+def _available_quantity(allocations: int) -> Setup:
+    def _setup() -> Callable[[], Any]:
+        _batch = fixtures.product(batches=1, allocations=allocations).batches[0]
+        return lambda: _batch.available_quantity
+
+    return _setup
+
+
+def _change_batch_quantity(allocations: int) -> Setup:
+    # Shrinks the only batch to a hundredth, deallocating almost every line
+    _template = fixtures.product(
+        batches=1, allocations=allocations, quantity=allocations
+    )
+
+    def _setup() -> Callable[[], Any]:
+        _product = copy.deepcopy(_template)
+        return lambda: _product.change_batch_quantity(
+            ref="batch-0",
+            qty=allocations // 100,
+            policy=DeallocationPolicy.FEWEST_LINES,
+        )
+
+    return _setup
+
+
+def _hash() -> Callable[[], Any]:
+    _product = fixtures.product(batches=10, allocations=100)
+    return lambda: hash(_product)
+
+
+def _from_orm(batches: int, allocations: int) -> Setup:
+    def _setup() -> Callable[[], Any]:
+        _mapper = orm.ProductMapper.from_domain(
+            fixtures.product(batches=batches, allocations=allocations)
+        )
+        return lambda: aggregate.Product.from_orm(_mapper)
+
+    return _setup
+
+
+def _order_line_from_domain() -> Callable[[], Any]:
+    _line = fixtures.order_lines(1)[0]
+    return lambda: orm.OrderLineMapper.from_domain(_line)
+
+
+def _sqlite_session_factory(batches: int, allocations: int) -> "sessionmaker[Any]":
+    _engine = create_engine("sqlite://")
+    orm.Base.metadata.create_all(_engine)
+    _session_factory = sessionmaker(bind=_engine)
+    _product = fixtures.product(
+        batches=batches, allocations=allocations, persisted=False
+    )
+    with _session_factory() as session:
+        _LOOP.run_until_complete(
+            repositories.SqlAlchemyRepository(session=session).add(_product)
+        )
+        session.commit()
+    return _session_factory
+
+
+def _repository_get(batches: int, allocations: int) -> Setup:
+    def _setup() -> Callable[[], Any]:
+        _session_factory = _sqlite_session_factory(batches, allocations)
+
+        def _get() -> Optional[aggregate.Product]:
+            with _session_factory() as session:
+                _repository = repositories.SqlAlchemyRepository(session=session)
+                return _LOOP.run_until_complete(_repository.get(sku=fixtures.SKU))
+
+        return _get
+
+    return _setup
+
+
+def _repository_add(batches: int, allocations: int) -> Setup:
+    def _setup() -> Callable[[], Any]:
+        _session_factory = _sqlite_session_factory(batches, allocations)
+        _lines: Iterator[aggregate.OrderLine] = iter(
+            fixtures.order_lines(1000, start=allocations)
+        )
+
+        async def _round_trip(session: Any) -> None:
+            _repository = repositories.SqlAlchemyRepository(session=session)
+            _product = await _repository.get(sku=fixtures.SKU)
+            assert _product is not None
+            _product.allocate(next(_lines))
+            await _repository.add(_product)
+            session.commit()
+
+        def _add() -> None:
+            with _session_factory() as session:
+                _LOOP.run_until_complete(_round_trip(session))
+
+        return _add
+
+    return _setup
+
+
+_LOOP = asyncio.new_event_loop()
+
+CASES: List[Case] = [
+    *(
+        Case(
+            f"Product.allocate[batches={b},allocations={a}]",
+            _allocate(batches=b, allocations=a),
+            number=1000,
+        )
+        for b in (1, 10, 100)
+        for a in (0, 1000)
+    ),
+    *(
+        Case(
+            f"Batch.available_quantity[allocations={a}]",
+            _available_quantity(allocations=a),
+            number=10_000,
+        )
+        for a in (10, 1000)
+    ),
+    *(
+        Case(
+            f"Product.change_batch_quantity[over_allocated={a}]",
+            _change_batch_quantity(allocations=a),
+            number=1,
+        )
+        for a in (1000, 5000)
+    ),
+    Case("Aggregate.__hash__", _hash, number=100_000),
+    *(
+        Case(
+            f"Product.from_orm[batches={b},allocations={a}]",
+            _from_orm(batches=b, allocations=a),
+            number=20,
+        )
+        for b, a in ((1, 10), (10, 1000))
+    ),
+    Case("OrderLineMapper.from_domain", _order_line_from_domain, number=10_000),
+    Case(
+        "SqlAlchemyRepository.get[batches=10,allocations=1000]",
+        _repository_get(batches=10, allocations=1000),
+        number=20,
+    ),
+    Case(
+        "SqlAlchemyRepository.add[batches=10,allocations=1000]",
+        _repository_add(batches=10, allocations=1000),
+        number=20,
+    ),
+]
+
+
+def measure(case: Case, repeat: int) -> Dict[str, float]:
+    """Times a case, in nanoseconds per operation
+
+    Args:
+        case (Case): Case to time
+        repeat (int): Timings taken, each one on a fresh fixture
+
+    Returns:
+        result (Dict[str, float]): Best and median time per operation
+    """
+    _timings = [
+        timeit.timeit(case.setup(), number=case.number) / case.number * 1e9
+        for _ in range(repeat)
+    ]
+    return {"min_ns": min(_timings), "median_ns": statistics.median(_timings)}
+
+
+def run(
+    repeat: int = 5, name_filter: Optional[str] = None
+) -> Dict[str, Dict[str, float]]:
+    return {
+        case.name: measure(case, repeat=repeat)
+        for case in CASES
+        if name_filter is None or name_filter in case.name
+    }
+
+
+def _format(value: float) -> str:
+    for unit, scale in (("s", 1e9), ("ms", 1e6), ("us", 1e3)):
+        if value >= scale:
+            return f"{value / scale:.2f} {unit}"
+    return f"{value:.0f} ns"
+
+
+def _report(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    max_regression: float,
+) -> List[str]:
+    """Prints the results and returns the cases slower than the baseline allows"""
+    _regressions: List[str] = []
+    _width = max(map(len, results))
+    for name, result in results.items():
+        _line = (
+            f"{name:<{_width}}  min {_format(result['min_ns']):>10}"
+            f"  median {_format(result['median_ns']):>10}"
+        )
+        if name in baseline:
+            _ratio = result["min_ns"] / baseline[name]["min_ns"]
+            _line += (
+                f"  baseline {_format(baseline[name]['min_ns']):>10}  {_ratio:.2f}x"
+            )
+            if _ratio > max_regression:
+                _regressions.append(name)
+                _line += "  REGRESSION"
+        print(_line)
+    return _regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--filter", dest="name_filter", help="Run the matching cases"
+    )
+    parser.add_argument("--save", type=pathlib.Path, help="Write a baseline file")
+    parser.add_argument(
+        "--compare", type=pathlib.Path, help="Baseline to compare to"
+    )
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=1.25,
+        help="Slowdown ratio against the baseline failing the run",
+    )
+    _args = parser.parse_args(argv)
+
+    _results = run(repeat=_args.repeat, name_filter=_args.name_filter)
+    _baseline: Dict[str, Dict[str, float]] = {}
+    if _args.compare is not None:
+        _baseline = json.loads(_args.compare.read_text())["cases"]
+    _regressions = _report(_results, _baseline, _args.max_regression)
+
+    if _args.save is not None:
+        _args.save.parent.mkdir(parents=True, exist_ok=True)
+        _args.save.write_text(
+            json.dumps(
+                {"python": platform.python_version(), "cases": _results}, indent=2
+            )
+        )
+    return 1 if _regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
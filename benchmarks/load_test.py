@@ -0,0 +1,315 @@
+"""HTTP load test of the allocation API.
+
+Drives a mix of batch creations, allocations and batch quantity changes, with
+the skus drawn from a Zipf distribution so a few of them stay hot, from a
+number of concurrent clients. Reports the throughput and the latency
+percentiles of each operation, then checks on the database that no batch got
+more units allocated than it holds, exiting with 1 when one did.
+
+By default the application runs in-process, over the ASGI transport, on a
+fresh SQLite file. With ``--url`` it targets a running server instead, e.g.::
+
+    APP_DATABASE__URL=sqlite:///load.db \\
+    APP_DATABASE__ISOLATION_LEVEL=SERIALIZABLE \\
+        uvicorn src.main:app
+    python -m benchmarks.load_test --url http://localhost:8000 \\
+        --database-url sqlite:///load.db
+
+Run with::
+
+    python -m benchmarks.load_test
+    python -m benchmarks.load_test --concurrency 32 --requests 5000 --zipf 1.2
+"""
+import argparse
+import asyncio
+import collections
+import dataclasses
+import itertools
+import math
+import pathlib
+import random
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks import fixtures
+from src.allocation.adapters import migrations, orm
+
+OPERATIONS = ("add_batch", "allocate", "change_quantity")
+
+# Sends one request, returns the awaitable response
+Operation = Callable[[httpx.AsyncClient], Any]
+
+
+@dataclasses.dataclass
+class Sample:
+    """Outcome of one request
+
+    Attributes:
+        operation (str): Operation of the mix.
+        status (int): HTTP status code, 0 when the request failed to complete.
+        latency (float): Seconds until the response was read.
+    """
+
+    operation: str
+    status: int
+    latency: float
+
+
+class Workload:
+    """Reproducible stream of requests over a fixed set of skus
+
+    Args:
+        mix (Dict[str, float]): Relative weight of each operation
+        skus (int): Distinct skus, seeded with one batch each
+        zipf (float): Skew of the skus, the k-th sku weighs 1 / k ** zipf
+        batch_qty (int): Purchased quantity of the created batches
+        seed (int): Seed of the random choices
+    """
+
+    def __init__(
+        self,
+        mix: Dict[str, float],
+        skus: int,
+        zipf: float,
+        batch_qty: int,
+        seed: int = fixtures.SEED,
+    ) -> None:
+        self.mix = mix
+        self.skus = [f"LOAD-SKU-{k}" for k in range(skus)]
+        self.batch_qty = batch_qty
+        self._weights = [1 / (k + 1) ** zipf for k in range(skus)]
+        self._random = random.Random(seed)
+        self._ids = itertools.count()
+        self.batches: Dict[str, List[str]] = {sku: [] for sku in self.skus}
+
+    def seed_batches(self) -> List[Operation]:
+        """Requests creating the first, in-stock batch of every sku"""
+        return [self._add_batch(sku, eta=None) for sku in self.skus]
+
+    def operations(self, count: int) -> Iterator[Tuple[str, Operation]]:
+        _names = list(self.mix)
+        _weights = [self.mix[name] for name in _names]
+        for _ in range(count):
+            _name = self._random.choices(_names, _weights)[0]
+            _sku = self._random.choices(self.skus, self._weights)[0]
+            if _name == "add_batch":
+                _eta = f"2030-01-{self._random.randint(1, 28):02d}"
+                yield _name, self._add_batch(_sku, eta=_eta)
+            elif _name == "allocate":
+                yield _name, self._allocate(_sku)
+            else:
+                yield _name, self._change_quantity(_sku)
+
+    def _add_batch(self, sku: str, eta: Optional[str]) -> Operation:
+        _ref = f"load-batch-{next(self._ids)}"
+        self.batches[sku].append(_ref)
+        _data = {"ref": _ref, "sku": sku, "qty": self.batch_qty, "eta": eta}
+        return lambda client: client.post("/api/batches/", json=_data)
+
+    def _allocate(self, sku: str) -> Operation:
+        _data = {
+            "order_id": f"load-order-{next(self._ids)}",
+            "sku": sku,
+            "qty": self._random.randint(1, 10),
+        }
+        return lambda client: client.post("/api/batches/allocate/", json=_data)
+
+    def _change_quantity(self, sku: str) -> Operation:
+        _ref = self._random.choice(self.batches[sku])
+        _data = {"qty": self._random.randint(self.batch_qty // 2, self.batch_qty)}
+        return lambda client: client.put(f"/api/batches/{_ref}/quantity", json=_data)
+
+
+async def _timed(
+    client: httpx.AsyncClient, name: str, operation: Operation
+) -> Sample:
+    _start = time.perf_counter()
+    try:
+        _status = (await operation(client)).status_code
+    except httpx.HTTPError:
+        _status = 0
+    return Sample(
+        operation=name, status=_status, latency=time.perf_counter() - _start
+    )
+
+
+async def drive(
+    client: httpx.AsyncClient,
+    operations: Iterator[Tuple[str, Operation]],
+    concurrency: int,
+) -> List[Sample]:
+    """Sends the requests from concurrent clients, each one waiting for its
+    response before taking the next request
+
+    Args:
+        client (AsyncClient): Client of the application
+        operations (Iterator[Tuple[str, Operation]]): Requests to send
+        concurrency (int): Requests in flight at once
+
+    Returns:
+        samples (List[Sample]): Outcome of every request
+    """
+    _samples: List[Sample] = []
+
+    async def _worker() -> None:
+        for name, operation in operations:
+            _samples.append(await _timed(client, name, operation))
+
+    await asyncio.gather(*(_worker() for _ in range(concurrency)))
+    return _samples
+
+
+def percentile(latencies: List[float], rank: float) -> float:
+    """Nearest-rank percentile of the sorted latencies"""
+    return latencies[max(math.ceil(rank / 100 * len(latencies)) - 1, 0)]
+
+
+def report(samples: List[Sample], elapsed: float) -> None:
+    _groups: Dict[str, List[Sample]] = collections.defaultdict(list)
+    for sample in samples:
+        _groups[sample.operation].append(sample)
+    _groups["total"] = samples
+    print(f"{len(samples)} requests in {elapsed:.2f} s")
+    for name, group in _groups.items():
+        _latencies = sorted(sample.latency * 1e3 for sample in group)
+        _statuses = collections.Counter(sample.status for sample in group)
+        print(
+            f"{name:<16} {len(group) / elapsed:8.1f} req/s"
+            f"  p50 {percentile(_latencies, 50):7.2f} ms"
+            f"  p95 {percentile(_latencies, 95):7.2f} ms"
+            f"  p99 {percentile(_latencies, 99):7.2f} ms"
+            f"  status {dict(sorted(_statuses.items()))}"
+        )
+
+
+def oversold_batches(database_url: str) -> List[Tuple[str, int, int]]:
+    """Batches with more units allocated than purchased
+
+    Args:
+        database_url (str): Database of the application
+
+    Returns:
+        batches (List[Tuple[str, int, int]]): Reference, purchased and allocated
+        quantity of each oversold batch
+    """
+    _batches, _lines = orm.BatchMapper, orm.OrderLineMapper
+    _allocations = orm.allocations_table
+    _allocated = func.sum(_lines.qty)
+    _query = (
+        select(_batches.id, _batches.purchased_quantity, _allocated)
+        .join(_allocations, _allocations.c.batch_id == _batches.id)
+        .join(_lines, _lines.id == _allocations.c.orderline_id)
+        .group_by(_batches.id, _batches.purchased_quantity)
+        .having(_allocated > _batches.purchased_quantity)
+    )
+    _engine = create_engine(database_url)
+    try:
+        with _engine.connect() as connection:
+            return [(row[0], row[1], row[2]) for row in connection.execute(_query)]
+    finally:
+        _engine.dispose()
+
+
+def _in_process_client(database_url: str) -> httpx.AsyncClient:
+    """Client of the application on the given database, without its lifespan"""
+    from src.allocation.domain.service import unit_of_work
+    from src.allocation.lib import config
+    from src.main import app
+
+    _engine = create_engine(database_url)
+    migrations.upgrade(_engine)
+    _session_factory = sessionmaker(bind=_engine)
+
+    def _uow() -> unit_of_work.AbstractUnitOfWork:
+        return unit_of_work.SqlAlchemyUnitOfWork(session_factory=_session_factory)
+
+    app.dependency_overrides[config.get_default_uow] = _uow
+    app.dependency_overrides[config.get_default_uow_factory] = lambda: _uow
+    app.dependency_overrides[config.get_read_session_factory] = lambda: (
+        _session_factory
+    )
+    return httpx.AsyncClient(app=app, base_url="http://load-test")
+
+
+async def run(args: argparse.Namespace, database_url: Optional[str]) -> int:
+    _workload = Workload(
+        mix=args.mix,
+        skus=args.skus,
+        zipf=args.zipf,
+        batch_qty=args.batch_qty,
+        seed=args.seed,
+    )
+    if args.url is not None:
+        _client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+    else:
+        assert database_url is not None
+        _client = _in_process_client(database_url)
+
+    async with _client:
+        for operation in _workload.seed_batches():
+            (await operation(_client)).raise_for_status()
+        _start = time.perf_counter()
+        _samples = await drive(
+            _client,
+            _workload.operations(args.requests),
+            concurrency=args.concurrency,
+        )
+        report(_samples, elapsed=time.perf_counter() - _start)
+
+    if database_url is None:
+        print("oversell check skipped, no --database-url")
+        return 0
+    _oversold = oversold_batches(database_url)
+    for reference, purchased, allocated in _oversold:
+        print(f"OVERSOLD {reference}: {allocated} allocated of {purchased}")
+    if not _oversold:
+        print("no batch is over-allocated")
+    return 1 if _oversold else 0
+
+
+def _mix(value: str) -> Dict[str, float]:
+    _weights: Dict[str, float] = {}
+    for item in value.split(","):
+        _name, _, _weight = item.partition("=")
+        if _name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"unknown operation {_name!r}")
+        _weights[_name] = float(_weight)
+    return _weights
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="Running server, in-process by default")
+    parser.add_argument(
+        "--database-url", help="Database of the running server, for the check"
+    )
+    parser.add_argument(
+        "--mix",
+        type=_mix,
+        default=_mix("allocate=0.8,add_batch=0.1,change_quantity=0.1"),
+        help="Weights of " + ", ".join(OPERATIONS),
+    )
+    parser.add_argument("--skus", type=int, default=50)
+    parser.add_argument("--zipf", type=float, default=1.1, help="Sku skew")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--batch-qty", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=fixtures.SEED)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    _args = parser.parse_args(argv)
+
+    if _args.url is not None:
+        return asyncio.run(run(_args, database_url=_args.database_url))
+    with tempfile.TemporaryDirectory() as directory:
+        _database_url = f"sqlite:///{pathlib.Path(directory) / 'load.db'}"
+        return asyncio.run(run(_args, database_url=_database_url))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
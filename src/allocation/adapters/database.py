@@ -0,0 +1,216 @@
+import asyncio
+import contextlib
+import dataclasses
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from sqlalchemy import create_engine
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, PoolProxiedConnection, QueuePool
+
+from src.allocation.lib import settings
+
+_Connection = TypeVar("_Connection")
+
+
+@dataclasses.dataclass(frozen=True)
+class PoolStatistics:
+    """Snapshot of the connection pool of an engine
+
+    Attributes:
+        size (int): Connections kept open by the pool.
+        checked_in (int): Idle connections ready to be checked out.
+        checked_out (int): Connections in use.
+        overflow (int): Connections opened beyond the pool size, negative while
+            the pool is not full yet.
+        checkouts (int): Connections handed out since the engine was created.
+        timeouts (int): Checkouts that gave up after the pool timeout.
+        wait_time_total (float): Seconds spent waiting for a connection.
+        wait_time_max (float): Longest wait for a connection, in seconds.
+    """
+
+    size: int
+    checked_in: int
+    checked_out: int
+    overflow: int
+    checkouts: int
+    timeouts: int
+    wait_time_total: float
+    wait_time_max: float
+
+
+class CheckoutTiming:
+    """Counts the checkouts of a pool and how long they wait for a connection,
+    opening it included"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def measure(self, connect: Callable[[], _Connection]) -> _Connection:
+        _started = time.perf_counter()
+        _timed_out = False
+        try:
+            return connect()
+        except sa_exc.TimeoutError:
+            _timed_out = True
+            raise
+        finally:
+            _waited = time.perf_counter() - _started
+            with self._lock:
+                self.checkouts += 0 if _timed_out else 1
+                self.timeouts += 1 if _timed_out else 0
+                self.wait_time_total += _waited
+                self.wait_time_max = max(self.wait_time_max, _waited)
+
+
+class InstrumentedQueuePool(QueuePool):
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.timing = CheckoutTiming()
+
+    def connect(self) -> PoolProxiedConnection:
+        return self.timing.measure(super().connect)
+
+
+class InstrumentedAsyncQueuePool(AsyncAdaptedQueuePool):
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.timing = CheckoutTiming()
+
+    def connect(self) -> PoolProxiedConnection:
+        return self.timing.measure(super().connect)
+
+
+class Database:
+    """Engines of the application database, created on first use
+
+    The app lifespan warms up the engine of the configured driver and disposes
+    every created engine on shutdown, the read models always use the sync one.
+
+    Args:
+        db_settings (_DatabaseSettings): Connection and pool settings
+        url (Optional[str]): Database URL, the MySQL one by default
+        async_url (Optional[str]): Async database URL, the MySQL one by default
+    """
+
+    def __init__(
+        self,
+        db_settings: settings._DatabaseSettings,  # pyright: ignore
+        url: Optional[str] = None,
+        async_url: Optional[str] = None,
+    ) -> None:
+        self.settings = db_settings
+        self.url = url or db_settings.mysql_uri
+        self.async_url = async_url or db_settings.mysql_async_uri
+        self._engine: Optional[Engine] = None
+        self._async_engine: Optional[AsyncEngine] = None
+
+    @property
+    def engine(self) -> Engine:
+        if self._engine is None:
+            self._engine = create_engine(
+                url=self.url,
+                poolclass=InstrumentedQueuePool,
+                **self._engine_options(),
+            )
+        return self._engine
+
+    @property
+    def async_engine(self) -> AsyncEngine:
+        if self._async_engine is None:
+            self._async_engine = create_async_engine(
+                url=self.async_url,
+                poolclass=InstrumentedAsyncQueuePool,
+                **self._engine_options(),
+            )
+        return self._async_engine
+
+    @property
+    def read_engine(self) -> Engine:
+        """Engine for the read models, each query commits on its own so reads
+        never hold a snapshot nor wait on the write transactions"""
+        return self.engine.execution_options(isolation_level="AUTOCOMMIT")
+
+    async def warm_up(self) -> None:
+        """Opens the pool connections up front, so the first requests don't pay
+        for them"""
+        if self.settings.use_async_driver:
+            async with contextlib.AsyncExitStack() as stack:
+                await asyncio.gather(
+                    *(
+                        stack.enter_async_context(self.async_engine.connect())
+                        for _ in range(self.settings.pool_size)
+                    )
+                )
+        else:
+            await asyncio.to_thread(self._warm_up_sync)
+
+    async def dispose(self) -> None:
+        """Closes the idle pool connections of the created engines"""
+        if self._async_engine is not None:
+            await self._async_engine.dispose()
+        if self._engine is not None:
+            self._engine.dispose()
+
+    def pool_statistics(self) -> Dict[str, PoolStatistics]:
+        """Reads the pools of the created engines, the read models use the sync
+        one even with the async driver
+
+        Returns:
+            statistics (Dict[str, PoolStatistics]): Current pool figures by
+            engine, "sync" or "async", empty while no engine was created
+        """
+        _engines = {
+            "sync": None if self._engine is None else self._engine.pool,
+            "async": None if self._async_engine is None else self._async_engine.pool,
+        }
+        return {
+            name: PoolStatistics(
+                size=_pool.size(),
+                checked_in=_pool.checkedin(),
+                checked_out=_pool.checkedout(),
+                overflow=_pool.overflow(),
+                checkouts=_pool.timing.checkouts,
+                timeouts=_pool.timing.timeouts,
+                wait_time_total=_pool.timing.wait_time_total,
+                wait_time_max=_pool.timing.wait_time_max,
+            )
+            for name, _pool in _engines.items()
+            if isinstance(_pool, (InstrumentedQueuePool, InstrumentedAsyncQueuePool))
+        }
+
+    def _engine_options(self) -> Dict[str, Any]:
+        return dict(
+            isolation_level=self.settings.isolation_level,
+            pool_size=self.settings.pool_size,
+            max_overflow=self.settings.max_overflow,
+            pool_pre_ping=self.settings.pool_pre_ping,
+            pool_recycle=self.settings.pool_recycle,
+            pool_timeout=self.settings.pool_timeout,
+        )
+
+    def _warm_up_sync(self) -> None:
+        with contextlib.ExitStack() as stack:
+            for _ in range(self.settings.pool_size):
+                stack.enter_context(self.engine.connect())
+
+
+@lru_cache()
+def get_database() -> Database:
+    """Database of the application settings, shared by the whole process
+
+    Returns:
+        Database: The configured database
+    """
+    _settings = settings.get_settings().database
+    return Database(
+        db_settings=_settings, url=_settings.url, async_url=_settings.async_url
+    )
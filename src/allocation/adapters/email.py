@@ -1,5 +1,92 @@
-from typing import Any
+import abc
+import asyncio
+import dataclasses
+import smtplib
+from email.message import EmailMessage
+from typing import Any, Sequence
+
+
+class MailDeliveryException(Exception):
+    """Raise when the mail server can't be reached or rejects a message"""
+
+
+@dataclasses.dataclass(frozen=True)
+class Message:
+    """Email to deliver
+
+    Attributes:
+        to (str): Recipient address.
+        subject (str): Subject line.
+        body (str): Plain text content.
+    """
+
+    to: str
+    subject: str
+    body: str = ""
 
 
 def send_mail(*args: Any) -> None:
     print("SENDING EMAIL:", *args)
+
+
+class AbstractMailer(abc.ABC):
+    @abc.abstractmethod
+    async def send(self, messages: Sequence[Message]) -> None:
+        """Delivers the messages over a single session with the mail server
+
+        Raises:
+            MailDeliveryException: Raise when the messages couldn't be delivered
+        """
+        raise NotImplementedError
+
+
+class ConsoleMailer(AbstractMailer):
+    async def send(self, messages: Sequence[Message]) -> None:
+        for message in messages:
+            send_mail(message.to, message.subject)
+
+
+class SmtpMailer(AbstractMailer):
+    """Mailer of an SMTP server, the blocking client runs on a worker thread
+
+    Args:
+        host (str): SMTP server host
+        port (int): SMTP server port
+        sender (str): Address the messages are sent from
+        timeout (float): Seconds to wait for the server on each command
+    """
+
+    def __init__(self, host: str, port: int, sender: str, timeout: float) -> None:
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.timeout = timeout
+
+    async def send(self, messages: Sequence[Message]) -> None:
+        await asyncio.to_thread(self._send, messages)
+
+    def _send(self, messages: Sequence[Message]) -> None:
+        try:
+            # Invalid headers, such as a subject with a line break
+            _emails = list(map(self._to_email, messages))
+        except ValueError as error:
+            raise MailDeliveryException(
+                f"Couldn't build the emails of {len(messages)} messages"
+            ) from error
+        try:
+            with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+                for _email in _emails:
+                    smtp.send_message(_email)
+        except (smtplib.SMTPException, OSError) as error:
+            raise MailDeliveryException(
+                f"Couldn't deliver {len(messages)} messages through "
+                f"{self.host}:{self.port}"
+            ) from error
+
+    def _to_email(self, message: Message) -> EmailMessage:
+        _email = EmailMessage()
+        _email["From"] = self.sender
+        _email["To"] = message.to
+        _email["Subject"] = message.subject
+        _email.set_content(message.body)
+        return _email
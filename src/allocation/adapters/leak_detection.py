@@ -0,0 +1,182 @@
+import asyncio
+import dataclasses
+import os
+import threading
+import time
+import traceback
+import weakref
+from typing import Any, List, Optional
+
+import sqlalchemy
+import structlog
+from sqlalchemy import event
+from sqlalchemy.orm import Session, SessionTransaction
+
+_LOGGER = structlog.get_logger()
+_SQLALCHEMY_PATH = os.path.dirname(sqlalchemy.__file__)
+
+
+@dataclasses.dataclass
+class OpenSession:
+    """Session holding a connection
+
+    Attributes:
+        request_id (Optional[str]): Request that opened it, from the log context.
+        opened_at (float): Monotonic time when it acquired its connection.
+        stack (str): Stack that made it acquire its connection.
+        reported (bool): Whether it was already logged as leaked.
+    """
+
+    request_id: Optional[str]
+    opened_at: float
+    stack: str
+    reported: bool = False
+
+    def age(self, now: Optional[float] = None) -> float:
+        return (time.monotonic() if now is None else now) - self.opened_at
+
+
+class SessionLeakDetector:
+    """Tracks the sessions holding a connection and logs the ones alive past a
+    threshold, or still open when the request that opened them is over
+
+    Sessions are tracked from the start of their transaction until it ends, on
+    commit, rollback or close, through the SQLAlchemy session events. They are
+    swept when another session begins and, once started, on a periodic task so
+    the leaks of an idle or stuck worker are logged too.
+
+    Args:
+        threshold (float): Seconds a session may hold its connection
+        stack_limit (int): Frames of the opening stack kept for the logs
+        sweep_interval (float): Seconds between two periodic sweeps
+    """
+
+    def __init__(
+        self, threshold: float, stack_limit: int = 16, sweep_interval: float = 5.0
+    ) -> None:
+        self.threshold = threshold
+        self.stack_limit = stack_limit
+        self.sweep_interval = sweep_interval
+        self._sweeper: Optional["asyncio.Task[None]"] = None
+        self._lock = threading.Lock()
+        self._sessions: "weakref.WeakKeyDictionary[Session, OpenSession]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def install(self) -> None:
+        event.listen(Session, "after_begin", self._on_begin)
+        event.listen(Session, "after_transaction_end", self._on_transaction_end)
+
+    def uninstall(self) -> None:
+        event.remove(Session, "after_begin", self._on_begin)
+        event.remove(Session, "after_transaction_end", self._on_transaction_end)
+        with self._lock:
+            self._sessions.clear()
+
+    async def start(self) -> None:
+        """Starts the periodic sweeps on the running event loop"""
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_periodically())
+
+    async def stop(self) -> None:
+        if self._sweeper is None:
+            return
+        self._sweeper.cancel()
+        await asyncio.gather(self._sweeper, return_exceptions=True)
+        self._sweeper = None
+
+    async def _sweep_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception:
+                _LOGGER.exception("session_leak_sweep_failed")
+
+    def open_sessions(self, request_id: Optional[str] = None) -> List[OpenSession]:
+        """Sessions holding a connection, only the ones of a request if given"""
+        with self._lock:
+            _sessions = list(self._sessions.values())
+        return [
+            session
+            for session in _sessions
+            if request_id is None or session.request_id == request_id
+        ]
+
+    def sweep(self, now: Optional[float] = None) -> List[OpenSession]:
+        """Logs the sessions alive past the threshold, once each
+
+        Args:
+            now (Optional[float]): Monotonic time to compare with, the current one
+            by default
+
+        Returns:
+            sessions (List[OpenSession]): Sessions logged on this sweep
+        """
+        _leaked = [
+            session
+            for session in self.open_sessions()
+            if not session.reported and session.age(now) > self.threshold
+        ]
+        for session in _leaked:
+            self._report("session_alive_past_threshold", session, now)
+        return _leaked
+
+    def check_request(self, request_id: str) -> List[OpenSession]:
+        """Logs the sessions a finished request left open
+
+        Args:
+            request_id (str): Request that just finished
+
+        Returns:
+            sessions (List[OpenSession]): Sessions logged as left open
+        """
+        _leaked = [
+            session
+            for session in self.open_sessions(request_id=request_id)
+            if not session.reported
+        ]
+        for session in _leaked:
+            self._report("session_open_after_request", session)
+        return _leaked
+
+    def _report(
+        self, event_name: str, session: OpenSession, now: Optional[float] = None
+    ) -> None:
+        session.reported = True
+        _LOGGER.warning(
+            event_name,
+            opened_by_request=session.request_id,
+            age=round(session.age(now), 3),
+            threshold=self.threshold,
+            stack=session.stack,
+        )
+
+    def _on_begin(
+        self, session: Session, transaction: SessionTransaction, connection: Any
+    ) -> None:
+        with self._lock:
+            if session in self._sessions:
+                return
+            self._sessions[session] = OpenSession(
+                request_id=structlog.contextvars.get_contextvars().get("request_id"),
+                opened_at=time.monotonic(),
+                stack=self._caller_stack(),
+            )
+        self.sweep()
+
+    def _caller_stack(self) -> str:
+        # SQLAlchemy frames and this listener only hide the code using the session
+        _frames = [
+            frame
+            for frame in traceback.extract_stack()
+            if frame.filename != __file__ and _SQLALCHEMY_PATH not in frame.filename
+        ]
+        return "".join(traceback.format_list(_frames[-self.stack_limit :]))
+
+    def _on_transaction_end(
+        self, session: Session, transaction: SessionTransaction
+    ) -> None:
+        if transaction.parent is None:
+            with self._lock:
+                self._sessions.pop(session, None)
@@ -0,0 +1,152 @@
+import dataclasses
+import datetime
+from types import ModuleType
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    delete,
+    func,
+    insert,
+    inspect,
+    select,
+)
+from sqlalchemy.engine import Connection, Engine
+
+from src.allocation.adapters.migrations import (
+    v0001_initial_schema,
+    v0002_allocation_indexes,
+    v0003_allocations_view,
+    v0004_outbox,
+)
+
+_versions_table = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", Integer, primary_key=True, autoincrement=False),
+    Column("description", String(255), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+@dataclasses.dataclass(frozen=True)
+class Migration:
+    """Reversible schema change
+
+    Attributes:
+        version (int): Sequential number of the migration, from its module name.
+        description (str): First line of the module docstring.
+        upgrade (Callable[[Connection], None]): Applies the change.
+        downgrade (Callable[[Connection], None]): Reverts the change.
+    """
+
+    version: int
+    description: str
+    upgrade: Callable[[Connection], None]
+    downgrade: Callable[[Connection], None]
+
+    @classmethod
+    def from_module(cls, module: ModuleType) -> "Migration":
+        _name = module.__name__.rsplit(".", 1)[-1]
+        return cls(
+            version=int(_name.split("_", 1)[0].lstrip("v")),
+            description=(module.__doc__ or _name).strip().splitlines()[0],
+            upgrade=module.upgrade,
+            downgrade=module.downgrade,
+        )
+
+
+MIGRATIONS: Tuple[Migration, ...] = tuple(
+    map(
+        Migration.from_module,
+        (
+            v0001_initial_schema,
+            v0002_allocation_indexes,
+            v0003_allocations_view,
+            v0004_outbox,
+        ),
+    )
+)
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def current_version(connection: Connection) -> int:
+    """Latest migration applied to the database, 0 when none was applied"""
+    if not inspect(connection).has_table(_versions_table.name):
+        return 0
+    return connection.scalar(select(func.max(_versions_table.c.version))) or 0
+
+
+def upgrade(engine: Engine, target: Optional[int] = None) -> List[Migration]:
+    """Applies the pending migrations in order, each one on its own transaction
+
+    Args:
+        engine (Engine): Database to migrate
+        target (Optional[int]): Last version to apply, the latest by default
+
+    Returns:
+        migrations (List[Migration]): Migrations applied
+    """
+    _target = LATEST_VERSION if target is None else target
+    with engine.begin() as connection:
+        _versions_table.create(connection, checkfirst=True)
+        _current = current_version(connection)
+
+    _applied: List[Migration] = []
+    for migration in MIGRATIONS:
+        if not _current < migration.version <= _target:
+            continue
+        with engine.begin() as connection:
+            migration.upgrade(connection)
+            connection.execute(
+                insert(_versions_table).values(
+                    version=migration.version,
+                    description=migration.description,
+                    applied_at=datetime.datetime.utcnow(),
+                )
+            )
+        _applied.append(migration)
+    return _applied
+
+
+def downgrade(engine: Engine, target: int) -> List[Migration]:
+    """Reverts the applied migrations newer than the target, newest first
+
+    Args:
+        engine (Engine): Database to migrate
+        target (int): Version to go back to, 0 reverts every migration
+
+    Returns:
+        migrations (List[Migration]): Migrations reverted
+    """
+    with engine.connect() as connection:
+        _current = current_version(connection)
+
+    _reverted: List[Migration] = []
+    for migration in reversed(MIGRATIONS):
+        if not target < migration.version <= _current:
+            continue
+        with engine.begin() as connection:
+            migration.downgrade(connection)
+            connection.execute(
+                delete(_versions_table).where(
+                    _versions_table.c.version == migration.version
+                )
+            )
+        _reverted.append(migration)
+    return _reverted
+
+
+__all__ = [
+    "Migration",
+    "MIGRATIONS",
+    "LATEST_VERSION",
+    "current_version",
+    "upgrade",
+    "downgrade",
+]
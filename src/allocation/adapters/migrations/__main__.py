@@ -0,0 +1,41 @@
+"""Runs the schema migrations, on the configured MySQL database by default
+
+    python -m src.allocation.adapters.migrations upgrade [target]
+    python -m src.allocation.adapters.migrations downgrade <target>
+    python -m src.allocation.adapters.migrations current
+"""
+import argparse
+from typing import List, Optional
+
+from sqlalchemy import create_engine
+
+from src.allocation.adapters import migrations
+from src.allocation.lib import settings
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m src.allocation.adapters.migrations"
+    )
+    parser.add_argument("--url", default=settings.get_settings().database.mysql_uri)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("current")
+    commands.add_parser("upgrade").add_argument("target", type=int, nargs="?")
+    commands.add_parser("downgrade").add_argument("target", type=int)
+    args = parser.parse_args(argv)
+
+    engine = create_engine(args.url)
+    if args.command == "upgrade":
+        _migrations = migrations.upgrade(engine, target=args.target)
+    elif args.command == "downgrade":
+        _migrations = migrations.downgrade(engine, target=args.target)
+    else:
+        _migrations = []
+    for migration in _migrations:
+        print(f"{args.command} {migration.version:04d}: {migration.description}")
+    with engine.connect() as connection:
+        print(f"current version: {migrations.current_version(connection)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Products, batches, order lines and their allocations"""
+from sqlalchemy import (
+    Column,
+    Date,
+    ForeignKey,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    cast,
+    insert,
+    inspect,
+    select,
+    text,
+)
+from sqlalchemy.engine import Connection
+
+# Snapshot of the schema at this version, later changes go in their own migration
+_metadata = MetaData()
+
+Table(
+    "products",
+    _metadata,
+    Column("sku", String(255), primary_key=True),
+    Column("version_number", Integer, server_default="0", nullable=False),
+)
+Table(
+    "batches",
+    _metadata,
+    Column("id", String(255), primary_key=True),
+    Column("sku", String(255), ForeignKey("products.sku")),
+    Column("purchased_quantity", Integer, nullable=False),
+    Column("eta", Date, nullable=True),
+)
+Table(
+    "order_lines",
+    _metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("sku", String(255)),
+    Column("qty", Integer, nullable=False),
+    Column("order_id", String(255)),
+)
+_allocations = Table(
+    "allocations",
+    _metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("orderline_id", Integer, ForeignKey("order_lines.id")),
+    Column("batch_id", String(255), ForeignKey("batches.id")),
+)
+
+# Tables found when adopting a database created before the migrations, which
+# the downgrade leaves in place
+_adopted_tables = Table(
+    "schema_adopted_tables",
+    MetaData(),
+    Column("name", String(255), primary_key=True),
+)
+
+
+def _convert_batch_id(connection: Connection) -> None:
+    """Turns the legacy integer allocations.batch_id into the batch reference
+    column of the snapshot"""
+    _batch_id = next(
+        column
+        for column in inspect(connection).get_columns(_allocations.name)
+        if column["name"] == "batch_id"
+    )
+    if isinstance(_batch_id["type"], String):
+        return
+    if connection.dialect.name != "sqlite":
+        connection.execute(
+            text("ALTER TABLE allocations MODIFY batch_id VARCHAR(255) NULL")
+        )
+        return
+    # SQLite can't alter a column type, the table is rebuilt instead
+    connection.execute(text("ALTER TABLE allocations RENAME TO allocations_legacy"))
+    _legacy = Table("allocations_legacy", MetaData(), autoload_with=connection)
+    _allocations.create(connection)
+    connection.execute(
+        insert(_allocations).from_select(
+            ["id", "orderline_id", "batch_id"],
+            select(
+                _legacy.c.id,
+                _legacy.c.orderline_id,
+                cast(_legacy.c.batch_id, String(255)),
+            ),
+        )
+    )
+    _legacy.drop(connection)
+
+
+def upgrade(connection: Connection) -> None:
+    # Databases created before the migrations keep their existing tables
+    _existing = [
+        name for name in _metadata.tables if inspect(connection).has_table(name)
+    ]
+    _metadata.create_all(connection, checkfirst=True)
+    if not _existing:
+        return
+    _adopted_tables.create(connection)
+    connection.execute(
+        insert(_adopted_tables), [{"name": name} for name in _existing]
+    )
+    if _allocations.name in _existing:
+        _convert_batch_id(connection)
+
+
+def downgrade(connection: Connection) -> None:
+    _adopted = set()
+    if inspect(connection).has_table(_adopted_tables.name):
+        _adopted = set(connection.scalars(select(_adopted_tables.c.name)))
+        _adopted_tables.drop(connection)
+    # Only the tables created by the upgrade are dropped, with their data
+    _metadata.drop_all(
+        connection,
+        tables=[
+            table for name, table in _metadata.tables.items() if name not in _adopted
+        ],
+        checkfirst=True,
+    )
@@ -0,0 +1,117 @@
+"""Indexes for the aggregate loads and the allocation lookups"""
+from typing import List, Tuple
+
+from sqlalchemy import (
+    Index,
+    MetaData,
+    and_,
+    column,
+    delete,
+    func,
+    select,
+    table,
+    update,
+)
+from sqlalchemy.engine import Connection
+
+# Name, table, columns and uniqueness of each index
+_INDEXES: List[Tuple[str, str, Tuple[str, ...], bool]] = [
+    ("ix_batches_sku", "batches", ("sku",), False),
+    ("uq_order_lines_order_id_sku", "order_lines", ("order_id", "sku"), True),
+    ("uq_allocations_orderline_id", "allocations", ("orderline_id",), True),
+    (
+        "uq_allocations_batch_id_orderline_id",
+        "allocations",
+        ("batch_id", "orderline_id"),
+        True,
+    ),
+]
+
+
+_order_lines = table("order_lines", column("id"), column("order_id"), column("sku"))
+_allocations = table("allocations", column("id"), column("orderline_id"))
+
+
+def _deduplicate(connection: Connection) -> None:
+    """Keeps the first order line of each (order_id, sku) and the first
+    allocation of each order line, so the unique indexes can be created
+
+    The allocations of the duplicate lines are moved to the kept line first.
+    Subqueries over the table being changed go through a grouped derived
+    table, which MySQL materializes.
+    """
+    _keyed = and_(
+        _order_lines.c.order_id.is_not(None), _order_lines.c.sku.is_not(None)
+    )
+    _kept_lines = (
+        select(func.min(_order_lines.c.id).label("id"))
+        .where(_keyed)
+        .group_by(_order_lines.c.order_id, _order_lines.c.sku)
+        .subquery("kept_lines")
+    )
+    _line, _kept = _order_lines.alias("line"), _order_lines.alias("kept")
+    _kept_line_id = (
+        select(func.min(_kept.c.id))
+        .select_from(
+            _line.join(
+                _kept,
+                and_(
+                    _kept.c.order_id == _line.c.order_id,
+                    _kept.c.sku == _line.c.sku,
+                ),
+            )
+        )
+        .where(_line.c.id == _allocations.c.orderline_id)
+        .scalar_subquery()
+    )
+    connection.execute(
+        update(_allocations)
+        .where(
+            _allocations.c.orderline_id.in_(
+                select(_order_lines.c.id).where(
+                    _keyed, _order_lines.c.id.not_in(select(_kept_lines.c.id))
+                )
+            )
+        )
+        .values(orderline_id=_kept_line_id)
+    )
+    _kept_allocations = (
+        select(func.min(_allocations.c.id).label("id"))
+        .group_by(_allocations.c.orderline_id)
+        .subquery("kept_allocations")
+    )
+    connection.execute(
+        delete(_allocations).where(
+            _allocations.c.orderline_id.is_not(None),
+            _allocations.c.id.not_in(select(_kept_allocations.c.id)),
+        )
+    )
+    connection.execute(
+        delete(_order_lines).where(
+            _keyed, _order_lines.c.id.not_in(select(_kept_lines.c.id))
+        )
+    )
+
+
+def _indexes(connection: Connection) -> List[Index]:
+    _metadata = MetaData()
+    _metadata.reflect(connection, only=list({table for _, table, _, _ in _INDEXES}))
+    return [
+        Index(
+            name,
+            *(_metadata.tables[table].c[column] for column in columns),
+            unique=unique
+        )
+        for name, table, columns, unique in _INDEXES
+    ]
+
+
+def upgrade(connection: Connection) -> None:
+    _deduplicate(connection)
+    for index in _indexes(connection):
+        index.create(connection)
+
+
+def downgrade(connection: Connection) -> None:
+    for index in reversed(_indexes(connection)):
+        index.drop(connection)
@@ -0,0 +1,44 @@
+"""Read model of the allocations by order"""
+from sqlalchemy import Column, MetaData, String, Table, column, insert, select, table
+from sqlalchemy.engine import Connection
+
+_metadata = MetaData()
+
+# The primary key leads with order_id, the column the reads filter on
+_allocations_view = Table(
+    "allocations_view",
+    _metadata,
+    Column("order_id", String(255), primary_key=True),
+    Column("sku", String(255), primary_key=True),
+    Column("batch_ref", String(255), nullable=False),
+)
+
+_order_lines = table("order_lines", column("id"), column("order_id"), column("sku"))
+_allocations = table("allocations", column("orderline_id"), column("batch_id"))
+
+
+def upgrade(connection: Connection) -> None:
+    _allocations_view.create(connection)
+    # Backfilled with the allocations made before the read model existed
+    connection.execute(
+        insert(_allocations_view).from_select(
+            ["order_id", "sku", "batch_ref"],
+            select(
+                _order_lines.c.order_id, _order_lines.c.sku, _allocations.c.batch_id
+            )
+            .join_from(
+                _allocations,
+                _order_lines,
+                _order_lines.c.id == _allocations.c.orderline_id,
+            )
+            .where(
+                _order_lines.c.order_id.is_not(None),
+                _order_lines.c.sku.is_not(None),
+                _allocations.c.batch_id.is_not(None),
+            ),
+        )
+    )
+
+
+def downgrade(connection: Connection) -> None:
+    _allocations_view.drop(connection)
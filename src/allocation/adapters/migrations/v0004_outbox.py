@@ -0,0 +1,35 @@
+"""Outbox of the domain events committed with the aggregates"""
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    Text,
+)
+from sqlalchemy.engine import Connection
+
+_metadata = MetaData()
+
+_outbox = Table(
+    "outbox",
+    _metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("event_type", String(255), nullable=False),
+    Column("payload", Text, nullable=False),
+    Column("created_at", DateTime, nullable=False),
+    Column("claimed_by", String(32), nullable=True),
+    Column("claimed_until", DateTime, nullable=True),
+    Index("ix_outbox_claimed_until", "claimed_until"),
+    Index("ix_outbox_claimed_by", "claimed_by"),
+)
+
+
+def upgrade(connection: Connection) -> None:
+    _outbox.create(connection)
+
+
+def downgrade(connection: Connection) -> None:
+    _outbox.drop(connection)
@@ -0,0 +1,169 @@
+import asyncio
+import dataclasses
+import random
+from functools import lru_cache
+from typing import List
+
+import structlog
+
+from src.allocation.adapters import email
+from src.allocation.lib import settings
+
+_LOGGER = structlog.get_logger()
+
+
+@dataclasses.dataclass(frozen=True)
+class NotifierStatistics:
+    """Snapshot of the notification queue
+
+    Attributes:
+        queued (int): Messages waiting for a worker.
+        sent (int): Messages delivered.
+        failed (int): Messages given up after the last retry.
+        dropped (int): Messages rejected because the queue was full.
+    """
+
+    queued: int
+    sent: int
+    failed: int
+    dropped: int
+
+
+class Notifier:
+    """Delivers the notifications off the request path
+
+    Messages are published on a bounded queue and delivered by background
+    workers, each one sending the messages waiting on the queue over a single
+    mail server session and retrying failed sessions with a jittered backoff.
+
+    Args:
+        mailer (AbstractMailer): Mailer delivering the messages
+        notification_settings (_NotificationSettings): Queue and retry settings
+    """
+
+    def __init__(
+        self,
+        mailer: email.AbstractMailer,
+        notification_settings: settings._NotificationSettings,  # pyright: ignore
+    ) -> None:
+        self.mailer = mailer
+        self.settings = notification_settings
+        self._queue: "asyncio.Queue[email.Message]" = asyncio.Queue(
+            maxsize=notification_settings.queue_size
+        )
+        self._workers: List["asyncio.Task[None]"] = []
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def publish(self, message: email.Message) -> bool:
+        """Queues a message without waiting for its delivery
+
+        Args:
+            message (Message): Message to deliver
+
+        Returns:
+            queued (bool): Whether the message was queued, False when the queue
+            is full and the message was dropped
+        """
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            _LOGGER.warning("notification_dropped", to=message.to)
+            return False
+        return True
+
+    async def start(self) -> None:
+        """Starts the workers on the running event loop"""
+        if not self._workers:
+            self._workers = [
+                asyncio.create_task(self._work())
+                for _ in range(self.settings.workers)
+            ]
+
+    async def stop(self) -> None:
+        """Waits for the queued messages up to the shutdown timeout, then stops
+        the workers"""
+        if not self._workers:
+            return
+        try:
+            await asyncio.wait_for(
+                self._queue.join(), timeout=self.settings.shutdown_timeout
+            )
+        except asyncio.TimeoutError:
+            _LOGGER.warning("notifications_pending", queued=self._queue.qsize())
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def statistics(self) -> NotifierStatistics:
+        return NotifierStatistics(
+            queued=self._queue.qsize(),
+            sent=self.sent,
+            failed=self.failed,
+            dropped=self.dropped,
+        )
+
+    async def _work(self) -> None:
+        while True:
+            _batch = [await self._queue.get()]
+            while len(_batch) < self.settings.batch_size and not self._queue.empty():
+                _batch.append(self._queue.get_nowait())
+            try:
+                await self._deliver(_batch)
+            except Exception:
+                # An unexpected error must not stop the worker for good
+                self.failed += len(_batch)
+                _LOGGER.exception("notifications_failed", messages=len(_batch))
+            finally:
+                for _ in _batch:
+                    self._queue.task_done()
+
+    async def _deliver(self, messages: List[email.Message]) -> None:
+        _retries = self.settings.retries
+        for attempt in range(_retries + 1):
+            try:
+                await self.mailer.send(messages)
+            except email.MailDeliveryException as error:
+                if attempt == _retries:
+                    self.failed += len(messages)
+                    _LOGGER.error(
+                        "notifications_failed",
+                        messages=len(messages),
+                        error=str(error),
+                    )
+                    return
+                await asyncio.sleep(self._backoff_delay(attempt=attempt))
+            else:
+                self.sent += len(messages)
+                return
+
+    def _backoff_delay(self, attempt: int) -> float:
+        """Full jitter exponential backoff, in seconds"""
+        _ceiling = min(
+            self.settings.retry_backoff_max,
+            self.settings.retry_backoff_base * 2**attempt,
+        )
+        return random.uniform(0, _ceiling)
+
+
+@lru_cache()
+def get_notifier() -> Notifier:
+    """Notifier of the application settings, shared by the whole process
+
+    Returns:
+        Notifier: Notifier using the SMTP server when one is configured, the
+        console otherwise
+    """
+    _settings = settings.get_settings().notifications
+    _mailer: email.AbstractMailer = email.ConsoleMailer()
+    if _settings.smtp_host is not None:
+        _mailer = email.SmtpMailer(
+            host=_settings.smtp_host,
+            port=_settings.smtp_port,
+            sender=_settings.sender,
+            timeout=_settings.smtp_timeout,
+        )
+    return Notifier(mailer=_mailer, notification_settings=_settings)
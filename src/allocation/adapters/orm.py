@@ -1,7 +1,17 @@
 import datetime
-from typing import List, Set
-
-from sqlalchemy import Column, Date, ForeignKey, Integer, String, Table
+from typing import List
+
+from sqlalchemy import (
+    Column,
+    Date,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Table,
+    Text,
+)
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 from src.allocation.domain.model import aggregate
@@ -11,12 +21,44 @@ class Base(DeclarativeBase):
     ...
 
 
+# Tables and indexes match the latest version of the schema migrations
 allocations_table = Table(
     "allocations",
     Base.metadata,
     Column("id", Integer, primary_key=True, autoincrement=True),
     Column("orderline_id", Integer, ForeignKey("order_lines.id")),
-    Column("batch_id", Integer, ForeignKey("batches.id")),
+    Column("batch_id", String(255), ForeignKey("batches.id")),
+    # An order line is allocated to a single batch
+    Index("uq_allocations_orderline_id", "orderline_id", unique=True),
+    Index(
+        "uq_allocations_batch_id_orderline_id",
+        "batch_id",
+        "orderline_id",
+        unique=True,
+    ),
+)
+
+# Read model of the allocations by order, maintained from the allocation events
+allocations_view_table = Table(
+    "allocations_view",
+    Base.metadata,
+    Column("order_id", String(255), primary_key=True),
+    Column("sku", String(255), primary_key=True),
+    Column("batch_ref", String(255), nullable=False),
+)
+
+# Domain events committed with the aggregates, until the relay publishes them
+outbox_table = Table(
+    "outbox",
+    Base.metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("event_type", String(255), nullable=False),
+    Column("payload", Text, nullable=False),
+    Column("created_at", DateTime, nullable=False),
+    Column("claimed_by", String(32), nullable=True),
+    Column("claimed_until", DateTime, nullable=True),
+    Index("ix_outbox_claimed_until", "claimed_until"),
+    Index("ix_outbox_claimed_by", "claimed_by"),
 )
 
 
@@ -37,21 +79,23 @@ class ProductMapper(Base):
         product: aggregate.Product,
     ) -> "ProductMapper":
         return ProductMapper(
-            **product.dict(exclude={"events", "batches"}),
+            **product.column_values(),
             batches=list(map(BatchMapper.from_domain, product.batches)),
         )
 
 
 class BatchMapper(Base):
     __tablename__ = "batches"
+    __table_args__ = (Index("ix_batches_sku", "sku"),)
 
     id: Mapped[str] = mapped_column(String(255), primary_key=True)
     sku: Mapped[str] = mapped_column(String(255), ForeignKey("products.sku"))
     purchased_quantity: Mapped[int] = mapped_column(Integer, nullable=False)
     eta: Mapped[datetime.date] = mapped_column(Date, nullable=True)
 
-    _allocations: Mapped[Set["OrderLineMapper"]] = relationship(
-        secondary=allocations_table
+    _allocations: Mapped[List["OrderLineMapper"]] = relationship(
+        secondary=allocations_table,
+        order_by=allocations_table.c.id,
     )
 
     @staticmethod
@@ -59,15 +103,19 @@ class BatchMapper(Base):
         batch: aggregate.Batch,
     ) -> "BatchMapper":
         return BatchMapper(
-            **batch.dict(),
-            _allocations=set(map(OrderLineMapper.from_domain, batch.allocations)),
+            **batch.column_values(),
+            _allocations=list(map(OrderLineMapper.from_domain, batch.allocations)),
         )
 
 
 class OrderLineMapper(Base):
     __tablename__ = "order_lines"
+    # An order asks once for each product, retries must land on the same row
+    __table_args__ = (
+        Index("uq_order_lines_order_id_sku", "order_id", "sku", unique=True),
+    )
 
-    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     sku: Mapped[str] = mapped_column(String(255))
     qty: Mapped[int] = mapped_column(Integer, nullable=False)
     order_id: Mapped[str] = mapped_column(String(255))
@@ -76,7 +124,4 @@ class OrderLineMapper(Base):
     def from_domain(
         order_line: aggregate.OrderLine,
     ) -> "OrderLineMapper":
-        return OrderLineMapper(
-            **order_line.dict(),
-            id=hash(order_line),
-        )
+        return OrderLineMapper(**order_line.column_values())
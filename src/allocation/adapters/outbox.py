@@ -0,0 +1,248 @@
+import abc
+import asyncio
+import dataclasses
+import datetime
+import uuid
+from functools import lru_cache
+from typing import Callable, Iterable, List, Optional, Sequence
+
+import structlog
+from sqlalchemy import delete, insert, or_, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from src.allocation.adapters import database, orm
+from src.allocation.lib import base_types, settings
+
+_LOGGER = structlog.get_logger()
+_outbox = orm.outbox_table
+
+
+def add_events(session: Session, events: Iterable[base_types.Event]) -> None:
+    """Writes the events to the outbox on the transaction of the session, so
+    they are committed or rolled back with the aggregate that raised them
+
+    Args:
+        session (Session): Session of the unit of work
+        events (Iterable[Event]): Events raised by the aggregates
+    """
+    _now = datetime.datetime.utcnow()
+    _rows = [
+        {
+            "event_type": type(event).__name__,
+            "payload": event.json(),
+            "created_at": _now,
+        }
+        for event in events
+    ]
+    if _rows:
+        session.connection().execute(insert(_outbox), _rows)
+
+
+@dataclasses.dataclass(frozen=True)
+class OutboxRecord:
+    """Event claimed from the outbox
+
+    Attributes:
+        id (int): Outbox row, increasing in commit order.
+        event_type (str): Class name of the event.
+        payload (str): Event serialized as JSON.
+        created_at (datetime): UTC time when the event was committed.
+    """
+
+    id: int
+    event_type: str
+    payload: str
+    created_at: datetime.datetime
+
+
+@dataclasses.dataclass(frozen=True)
+class RelayStatistics:
+    """Snapshot of the outbox relay
+
+    Attributes:
+        published (int): Events published.
+        batches (int): Batches published.
+        failures (int): Batches the sink failed to publish, left to retry.
+        lag_last (float): Seconds between the commit and the publication of the
+            oldest event of the last batch.
+        lag_max (float): Longest lag seen, in seconds.
+    """
+
+    published: int
+    batches: int
+    failures: int
+    lag_last: float
+    lag_max: float
+
+
+class AbstractEventSink(abc.ABC):
+    @abc.abstractmethod
+    async def publish(self, records: Sequence[OutboxRecord]) -> None:
+        """Publishes a batch of events, raising when any of them wasn't"""
+        raise NotImplementedError
+
+
+class LoggingEventSink(AbstractEventSink):
+    async def publish(self, records: Sequence[OutboxRecord]) -> None:
+        for record in records:
+            _LOGGER.info(
+                "event_published",
+                event_type=record.event_type,
+                payload=record.payload,
+            )
+
+
+class OutboxRelay:
+    """Publishes the outbox events in batches, then deletes them
+
+    Each batch is claimed with a lease, through ``SKIP LOCKED`` where the
+    database supports it, so several relays never publish the same rows at
+    once. A relay dying after publishing leaves its rows to be claimed again
+    once the lease expires, delivering each event at least once.
+
+    Args:
+        engine (Engine): Database holding the outbox
+        sink (AbstractEventSink): Destination of the events
+        outbox_settings (_OutboxSettings): Batch, polling and lease settings
+        clock (Callable[[], datetime]): UTC time source
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        sink: AbstractEventSink,
+        outbox_settings: settings._OutboxSettings,  # pyright: ignore
+        clock: Callable[[], datetime.datetime] = datetime.datetime.utcnow,
+    ) -> None:
+        self.engine = engine
+        self.sink = sink
+        self.settings = outbox_settings
+        self._clock = clock
+        self._task: Optional["asyncio.Task[None]"] = None
+        self.published = 0
+        self.batches = 0
+        self.failures = 0
+        self.lag_last = 0.0
+        self.lag_max = 0.0
+
+    async def relay_once(self) -> int:
+        """Claims, publishes and deletes a single batch
+
+        Returns:
+            published (int): Events published, 0 when the outbox is empty or
+            the sink failed
+        """
+        _claim = uuid.uuid4().hex
+        _records = await asyncio.to_thread(self._claim, _claim)
+        if not _records:
+            return 0
+        try:
+            await self.sink.publish(_records)
+        except Exception as error:
+            # The rows are claimed again once the lease expires
+            self.failures += 1
+            _LOGGER.error(
+                "outbox_publish_failed", events=len(_records), error=str(error)
+            )
+            return 0
+        await asyncio.to_thread(self._delete, _claim)
+        self._record_batch(_records)
+        return len(_records)
+
+    async def start(self) -> None:
+        """Starts relaying on the running event loop"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def statistics(self) -> RelayStatistics:
+        return RelayStatistics(
+            published=self.published,
+            batches=self.batches,
+            failures=self.failures,
+            lag_last=self.lag_last,
+            lag_max=self.lag_max,
+        )
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                _published = await self.relay_once()
+            except Exception:
+                # A database error must not stop the relay for good
+                self.failures += 1
+                _LOGGER.exception("outbox_relay_failed")
+                await asyncio.sleep(self.settings.relay_poll_interval)
+                continue
+            # A full batch means more events are waiting, relay them right away
+            if _published < self.settings.relay_batch_size:
+                await asyncio.sleep(self.settings.relay_poll_interval)
+
+    def _claim(self, claim: str) -> List[OutboxRecord]:
+        _now = self._clock()
+        _claimable = or_(
+            _outbox.c.claimed_until.is_(None), _outbox.c.claimed_until < _now
+        )
+        with self.engine.begin() as connection:
+            _ids = connection.scalars(
+                select(_outbox.c.id)
+                .where(_claimable)
+                .order_by(_outbox.c.id)
+                .limit(self.settings.relay_batch_size)
+                .with_for_update(skip_locked=True)
+            ).all()
+            if not _ids:
+                return []
+            # Checked again for databases without SKIP LOCKED, a row claimed by
+            # another relay since the select is skipped
+            connection.execute(
+                update(_outbox)
+                .where(_outbox.c.id.in_(_ids), _claimable)
+                .values(
+                    claimed_by=claim,
+                    claimed_until=_now
+                    + datetime.timedelta(seconds=self.settings.relay_lease),
+                )
+            )
+            _rows = connection.execute(
+                select(
+                    _outbox.c.id,
+                    _outbox.c.event_type,
+                    _outbox.c.payload,
+                    _outbox.c.created_at,
+                )
+                .where(_outbox.c.claimed_by == claim)
+                .order_by(_outbox.c.id)
+            )
+            return [OutboxRecord(*row) for row in _rows]
+
+    def _delete(self, claim: str) -> None:
+        with self.engine.begin() as connection:
+            connection.execute(delete(_outbox).where(_outbox.c.claimed_by == claim))
+
+    def _record_batch(self, records: Sequence[OutboxRecord]) -> None:
+        _lag = (self._clock() - records[0].created_at).total_seconds()
+        self.published += len(records)
+        self.batches += 1
+        self.lag_last = _lag
+        self.lag_max = max(self.lag_max, _lag)
+
+
+@lru_cache()
+def get_relay() -> OutboxRelay:
+    """Relay of the application database, shared by the whole process
+
+    Returns:
+        OutboxRelay: Relay logging the published events
+    """
+    return OutboxRelay(
+        engine=database.get_database().engine,
+        sink=LoggingEventSink(),
+        outbox_settings=settings.get_settings().outbox,
+    )
@@ -0,0 +1,104 @@
+import dataclasses
+import re
+from typing import Any, FrozenSet, List, Optional, Set, Tuple, Union
+
+from sqlalchemy.engine import Connection
+from sqlalchemy.sql import ClauseElement
+
+# SQLite plan lines: "SEARCH batches USING INDEX ix_batches_sku (sku=?)", "SCAN t"
+_SQLITE_STEP = re.compile(
+    r"^(?P<access>SCAN|SEARCH) (?:TABLE )?(?P<table>\S+)(?: AS \S+)?"
+    r"(?: USING (?:(?P<covering>COVERING )?INDEX (?P<index>\S+)"
+    r"|(?P<primary>INTEGER PRIMARY KEY)))?"
+)
+# MySQL access types reading every row of the table or of the index
+_MYSQL_FULL_SCANS = {"ALL", "index"}
+
+
+@dataclasses.dataclass(frozen=True)
+class QueryPlan:
+    """Access paths chosen by the database for a statement
+
+    Attributes:
+        steps (Tuple[str, ...]): Plan lines as reported by the database.
+        indexes (FrozenSet[str]): Indexes used to reach the rows, PRIMARY for
+            primary key lookups.
+        full_scans (FrozenSet[str]): Tables or indexes read entirely.
+    """
+
+    steps: Tuple[str, ...]
+    indexes: FrozenSet[str]
+    full_scans: FrozenSet[str]
+
+
+def explain(
+    connection: Connection,
+    statement: Union[str, ClauseElement],
+    parameters: Optional[Any] = None,
+) -> QueryPlan:
+    """Asks the database how it runs a statement, without running it
+
+    Args:
+        connection (Connection): Connection to the database, SQLite or MySQL
+        statement (Union[str, ClauseElement]): SQL as sent to the driver, like
+            the one seen by cursor events, or a statement compiled with its values
+        parameters (Optional[Any]): Driver parameters of a SQL string
+
+    Raises:
+        NotImplementedError: Raise for other databases
+
+    Returns:
+        plan (QueryPlan): Indexes used and tables fully scanned
+    """
+    if isinstance(statement, ClauseElement):
+        statement = str(
+            statement.compile(
+                dialect=connection.dialect, compile_kwargs={"literal_binds": True}
+            )
+        )
+
+    if connection.dialect.name == "sqlite":
+        _rows = connection.exec_driver_sql(
+            f"EXPLAIN QUERY PLAN {statement}", parameters or ()
+        )
+        return _sqlite_plan([row[3] for row in _rows])
+    if connection.dialect.name == "mysql":
+        _rows = connection.exec_driver_sql(f"EXPLAIN {statement}", parameters)
+        return _mysql_plan([dict(row._mapping) for row in _rows])
+    raise NotImplementedError(f"No query plan support for {connection.dialect.name}")
+
+
+def _sqlite_plan(details: List[str]) -> QueryPlan:
+    _indexes: Set[str] = set()
+    _full_scans: Set[str] = set()
+    for detail in details:
+        _step = _SQLITE_STEP.match(detail)
+        if _step is None:
+            continue
+        if _step["index"]:
+            _indexes.add(_step["index"])
+        elif _step["primary"]:
+            _indexes.add("PRIMARY")
+        if _step["access"] == "SCAN":
+            _full_scans.add(_step["index"] or _step["table"])
+    return QueryPlan(
+        steps=tuple(details),
+        indexes=frozenset(_indexes),
+        full_scans=frozenset(_full_scans),
+    )
+
+
+def _mysql_plan(rows: List[Any]) -> QueryPlan:
+    _indexes = {row["key"] for row in rows if row.get("key")}
+    _full_scans = {
+        row.get("key") or row["table"]
+        for row in rows
+        if row.get("type") in _MYSQL_FULL_SCANS
+    }
+    return QueryPlan(
+        steps=tuple(
+            f"{row.get('table')} {row.get('type')} {row.get('key')}" for row in rows
+        ),
+        indexes=frozenset(_indexes),
+        full_scans=frozenset(_full_scans),
+    )
@@ -0,0 +1,187 @@
+import collections
+import contextlib
+import contextvars
+import dataclasses
+import os
+import re
+import threading
+import time
+import traceback
+from typing import Any, Counter, Iterator, List, Optional, Tuple
+
+import sqlalchemy
+import structlog
+from sqlalchemy import event
+from sqlalchemy.engine import Connection, Engine, ExceptionContext
+from sqlalchemy.orm import Session, SessionTransaction
+from sqlalchemy.pool import Pool
+
+_LOGGER = structlog.get_logger()
+_SQLALCHEMY_PATH = os.path.dirname(sqlalchemy.__file__)
+# Keys of the pooled connection info, which outlives each checkout
+_SESSION_SHAPES = "statement_tracking_session_shapes"
+_STARTED = "statement_tracking_started"
+
+_WHITESPACE = re.compile(r"\s+")
+# Expanded IN lists, so their shape doesn't depend on the number of values
+_PLACEHOLDER = r"(?:\?|%s|%\(\w+\)s)"
+_PARAMETER_LIST = re.compile(rf"\(\s*{_PLACEHOLDER}(?:\s*,\s*{_PLACEHOLDER})*\s*\)")
+
+
+def statement_shape(statement: str) -> str:
+    """Statement with its whitespace collapsed and its IN lists folded, equal
+    for the statements only differing by their parameters"""
+    return _PARAMETER_LIST.sub("(?)", _WHITESPACE.sub(" ", statement).strip())
+
+
+@dataclasses.dataclass
+class RequestStatements:
+    """Statements run for a single request
+
+    Attributes:
+        count (int): Statements executed.
+        duration (float): Seconds spent executing them.
+        slowest (List[Tuple[float, str]]): Slowest statements with their
+            duration, slowest first.
+        keep (int): Slowest statements kept.
+    """
+
+    count: int = 0
+    duration: float = 0.0
+    slowest: List[Tuple[float, str]] = dataclasses.field(default_factory=list)
+    keep: int = 3
+    _lock: threading.Lock = dataclasses.field(
+        default_factory=threading.Lock, init=False, repr=False, compare=False
+    )
+
+    def record(self, statement: str, duration: float) -> None:
+        with self._lock:
+            self.count += 1
+            self.duration += duration
+            if len(self.slowest) < self.keep or duration > self.slowest[-1][0]:
+                self.slowest.append((duration, statement))
+                self.slowest.sort(reverse=True)
+                del self.slowest[self.keep :]
+
+
+_REQUEST: "contextvars.ContextVar[Optional[RequestStatements]]" = (
+    contextvars.ContextVar("request_statements", default=None)
+)
+
+
+class StatementTracker:
+    """Counts and times the SQL statements of each request, and warns when a
+    unit of work runs the same statement shape over and over, the sign of a
+    lazy load or a query issued in a loop
+
+    Statements are attributed to the request tracked on the current context,
+    which ``asyncio.to_thread`` carries to the worker threads, and to the
+    session whose transaction holds the connection. The warnings are logged
+    with the request id of the structlog context.
+
+    Args:
+        n_plus_one_threshold (int): Runs of one shape allowed per session
+        slow_statements (int): Slowest statements kept per request
+        stack_limit (int): Frames of the calling stack logged with a warning
+    """
+
+    def __init__(
+        self,
+        n_plus_one_threshold: int = 10,
+        slow_statements: int = 3,
+        stack_limit: int = 8,
+    ) -> None:
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.slow_statements = slow_statements
+        self.stack_limit = stack_limit
+
+    def install(self) -> None:
+        event.listen(Engine, "before_cursor_execute", self._before_execute)
+        event.listen(Engine, "after_cursor_execute", self._after_execute)
+        event.listen(Engine, "handle_error", self._on_error)
+        event.listen(Session, "after_begin", self._on_begin)
+        event.listen(Pool, "checkin", self._on_checkin)
+
+    def uninstall(self) -> None:
+        event.remove(Engine, "before_cursor_execute", self._before_execute)
+        event.remove(Engine, "after_cursor_execute", self._after_execute)
+        event.remove(Engine, "handle_error", self._on_error)
+        event.remove(Session, "after_begin", self._on_begin)
+        event.remove(Pool, "checkin", self._on_checkin)
+
+    @contextlib.contextmanager
+    def track(self) -> Iterator[RequestStatements]:
+        """Attributes the statements run on the current context to a request
+
+        Yields:
+            statements (RequestStatements): Figures of the request, updated as
+            its statements run
+        """
+        _statements = RequestStatements(keep=self.slow_statements)
+        _token = _REQUEST.set(_statements)
+        try:
+            yield _statements
+        finally:
+            _REQUEST.reset(_token)
+
+    def _on_begin(
+        self, session: Session, transaction: SessionTransaction, connection: Any
+    ) -> None:
+        _shapes = session.info.setdefault(_SESSION_SHAPES, collections.Counter())
+        connection.info[_SESSION_SHAPES] = _shapes
+
+    def _on_checkin(self, dbapi_connection: Any, connection_record: Any) -> None:
+        # Back in the pool the connection no longer belongs to the session
+        connection_record.info.pop(_SESSION_SHAPES, None)
+
+    def _before_execute(self, connection: Connection, *args: Any) -> None:
+        connection.info.setdefault(_STARTED, []).append(time.perf_counter())
+
+    def _on_error(self, context: ExceptionContext) -> None:
+        # A failed statement never reaches _after_execute, its start time would
+        # stay on the pooled connection
+        _started = (
+            None
+            if context.connection is None
+            else context.connection.info.get(_STARTED)
+        )
+        if _started and context.statement is not None:
+            _started.pop()
+
+    def _after_execute(
+        self,
+        connection: Connection,
+        cursor: Any,
+        statement: str,
+        *args: Any,
+    ) -> None:
+        _started = connection.info.get(_STARTED)
+        if not _started:
+            # Installed while the statement was running
+            return
+        _duration = time.perf_counter() - _started.pop()
+        _request = _REQUEST.get()
+        if _request is not None:
+            _request.record(statement, _duration)
+        _shapes: Optional[Counter[str]] = connection.info.get(_SESSION_SHAPES)
+        if _shapes is None:
+            return
+        _shape = statement_shape(statement)
+        _shapes[_shape] += 1
+        # Warned once per shape and session, when crossing the threshold
+        if _shapes[_shape] == self.n_plus_one_threshold + 1:
+            _LOGGER.warning(
+                "n_plus_one_statements",
+                statement=_shape,
+                runs=_shapes[_shape],
+                threshold=self.n_plus_one_threshold,
+                stack=self._caller_stack(),
+            )
+
+    def _caller_stack(self) -> str:
+        _frames = [
+            frame
+            for frame in traceback.extract_stack()
+            if frame.filename != __file__ and _SQLALCHEMY_PATH not in frame.filename
+        ]
+        return "".join(traceback.format_list(_frames[-self.stack_limit :]))
@@ -1,9 +1,12 @@
+import bisect
+import dataclasses
 import datetime
-from typing import Any, List, Optional, Set
+from typing import AbstractSet, Any, Dict, List, Optional, Tuple
 
 import pydantic
 import pydash
 
+from src.allocation.domain.model import deallocation
 from src.allocation.domain.model import events as domain_events
 from src.allocation.lib import base_types
 
@@ -16,20 +19,27 @@ class BatchNotFoundException(Exception):
     """Raise when the specified batch to obtain doesn't exist"""
 
 
+@dataclasses.dataclass(frozen=True, eq=False, slots=True)
 class OrderLine(base_types.ValueObject):
     """Client order for an specific product
 
     Attributes:
         sku (str): Unique product identifier. ex. RED-CHAIR
         order_id (str): Unique order identifier
-        qty (int): Number of product units for the order
+        qty (int): Number of product units for the order, positive as
+            validated by the commands raising the allocations
     """
 
     sku: str
     order_id: str
-    qty: int = pydantic.Field(..., gt=0)
+    qty: int
 
 
+def _dict_field() -> Any:
+    return dataclasses.field(default_factory=dict, init=False, repr=False)
+
+
+@dataclasses.dataclass(eq=False, slots=True)
 class Batch(base_types.Entity):
     """Batch of stock ordered by the purchasing department
 
@@ -43,7 +53,40 @@ class Batch(base_types.Entity):
     sku: str
     eta: Optional[datetime.date]
     purchased_quantity: int
-    _allocations: Set[OrderLine] = pydantic.PrivateAttr(default_factory=set)
+    # Insertion ordered, oldest allocation first
+    _allocations: Dict[OrderLine, None] = _dict_field()
+    _allocated_quantity: int = dataclasses.field(default=0, init=False, repr=False)
+    # Changes since the batch was loaded or last persisted
+    _is_new: bool = dataclasses.field(default=True, init=False, repr=False)
+    _persisted_quantity: Optional[int] = dataclasses.field(
+        default=None, init=False, repr=False
+    )
+    _added_allocations: Dict[OrderLine, None] = _dict_field()
+    _removed_allocations: Dict[OrderLine, None] = _dict_field()
+
+    @classmethod
+    def from_orm(cls, obj: Any) -> "Batch":
+        """Hydrates the batch and its allocated order lines from an ORM object
+
+        Args:
+            obj (Any): ORM object exposing the batch fields and its allocations
+
+        Returns:
+            batch (Batch): Batch with its allocations and allocated total rebuilt
+        """
+        # Slotted dataclasses are rebuilt by the decorator, super() can't be used
+        batch = cls(
+            id=obj.id,
+            sku=obj.sku,
+            eta=obj.eta,
+            purchased_quantity=obj.purchased_quantity,
+        )
+        batch._allocations = dict.fromkeys(
+            map(OrderLine.from_orm, getattr(obj, "_allocations", ()))
+        )
+        batch._allocated_quantity = sum(line.qty for line in batch._allocations)
+        batch.mark_persisted()
+        return batch
 
     def __gt__(self, other: "Batch") -> bool:
         if self.eta is None:
@@ -58,8 +101,10 @@ class Batch(base_types.Entity):
         Args:
             line (OrderLine): Order to allocate on this Batch
         """
-        if self.can_allocate(line):
-            self._allocations.add(line)
+        if line not in self._allocations and self.can_allocate(line):
+            self._allocations[line] = None
+            self._allocated_quantity += line.qty
+            self._track_allocation(line)
 
     def deallocate(self, line: OrderLine) -> None:
         """Removes order from batch if allocated
@@ -68,7 +113,9 @@ class Batch(base_types.Entity):
             line (OrderLine): Order to deallocate from this Batch
         """
         if line in self._allocations:
-            self._allocations.remove(line)
+            del self._allocations[line]
+            self._allocated_quantity -= line.qty
+            self._track_deallocation(line)
 
     def deallocate_one(self) -> OrderLine:
         """Removes last allocated order from batch
@@ -76,7 +123,35 @@ class Batch(base_types.Entity):
         Returns:
             line (OrderLine): Order deallocated from this Batch
         """
-        return self._allocations.pop()
+        line, _ = self._allocations.popitem()
+        self._allocated_quantity -= line.qty
+        self._track_deallocation(line)
+        return line
+
+    def deallocate_excess(
+        self,
+        policy: deallocation.DeallocationPolicy = (
+            deallocation.DeallocationPolicy.FEWEST_LINES
+        ),
+    ) -> List[OrderLine]:
+        """Removes allocated orders until the batch is no longer over-allocated
+
+        Args:
+            policy (DeallocationPolicy): Strategy used to pick the orders to remove
+
+        Returns:
+            lines (List[OrderLine]): Orders deallocated from this Batch
+        """
+        lines = deallocation.plan_deallocation(
+            lines=list(self._allocations),
+            shortfall=-self.available_quantity,
+            policy=policy,
+        )
+        for line in lines:
+            del self._allocations[line]
+            self._allocated_quantity -= line.qty
+            self._track_deallocation(line)
+        return lines
 
     def can_allocate(self, line: OrderLine) -> bool:
         """Validates if there are available resources to allocate a new order
@@ -97,7 +172,7 @@ class Batch(base_types.Entity):
         Returns:
             total (int): Quantity of products allocated.
         """
-        return sum(line.qty for line in self._allocations)
+        return self._allocated_quantity
 
     @property
     def available_quantity(self) -> int:
@@ -109,14 +184,104 @@ class Batch(base_types.Entity):
         return self.purchased_quantity - self.allocated_quantity
 
     @property
-    def allocations(self) -> Set[OrderLine]:
+    def allocations(self) -> AbstractSet[OrderLine]:
         """Read OrderLines allocated on this batch.
 
         Returns:
-            _allocations (Set[OrderLine]): Collection of order lines
-            allocated on Batch.
+            _allocations (AbstractSet[OrderLine]): Collection of order lines
+            allocated on Batch, oldest allocation first.
         """
-        return self._allocations
+        return self._allocations.keys()
+
+    @property
+    def is_new(self) -> bool:
+        """Whether the batch was never persisted"""
+        return self._is_new
+
+    @property
+    def is_resized(self) -> bool:
+        """Whether the purchased quantity changed since the batch was persisted"""
+        return (
+            not self._is_new and self.purchased_quantity != self._persisted_quantity
+        )
+
+    @property
+    def added_allocations(self) -> AbstractSet[OrderLine]:
+        """Order lines allocated since the batch was persisted"""
+        return self._added_allocations.keys()
+
+    @property
+    def removed_allocations(self) -> AbstractSet[OrderLine]:
+        """Persisted order lines deallocated since the batch was persisted"""
+        return self._removed_allocations.keys()
+
+    def mark_persisted(self) -> None:
+        """Records the current state as the persisted one, clearing the changes"""
+        self._is_new = False
+        self._persisted_quantity = self.purchased_quantity
+        self._added_allocations.clear()
+        self._removed_allocations.clear()
+
+    def _track_allocation(self, line: OrderLine) -> None:
+        if line in self._removed_allocations:
+            # Allocated again before persisting, the stored row is still there
+            del self._removed_allocations[line]
+        else:
+            self._added_allocations[line] = None
+
+    def _track_deallocation(self, line: OrderLine) -> None:
+        if line in self._added_allocations:
+            # Never persisted, there's no row to delete
+            del self._added_allocations[line]
+        else:
+            self._removed_allocations[line] = None
+
+
+@dataclasses.dataclass(frozen=True)
+class ProductChanges:
+    """Rows to write so the stored product matches the aggregate
+
+    Attributes:
+        sku (str): Unique product identifier.
+        version_number (int): Current version of the product.
+        persisted_version (Optional[int]): Version last persisted, None when the
+            product was never persisted.
+        new_batches (List[Batch]): Batches never persisted.
+        resized_batches (List[Batch]): Persisted batches whose purchased quantity
+            changed.
+        added_allocations (List[Tuple[str, OrderLine]]): Batch reference and order
+            line of each new allocation.
+        removed_allocations (List[Tuple[str, OrderLine]]): Batch reference and
+            order line of each persisted allocation released.
+    """
+
+    sku: str
+    version_number: int
+    persisted_version: Optional[int]
+    new_batches: List[Batch]
+    resized_batches: List[Batch]
+    added_allocations: List[Tuple[str, OrderLine]]
+    removed_allocations: List[Tuple[str, OrderLine]]
+
+    @property
+    def is_new(self) -> bool:
+        return self.persisted_version is None
+
+    @property
+    def is_empty(self) -> bool:
+        return not (
+            self.is_new
+            or self.version_number != self.persisted_version
+            or self.new_batches
+            or self.resized_batches
+            or self.added_allocations
+            or self.removed_allocations
+        )
+
+
+def _eta_order(batch: Batch) -> Tuple[bool, datetime.date]:
+    """Sort key placing in-stock batches (eta=None) before shipments by ETA"""
+    return (batch.eta is not None, batch.eta or datetime.date.min)
 
 
 class Product(base_types.Aggregate):
@@ -129,9 +294,27 @@ class Product(base_types.Aggregate):
 
     sku: str = pydantic.Field(primary_key=True)
     batches: List[Batch] = pydantic.Field(default_factory=list)
+    _batches_by_eta: List[Batch] = pydantic.PrivateAttr(default_factory=list)
+    _persisted_version: Optional[int] = pydantic.PrivateAttr(default=None)
+
+    def __init__(self, **data: Any) -> None:
+        super().__init__(**data)
+        self._index_batches()
+
+    @classmethod
+    def from_orm(cls, obj: Any) -> "Product":
+        product = cls(
+            sku=obj.sku,
+            version_number=obj.version_number,
+            batches=list(map(Batch.from_orm, obj.batches)),
+        )
+        product._persisted_version = product.version_number
+        return product
 
     def add_batch(self, batch: Batch) -> None:
         self.batches.append(batch)
+        bisect.insort(self._batches_by_eta, batch, key=_eta_order)
+        self._update_version()
 
     def allocate(self, line: OrderLine) -> Optional[str]:
         """Allocates a new order on the nearest available stock batch order
@@ -146,25 +329,45 @@ class Product(base_types.Aggregate):
             reference (str): Unique identifier of the batch where
             the order was allocated
         """
-        try:
-            batch = next(
-                b for b in sorted(self.batches) if b.can_allocate(line=line)
-            )
+        batch_ref = self._allocate(line=line)
+        if batch_ref is None:
+            self.events.append(domain_events.OutOfStock(sku=line.sku))
+        return batch_ref
 
-            batch.allocate(line=line)
-            self._update_version()
+    def allocate_many(self, lines: List[OrderLine]) -> List[Optional[str]]:
+        """Allocates several orders in arrival order reusing the batch index
 
-            return batch.id
-        except StopIteration:
-            self.events.append(domain_events.OutOfStock(sku=line.sku))
-            return None
+        Args:
+            lines (List[OrderLine]): New orders to allocate
 
-    def change_batch_quantity(self, ref: str, qty: int) -> None:
-        """Update batch purchased quantity
+        Returns:
+            references (List[Optional[str]]): Unique identifier of the batch
+            where each order was allocated, None when it's out of stock
+        """
+        batch_refs = [self._allocate(line=line) for line in lines]
+        _out_of_stock = next(
+            (line for line, ref in zip(lines, batch_refs) if ref is None), None
+        )
+        if _out_of_stock is not None:
+            self.events.append(domain_events.OutOfStock(sku=_out_of_stock.sku))
+        return batch_refs
+
+    def change_batch_quantity(
+        self,
+        ref: str,
+        qty: int,
+        policy: deallocation.DeallocationPolicy = (
+            deallocation.DeallocationPolicy.FEWEST_LINES
+        ),
+    ) -> None:
+        """Update batch purchased quantity, deallocating the orders that no
+        longer fit so they can be allocated again
 
         Args:
             ref (str): Unique identifier of the batch to update
             qty (int): New batch purchased quantity
+            policy (DeallocationPolicy): Strategy used to pick the orders to
+            deallocate when the batch ends up over-allocated
 
         Raises:
             BatchNotFoundException: Raise when there's no batch
@@ -175,6 +378,67 @@ class Product(base_types.Aggregate):
             raise BatchNotFoundException
 
         _batch.purchased_quantity = qty
-        while _batch.available_quantity < 0:
-            _line = _batch.deallocate_one()
-            self.events.append(domain_events.AllocationRequired(**_line.dict()))
+        self._update_version()
+        _lines = _batch.deallocate_excess(policy=policy)
+        self.events.extend(
+            domain_events.Deallocated(**_line.column_values(), batch_ref=ref)
+            for _line in _lines
+        )
+        self.events.extend(
+            domain_events.AllocationRequired(**_line.column_values())
+            for _line in _lines
+        )
+
+    def pending_changes(self) -> ProductChanges:
+        """Collects what changed since the product was loaded or last persisted
+
+        Returns:
+            changes (ProductChanges): Rows to insert, update and delete
+        """
+        _new_batches: List[Batch] = []
+        _resized_batches: List[Batch] = []
+        _added: List[Tuple[str, OrderLine]] = []
+        _removed: List[Tuple[str, OrderLine]] = []
+        for batch in self.batches:
+            if batch.is_new:
+                _new_batches.append(batch)
+            elif batch.is_resized:
+                _resized_batches.append(batch)
+            _added.extend((batch.id, line) for line in batch.added_allocations)
+            _removed.extend((batch.id, line) for line in batch.removed_allocations)
+
+        return ProductChanges(
+            sku=self.sku,
+            version_number=self.version_number,
+            persisted_version=self._persisted_version,
+            new_batches=_new_batches,
+            resized_batches=_resized_batches,
+            added_allocations=_added,
+            removed_allocations=_removed,
+        )
+
+    def mark_persisted(self) -> None:
+        """Records the current state as the persisted one, clearing the changes"""
+        self._persisted_version = self.version_number
+        for batch in self.batches:
+            batch.mark_persisted()
+
+    def _index_batches(self) -> None:
+        """Rebuilds the ETA ordered index used to pick the batch to allocate"""
+        self._batches_by_eta = sorted(self.batches, key=_eta_order)
+
+    def _allocate(self, line: OrderLine) -> Optional[str]:
+        if len(self._batches_by_eta) != len(self.batches):
+            self._index_batches()
+        batch = next(
+            (b for b in self._batches_by_eta if b.can_allocate(line=line)), None
+        )
+        if batch is None:
+            return None
+
+        batch.allocate(line=line)
+        self._update_version()
+        self.events.append(
+            domain_events.Allocated(**line.column_values(), batch_ref=batch.id)
+        )
+        return batch.id
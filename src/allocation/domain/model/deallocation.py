@@ -0,0 +1,100 @@
+import bisect
+import enum
+from typing import Callable, Dict, List, Protocol, Sequence, TypeVar
+
+
+class DeallocationPolicy(str, enum.Enum):
+    """Strategy used to pick the order lines released from an over-allocated batch
+
+    Attributes:
+        FEWEST_LINES: Release as few lines as possible, closing the gap with the
+            smallest line that covers it.
+        NEWEST_FIRST: Release the most recently allocated lines first.
+        SMALLEST_OVERSHOOT: Release the lines whose quantities best fit the
+            shortfall, so the least stock is freed beyond what is needed.
+    """
+
+    FEWEST_LINES = "fewest_lines"
+    NEWEST_FIRST = "newest_first"
+    SMALLEST_OVERSHOOT = "smallest_overshoot"
+
+
+class _Quantified(Protocol):
+    @property
+    def qty(self) -> int:
+        ...
+
+
+_Line = TypeVar("_Line", bound=_Quantified)
+
+
+def plan_deallocation(
+    lines: Sequence[_Line],
+    shortfall: int,
+    policy: DeallocationPolicy = DeallocationPolicy.FEWEST_LINES,
+) -> List[_Line]:
+    """Selects the order lines to release so a batch stops being over-allocated
+
+    Args:
+        lines (Sequence): Allocated order lines, oldest allocation first
+        shortfall (int): Quantity that must be released from the batch
+        policy (DeallocationPolicy): Strategy used to pick the lines
+
+    Returns:
+        lines (List): Order lines to release, their quantities add up to at
+        least the shortfall unless every line is released
+    """
+    if shortfall <= 0:
+        return []
+    return _PLANNERS[policy](lines, shortfall)
+
+
+def _newest_first(lines: Sequence[_Line], shortfall: int) -> List[_Line]:
+    _released: List[_Line] = []
+    for line in reversed(lines):
+        if shortfall <= 0:
+            break
+        _released.append(line)
+        shortfall -= line.qty
+    return _released
+
+
+def _fewest_lines(lines: Sequence[_Line], shortfall: int) -> List[_Line]:
+    _ordered = sorted(lines, key=lambda line: line.qty, reverse=True)
+    _negated_qtys = [-line.qty for line in _ordered]
+    _released: List[_Line] = []
+    for index, line in enumerate(_ordered):
+        # Lines after this one covering the remaining shortfall on their own
+        # form a prefix of the descending order, the last one overshoots least
+        _covering = bisect.bisect_right(_negated_qtys, -shortfall, lo=index) - 1
+        if _covering >= index:
+            _released.append(_ordered[_covering])
+            break
+        _released.append(line)
+        shortfall -= line.qty
+    return _released
+
+
+def _smallest_overshoot(lines: Sequence[_Line], shortfall: int) -> List[_Line]:
+    _released: List[_Line] = []
+    _smallest_skipped = None
+    for line in sorted(lines, key=lambda line: line.qty, reverse=True):
+        if shortfall <= 0:
+            break
+        if line.qty <= shortfall:
+            _released.append(line)
+            shortfall -= line.qty
+        else:
+            _smallest_skipped = line
+    if shortfall > 0 and _smallest_skipped is not None:
+        _released.append(_smallest_skipped)
+    return _released
+
+
+_PLANNERS: Dict[
+    DeallocationPolicy, Callable[[Sequence[_Quantified], int], List[_Quantified]]
+] = {
+    DeallocationPolicy.FEWEST_LINES: _fewest_lines,
+    DeallocationPolicy.NEWEST_FIRST: _newest_first,
+    DeallocationPolicy.SMALLEST_OVERSHOOT: _smallest_overshoot,
+}
@@ -1,5 +1,6 @@
+import enum
 from datetime import date
-from typing import Optional
+from typing import List, Optional
 
 import pydantic
 
@@ -26,6 +27,46 @@ class OrderLineOutput(pydantic.BaseModel):
     )
 
 
+class BulkOrderLinesInput(pydantic.BaseModel):
+    lines: List[OrderLineInput] = pydantic.Field(
+        ...,
+        title="Order lines",
+        description="Order lines to allocate, skus may repeat",
+        min_items=1,
+    )
+
+
+class AllocationStatus(str, enum.Enum):
+    ALLOCATED = "allocated"
+    OUT_OF_STOCK = "out_of_stock"
+    INVALID_SKU = "invalid_sku"
+    CONFLICT = "conflict"
+
+
+class OrderLineAllocationOutput(pydantic.BaseModel):
+    order_id: str = pydantic.Field(
+        ..., title="Id", description="Unique order identifier"
+    )
+    sku: str = pydantic.Field(
+        ..., title="Stock-Keeping Unit", description="Unique product identifier"
+    )
+    batch_ref: Optional[str] = pydantic.Field(
+        title="Batch reference",
+        description="Unique identifier for the batch where the order was allocated",
+    )
+    status: AllocationStatus = pydantic.Field(
+        ..., title="Status", description="Outcome of the order line allocation"
+    )
+
+
+class BulkAllocationOutput(pydantic.BaseModel):
+    results: List[OrderLineAllocationOutput] = pydantic.Field(
+        ...,
+        title="Results",
+        description="Allocation result of each order line, in request order",
+    )
+
+
 class BatchInput(pydantic.BaseModel):
     reference: str = pydantic.Field(
         ...,
@@ -48,3 +89,33 @@ class BatchInput(pydantic.BaseModel):
         title="Estimated Time of Arrival",
         description="Date when the Batch should arrive to the Warehouse",
     )
+
+
+class BatchQuantityInput(pydantic.BaseModel):
+    purchased_quantity: int = pydantic.Field(
+        ...,
+        title="Quantity",
+        description="New number of product units for the batch order",
+        ge=0,
+        alias="qty",
+    )
+
+
+class AllocationOutput(pydantic.BaseModel):
+    sku: str = pydantic.Field(
+        ..., title="Stock-Keeping Unit", description="Unique product identifier"
+    )
+    batch_ref: str = pydantic.Field(
+        ...,
+        title="Batch reference",
+        description="Unique identifier for the batch where the line is allocated",
+    )
+
+
+class OrderAllocationsOutput(pydantic.BaseModel):
+    order_id: str = pydantic.Field(
+        ..., title="Order ID", description="Unique order identifier"
+    )
+    allocations: List[AllocationOutput] = pydantic.Field(
+        ..., title="Allocations", description="Allocated lines of the order"
+    )
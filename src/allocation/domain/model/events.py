@@ -1,6 +1,8 @@
 import datetime
 from typing import Optional
 
+import pydantic
+
 from src.allocation.lib import base_types
 
 
@@ -11,16 +13,30 @@ class OutOfStock(base_types.Event):
 class BatchCreated(base_types.Event):
     ref: str
     sku: str
-    qty: int
+    qty: int = pydantic.Field(..., gt=0)
     eta: Optional[datetime.date] = None
 
 
 class BatchQuantityChanged(base_types.Event):
     ref: str
-    qty: int
+    qty: int = pydantic.Field(..., ge=0)
 
 
 class AllocationRequired(base_types.Event):
     order_id: str
     sku: str
-    qty: int
+    qty: int = pydantic.Field(..., gt=0)
+
+
+class Allocated(base_types.Event):
+    order_id: str
+    sku: str
+    qty: int = pydantic.Field(..., gt=0)
+    batch_ref: str
+
+
+class Deallocated(base_types.Event):
+    order_id: str
+    sku: str
+    qty: int = pydantic.Field(..., gt=0)
+    batch_ref: str
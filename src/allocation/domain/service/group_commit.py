@@ -0,0 +1,108 @@
+import asyncio
+import dataclasses
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Set
+
+from src.allocation.domain.model import events
+from src.allocation.domain.service import messagebus, unit_of_work
+from src.allocation.lib import settings
+
+
+@dataclasses.dataclass
+class _Group:
+    uow_factory: unit_of_work.UnitOfWorkFactory
+    event_list: List[events.AllocationRequired] = dataclasses.field(
+        default_factory=list
+    )
+    futures: List["asyncio.Future[Any]"] = dataclasses.field(default_factory=list)
+    timer: Optional[asyncio.TimerHandle] = None
+
+
+class GroupCommitter:
+    """Groups the concurrent allocations of a sku so they are applied to one
+    loaded product and committed once
+
+    A group is flushed once its window elapses or it reaches its maximum size,
+    whatever comes first, and allocated in arrival order through
+    ``messagebus.handle_many``. The units of work of a group come from the
+    factory of its first request.
+
+    Args:
+        window (float): Seconds a group waits for more requests
+        max_size (int): Requests flushing a group right away
+    """
+
+    def __init__(self, window: float, max_size: int) -> None:
+        self.window = window
+        self.max_size = max_size
+        self._groups: Dict[str, _Group] = {}
+        self._flushes: Set["asyncio.Task[None]"] = set()
+
+    async def allocate(
+        self,
+        event: events.AllocationRequired,
+        uow_factory: unit_of_work.UnitOfWorkFactory,
+    ) -> Any:
+        """Queues an allocation on the group of its sku and waits for its result
+
+        Args:
+            event (AllocationRequired): Order to allocate
+            uow_factory (UnitOfWorkFactory): Builds the unit of work of the group
+
+        Raises:
+            InvalidSkuException: Raise when there's no batch with the provided sku
+
+        Returns:
+            batch_ref (Optional[str]): Reference of the batch where the order is
+            allocated, None when it's out of stock
+        """
+        _loop = asyncio.get_running_loop()
+        _group = self._groups.get(event.sku)
+        if _group is None:
+            _group = self._groups[event.sku] = _Group(uow_factory=uow_factory)
+            _group.timer = _loop.call_later(self.window, self._flush, event.sku)
+        _future: "asyncio.Future[Any]" = _loop.create_future()
+        _group.event_list.append(event)
+        _group.futures.append(_future)
+        if len(_group.event_list) >= self.max_size:
+            self._flush(event.sku)
+        return await _future
+
+    def _flush(self, sku: str) -> None:
+        _group = self._groups.pop(sku, None)
+        if _group is None:
+            return
+        if _group.timer is not None:
+            _group.timer.cancel()
+        _task = asyncio.create_task(self._commit(_group))
+        self._flushes.add(_task)
+        _task.add_done_callback(self._flushes.discard)
+
+    async def _commit(self, group: _Group) -> None:
+        try:
+            _results = await messagebus.handle_many(
+                event_list=group.event_list, uow_factory=group.uow_factory
+            )
+        except Exception as error:
+            _results = [error] * len(group.futures)
+        for future, result in zip(group.futures, _results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+@lru_cache()
+def get_group_committer() -> GroupCommitter:
+    """Group committer of the message bus settings, shared by the whole process
+
+    Returns:
+        GroupCommitter: The process group committer
+    """
+    _settings = settings.get_settings().messagebus
+    return GroupCommitter(
+        window=_settings.group_commit_window,
+        max_size=_settings.group_commit_max_size,
+    )
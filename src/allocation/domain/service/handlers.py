@@ -1,8 +1,11 @@
-from typing import Optional
+from typing import Dict, List, Optional
 
-from src.allocation.adapters import email
+from src.allocation.adapters import email, notifications
 from src.allocation.domain.model import aggregate, events
 from src.allocation.domain.service import unit_of_work
+from src.allocation.lib import settings
+
+_SETTINGS = settings.get_settings()
 
 
 class InvalidSkuException(Exception):
@@ -30,11 +33,11 @@ async def add_batch(
         purchased_quantity=event.qty,
     )
     async with uow:
-        product = uow.products.get(sku=event.sku)
+        product = await uow.products.get(sku=event.sku)
         if product is None:
             product = aggregate.Product(sku=event.sku)
         product.add_batch(_batch)
-        uow.products.add(product=product)
+        await uow.products.add(product=product)
         await uow.commit()
 
 
@@ -52,20 +55,71 @@ async def allocate(
         InvalidSkuException: Raise when there's no batch with the provided sku
 
     Returns:
-        batch_ref (str): Reference of the batch where the order is allocated
+        batch_ref (str): Reference of the batch where the order is allocated,
+        the existing one when the order was already allocated
     """
     _line = aggregate.OrderLine(
         sku=event.sku, order_id=event.order_id, qty=event.qty
     )
     async with uow:
-        product = uow.products.get(sku=event.sku)
+        _allocated = await uow.products.get_allocated_batchrefs(
+            sku=event.sku, order_ids=[event.order_id]
+        )
+        if event.order_id in _allocated:
+            return _allocated[event.order_id]
+        product = await uow.products.get(sku=event.sku)
         if product is None:
             raise InvalidSkuException(f"Invalid sku {event.sku}")
         batch_ref = product.allocate(line=_line)
+        await uow.products.add(product=product)
         await uow.commit()
     return batch_ref
 
 
+async def allocate_many(
+    event_list: List[events.AllocationRequired],
+    uow: unit_of_work.AbstractUnitOfWork,
+) -> List[Optional[str]]:
+    """Service to allocate several orders of the same product loading and
+    persisting the product only once
+
+    Args:
+        event_list (List[AllocationRequired]): Events of a single sku to handle
+        uow (AbstractUnitOfWork): Unit of Work used for the persistance layer
+
+    Raises:
+        InvalidSkuException: Raise when there's no batch with the provided sku
+
+    Returns:
+        batch_refs (List[Optional[str]]): Reference of the batch where each
+        order is allocated, in the same order as the events
+    """
+    _sku = event_list[0].sku
+    async with uow:
+        _batch_refs: Dict[str, Optional[str]] = dict(
+            await uow.products.get_allocated_batchrefs(
+                sku=_sku, order_ids=[event.order_id for event in event_list]
+            )
+        )
+        # Repeated orders are allocated once, on their first occurrence
+        _lines: Dict[str, aggregate.OrderLine] = {}
+        for event in event_list:
+            if event.order_id not in _batch_refs and event.order_id not in _lines:
+                _lines[event.order_id] = aggregate.OrderLine(
+                    sku=event.sku, order_id=event.order_id, qty=event.qty
+                )
+        if _lines:
+            product = await uow.products.get(sku=_sku)
+            if product is None:
+                raise InvalidSkuException(f"Invalid sku {_sku}")
+            _batch_refs.update(
+                zip(_lines, product.allocate_many(lines=list(_lines.values())))
+            )
+            await uow.products.add(product=product)
+            await uow.commit()
+    return [_batch_refs[event.order_id] for event in event_list]
+
+
 async def change_batch_quantity(
     event: events.BatchQuantityChanged,
     uow: unit_of_work.AbstractUnitOfWork,
@@ -81,12 +135,17 @@ async def change_batch_quantity(
         with the provided reference
     """
     async with uow:
-        product = uow.products.get_by_batchref(ref=event.ref)
+        product = await uow.products.get_by_batchref(ref=event.ref)
         if product is None:
             raise InvalidBatchReferenceException(
                 f"Invalid Batch reference {event.ref}"
             )
-        product.change_batch_quantity(ref=event.ref, qty=event.qty)
+        product.change_batch_quantity(
+            ref=event.ref,
+            qty=event.qty,
+            policy=_SETTINGS.allocation.deallocation_policy,
+        )
+        await uow.products.add(product=product)
         await uow.commit()
 
 
@@ -95,14 +154,70 @@ async def send_out_of_stock_notification(
     uow: unit_of_work.AbstractUnitOfWork,
 ) -> None:
     """Service to send an email notification when a product is
-    out of stock.
+    out of stock. The notification is queued, the allocation doesn't wait
+    for the mail server.
 
     Args:
         event (BatchQuantityChanged): Event that triggers this handler
         uow (AbstractUnitOfWork): Unit of Work used for the persistance layer
     """
     del uow
-    email.send_mail(
-        "stock@made.com",
-        f"Out of stock for {event.sku}",
+    notifications.get_notifier().publish(
+        email.Message(
+            to=_SETTINGS.notifications.out_of_stock_recipient,
+            subject=f"Out of stock for {event.sku}",
+        )
     )
+
+
+async def add_allocation_to_read_model(
+    event: events.Allocated,
+    uow: unit_of_work.AbstractUnitOfWork,
+) -> None:
+    """Service to record a new allocation on the allocations read model
+
+    Args:
+        event (Allocated): Event that triggers this handler
+        uow (AbstractUnitOfWork): Unit of Work used for the persistance layer
+    """
+    async with uow:
+        await uow.allocations_view.add(
+            order_id=event.order_id, sku=event.sku, batch_ref=event.batch_ref
+        )
+        await uow.commit()
+
+
+async def add_allocations_to_read_model(
+    event_list: List[events.Allocated],
+    uow: unit_of_work.AbstractUnitOfWork,
+) -> None:
+    """Service to record several new allocations on the allocations read model
+    with a single commit
+
+    Args:
+        event_list (List[Allocated]): Events to handle
+        uow (AbstractUnitOfWork): Unit of Work used for the persistance layer
+    """
+    async with uow:
+        for event in event_list:
+            await uow.allocations_view.add(
+                order_id=event.order_id, sku=event.sku, batch_ref=event.batch_ref
+            )
+        await uow.commit()
+
+
+async def remove_allocation_from_read_model(
+    event: events.Deallocated,
+    uow: unit_of_work.AbstractUnitOfWork,
+) -> None:
+    """Service to remove a released allocation from the allocations read model
+
+    Args:
+        event (Deallocated): Event that triggers this handler
+        uow (AbstractUnitOfWork): Unit of Work used for the persistance layer
+    """
+    async with uow:
+        await uow.allocations_view.remove(
+            order_id=event.order_id, sku=event.sku, batch_ref=event.batch_ref
+        )
+        await uow.commit()
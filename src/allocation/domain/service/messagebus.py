@@ -1,8 +1,25 @@
-from typing import Any, Callable, Coroutine, Dict, List, Type
+import asyncio
+import contextlib
+import operator
+import random
+import time
+from typing import (
+    Any,
+    AsyncContextManager,
+    Callable,
+    Coroutine,
+    Dict,
+    List,
+    Sequence,
+    Type,
+)
 
+from src.allocation import repositories
 from src.allocation.domain.model import events
-from src.allocation.domain.service import handlers, unit_of_work
-from src.allocation.lib import base_types
+from src.allocation.domain.service import handlers, scheduler, unit_of_work
+from src.allocation.lib import base_types, metrics, settings
+
+_SETTINGS = settings.get_settings()
 
 _EVENT_HANDLERS: Dict[
     Type[base_types.Event],
@@ -12,6 +29,18 @@ _EVENT_HANDLERS: Dict[
     events.AllocationRequired: [handlers.allocate],
     events.BatchQuantityChanged: [handlers.change_batch_quantity],
     events.OutOfStock: [handlers.send_out_of_stock_notification],
+    events.Allocated: [handlers.add_allocation_to_read_model],
+    events.Deallocated: [handlers.remove_allocation_from_read_model],
+}
+
+# Handlers of these events write the product of the key, the scheduler runs them
+# one at a time per product so they queue instead of conflicting on commit.
+# BatchQuantityChanged only carries the batch reference, and resolving its sku
+# would cost a query outside the unit of work. It's left to the version check
+# and the conflict retries, while the reallocations it raises are serialized.
+_AGGREGATE_KEYS: Dict[Type[base_types.Event], Callable[[Any], str]] = {
+    events.BatchCreated: operator.attrgetter("sku"),
+    events.AllocationRequired: operator.attrgetter("sku"),
 }
 
 
@@ -20,9 +49,134 @@ async def handle(
 ) -> List[Any]:
     results: List[Any] = []
     queue: List[base_types.Event] = [event]
-    while queue:
-        event = queue.pop()
-        for handler in _EVENT_HANDLERS[type(event)]:
-            results.append(await handler(event=event, uow=uow))
-            queue.extend(uow.collect_new_events())
+    _handled = 0
+    metrics.MESSAGEBUS_QUEUE_DEPTH.inc()
+    try:
+        while queue:
+            event = queue.pop()
+            metrics.MESSAGEBUS_QUEUE_DEPTH.dec()
+            metrics.MESSAGEBUS_EVENTS.inc(type(event).__name__)
+            _handled += 1
+            for handler in _EVENT_HANDLERS[type(event)]:
+                async with _serialize(event):
+                    results.append(await _timed(handler, event=event, uow=uow))
+                _new_events = list(uow.collect_new_events())
+                metrics.MESSAGEBUS_QUEUE_DEPTH.inc(amount=len(_new_events))
+                queue.extend(_new_events)
+    finally:
+        metrics.MESSAGEBUS_QUEUE_DEPTH.dec(amount=len(queue))
+        metrics.MESSAGEBUS_CASCADED_EVENTS.observe(_handled)
+    return results
+
+
+async def handle_many(
+    event_list: Sequence[events.AllocationRequired],
+    uow_factory: unit_of_work.UnitOfWorkFactory,
+) -> List[Any]:
+    """Allocates several orders, loading each product once and handling
+    different skus concurrently, each one on its own unit of work.
+
+    Args:
+        event_list (Sequence[AllocationRequired]): Orders to allocate
+        uow_factory (UnitOfWorkFactory): Builds the unit of work for each sku
+
+    Returns:
+        results (List[Any]): Batch reference, None when out of stock, or the
+        exception raised for the sku, in the same order as the events
+    """
+    _positions: Dict[str, List[int]] = {}
+    for position, event in enumerate(event_list):
+        _positions.setdefault(event.sku, []).append(position)
+
+    async def _allocate_sku(positions: List[int]) -> List[Any]:
+        uow = uow_factory()
+        metrics.MESSAGEBUS_EVENTS.inc(
+            events.AllocationRequired.__name__, amount=len(positions)
+        )
+        async with _serialize(event_list[positions[0]]):
+            batch_refs = await _timed(
+                handlers.allocate_many,
+                event_list=[event_list[position] for position in positions],
+                uow=uow,
+            )
+        _new_events = list(uow.collect_new_events())
+        # The allocations of the group reach the read model on a single commit
+        _allocated = [e for e in _new_events if isinstance(e, events.Allocated)]
+        if _allocated:
+            await handlers.add_allocations_to_read_model(
+                event_list=_allocated, uow=uow
+            )
+        for new_event in _new_events:
+            if not isinstance(new_event, events.Allocated):
+                await handle(event=new_event, uow=uow)
+        return batch_refs
+
+    _sku_results = await asyncio.gather(
+        *map(_allocate_sku, _positions.values()), return_exceptions=True
+    )
+
+    results: List[Any] = [None] * len(event_list)
+    for positions, sku_result in zip(_positions.values(), _sku_results):
+        for index, position in enumerate(positions):
+            results[position] = (
+                sku_result
+                if isinstance(sku_result, BaseException)
+                else sku_result[index]
+            )
     return results
+
+
+def _serialize(event: base_types.Event) -> AsyncContextManager[None]:
+    """Turn of the product the event writes, a no-op for the other events"""
+    _key = _AGGREGATE_KEYS.get(type(event))
+    if _key is None or not _SETTINGS.messagebus.serialize_by_sku:
+        return contextlib.nullcontext()
+    return scheduler.get_scheduler().serialize(_key(event))
+
+
+async def _timed(
+    handler: Callable[..., Coroutine[Any, Any, Any]], **kwargs: Any
+) -> Any:
+    """Runs the handler with its conflict retries, recording how long it took"""
+    _started = time.perf_counter()
+    try:
+        return await _retry_on_conflict(handler, **kwargs)
+    finally:
+        metrics.MESSAGEBUS_HANDLER_DURATION.observe(
+            time.perf_counter() - _started, handler.__name__
+        )
+
+
+async def _retry_on_conflict(
+    handler: Callable[..., Coroutine[Any, Any, Any]], **kwargs: Any
+) -> Any:
+    """Runs the handler again when its commit loses a version check, waiting a
+    jittered backoff between attempts so competing writers spread out
+
+    Args:
+        handler (Callable): Handler opening its own unit of work
+        **kwargs (Any): Arguments passed to the handler on every attempt
+
+    Raises:
+        ConcurrencyConflictException: Raise when the retry budget is exhausted
+
+    Returns:
+        result (Any): Result of the first attempt that commits
+    """
+    _retries = _SETTINGS.messagebus.conflict_retries
+    for attempt in range(_retries + 1):
+        try:
+            return await handler(**kwargs)
+        except repositories.ConcurrencyConflictException:
+            if attempt == _retries:
+                raise
+            await asyncio.sleep(_backoff_delay(attempt=attempt))
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Full jitter exponential backoff, in seconds"""
+    _ceiling = min(
+        _SETTINGS.messagebus.retry_backoff_max,
+        _SETTINGS.messagebus.retry_backoff_base * 2**attempt,
+    )
+    return random.uniform(0, _ceiling)
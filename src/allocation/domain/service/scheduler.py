@@ -0,0 +1,162 @@
+import asyncio
+import contextlib
+import dataclasses
+import time
+from functools import lru_cache
+from typing import AsyncIterator, Callable, Dict
+
+
+@dataclasses.dataclass(frozen=True)
+class KeyStatistics:
+    """Snapshot of the queue of a key, since it last went idle
+
+    Attributes:
+        queue_depth (int): Tasks running or waiting on the key.
+        max_queue_depth (int): Deepest queue seen on the key.
+        runs (int): Tasks that got their turn on the key.
+        wait_time_total (float): Seconds spent waiting for a turn.
+        wait_time_max (float): Longest wait for a turn, in seconds.
+    """
+
+    queue_depth: int
+    max_queue_depth: int
+    runs: int
+    wait_time_total: float
+    wait_time_max: float
+
+
+@dataclasses.dataclass(frozen=True)
+class SchedulerStatistics:
+    """Snapshot of the queues of every key
+
+    Attributes:
+        active_keys (int): Keys with tasks running or waiting.
+        queue_depth (int): Tasks running or waiting, over every key.
+        max_queue_depth (int): Deepest queue seen on a single key.
+        runs (int): Tasks that got their turn.
+        wait_time_total (float): Seconds spent waiting for a turn.
+        wait_time_max (float): Longest wait for a turn, in seconds.
+    """
+
+    active_keys: int
+    queue_depth: int
+    max_queue_depth: int
+    runs: int
+    wait_time_total: float
+    wait_time_max: float
+
+
+@dataclasses.dataclass
+class _KeyCounters:
+    max_queue_depth: int = 0
+    runs: int = 0
+    wait_time_total: float = 0.0
+    wait_time_max: float = 0.0
+
+    def add(self, other: "_KeyCounters") -> None:
+        self.max_queue_depth = max(self.max_queue_depth, other.max_queue_depth)
+        self.runs += other.runs
+        self.wait_time_total += other.wait_time_total
+        self.wait_time_max = max(self.wait_time_max, other.wait_time_max)
+
+
+class KeyedScheduler:
+    """Runs the tasks of a key one at a time, in arrival order, while the
+    tasks of different keys run concurrently
+
+    Each key has its own lock, dropped once no task uses it, so waiting costs
+    a queued coroutine instead of a database transaction. The counters of a
+    key are folded into the totals along with its lock, so the memory follows
+    the keys in use rather than every key ever seen.
+
+    Args:
+        clock (Callable[[], float]): Monotonic time source for the waits
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.perf_counter) -> None:
+        self._clock = clock
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._depths: Dict[str, int] = {}
+        self._counters: Dict[str, _KeyCounters] = {}
+        self._totals = _KeyCounters()
+
+    @contextlib.asynccontextmanager
+    async def serialize(self, key: str) -> AsyncIterator[None]:
+        """Waits for the turn of the key and holds it until the block exits
+
+        Args:
+            key (str): Aggregate the task works on
+        """
+        _lock = self._locks.setdefault(key, asyncio.Lock())
+        _counters = self._counters.setdefault(key, _KeyCounters())
+        self._depths[key] = self._depths.get(key, 0) + 1
+        _counters.max_queue_depth = max(_counters.max_queue_depth, self._depths[key])
+        _started = self._clock()
+        try:
+            async with _lock:
+                _waited = self._clock() - _started
+                _counters.runs += 1
+                _counters.wait_time_total += _waited
+                _counters.wait_time_max = max(_counters.wait_time_max, _waited)
+                yield
+        finally:
+            self._depths[key] -= 1
+            if not self._depths[key]:
+                del self._depths[key]
+                del self._locks[key]
+                self._totals.add(self._counters.pop(key))
+
+    def statistics(self) -> SchedulerStatistics:
+        """Reads the queues of every key used so far
+
+        Returns:
+            statistics (SchedulerStatistics): Queue figures over every key
+        """
+        _counters = _KeyCounters()
+        _counters.add(self._totals)
+        for counters in self._counters.values():
+            _counters.add(counters)
+        return SchedulerStatistics(
+            active_keys=len(self._depths),
+            queue_depth=sum(self._depths.values()),
+            max_queue_depth=_counters.max_queue_depth,
+            runs=_counters.runs,
+            wait_time_total=_counters.wait_time_total,
+            wait_time_max=_counters.wait_time_max,
+        )
+
+    def busiest_keys(self, limit: int) -> Dict[str, KeyStatistics]:
+        """Reads the queues of the active keys with the most tasks waiting
+
+        Args:
+            limit (int): Keys returned at most
+
+        Returns:
+            statistics (Dict[str, KeyStatistics]): Queue figures keyed by key,
+            deepest queue first
+        """
+        _keys = sorted(
+            self._depths,
+            key=lambda key: (self._depths[key], self._counters[key].wait_time_max),
+            reverse=True,
+        )[:limit]
+        return {
+            key: KeyStatistics(
+                queue_depth=self._depths[key],
+                max_queue_depth=self._counters[key].max_queue_depth,
+                runs=self._counters[key].runs,
+                wait_time_total=self._counters[key].wait_time_total,
+                wait_time_max=self._counters[key].wait_time_max,
+            )
+            for key in _keys
+        }
+
+
+@lru_cache()
+def get_scheduler() -> KeyedScheduler:
+    """Scheduler of the message bus, shared by the whole process
+
+    Returns:
+        KeyedScheduler: The process scheduler
+    """
+    return KeyedScheduler()
@@ -1,41 +1,102 @@
 import abc
+import time
+from functools import lru_cache
 from typing import Annotated, Any, Callable, Iterable, List, Optional, Type
 
 import pydash
-from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy.orm import Session, sessionmaker
 
 from src.allocation import repositories
-from src.allocation.lib import base_types, settings
+from src.allocation.adapters import database, outbox
+from src.allocation.lib import base_types, metrics, settings
 
 SessionFactory = Annotated[sessionmaker[Session], sessionmaker]
+AsyncSessionFactory = Annotated[async_sessionmaker[AsyncSession], async_sessionmaker]
 
-_SETTINGS = settings.get_settings()
-DEFAULT_SESSION_FACTORY: SessionFactory = sessionmaker(
-    bind=create_engine(
-        url=_SETTINGS.database.mysql_uri,
-        isolation_level="REPEATABLE READ",
+
+@lru_cache()
+def get_default_session_factory() -> SessionFactory:
+    """Builds the session factory on first use, bound to the engine of the
+    application database instead of one created at import time
+
+    Returns:
+        SessionFactory: Session factory bound to the MySQL engine
+    """
+    return sessionmaker(bind=database.get_database().engine)
+
+
+@lru_cache()
+def get_read_session_factory() -> SessionFactory:
+    """Builds the session factory of the read models, out of the write side
+    transactions
+
+    Returns:
+        SessionFactory: Session factory bound to the autocommit MySQL engine
+    """
+    return sessionmaker(bind=database.get_database().read_engine)
+
+
+@lru_cache()
+def get_default_async_session_factory() -> AsyncSessionFactory:
+    """Builds the async session factory on first use, so the async MySQL driver
+    is only required when the async unit of work is selected
+
+    Returns:
+        AsyncSessionFactory: Session factory bound to the async MySQL engine
+    """
+    return async_sessionmaker(
+        bind=database.get_database().async_engine, expire_on_commit=False
     )
-)
+
+
+@lru_cache()
+def get_product_cache() -> Optional[repositories.ProductCache]:
+    """Builds the product cache of the worker, shared by its units of work
+
+    Returns:
+        Optional[ProductCache]: The configured cache, None when disabled
+    """
+    _settings = settings.get_settings().product_cache
+    if not _settings.enabled:
+        return None
+    return repositories.ProductCache(max_size=_settings.max_size, ttl=_settings.ttl)
 
 
 class AbstractUnitOfWork(abc.ABC):
     products: repositories.AbstractRepository
+    allocations_view: repositories.AbstractAllocationsView
 
     async def __aenter__(self) -> "AbstractUnitOfWork":
         return self
 
     async def __aexit__(self, *args: Any) -> None:
+        _started = time.perf_counter()
         await self.rollback()
+        metrics.UOW_ROLLBACK_DURATION.observe(
+            time.perf_counter() - _started, type(self).__name__
+        )
+        self.products.rolled_back()
 
     async def commit(self) -> None:
+        _started = time.perf_counter()
         await self._commit()
+        metrics.UOW_COMMIT_DURATION.observe(
+            time.perf_counter() - _started, type(self).__name__
+        )
+        self.products.committed()
 
     def collect_new_events(self) -> Iterable[base_types.Event]:
         for product in self.products.seen:
             while product.events:
                 yield product.events.pop(0)
 
+    def _outbox_events(self) -> List[base_types.Event]:
+        """Events raised since the last collection, committed to the outbox"""
+        if not settings.get_settings().outbox.enabled:
+            return []
+        return [event for product in self.products.seen for event in product.events]
+
     @abc.abstractmethod
     async def _commit(self) -> None:
         raise NotImplementedError
@@ -45,32 +106,85 @@ class AbstractUnitOfWork(abc.ABC):
         raise NotImplementedError
 
 
+UnitOfWorkFactory = Callable[[], AbstractUnitOfWork]
+
+
 class SqlAlchemyUnitOfWork(AbstractUnitOfWork):
     def __init__(
-        self, session_factory: SessionFactory = DEFAULT_SESSION_FACTORY
+        self,
+        session_factory: Optional[SessionFactory] = None,
+        product_cache: Optional[repositories.ProductCache] = None,
     ) -> None:
-        self.session_factory = session_factory
+        self.session_factory = session_factory or get_default_session_factory()
+        self.product_cache = product_cache or get_product_cache()
         super().__init__()
 
     async def __aenter__(self) -> AbstractUnitOfWork:
         self.session: Session = self.session_factory()
         self.products = repositories.SqlAlchemyRepository(session=self.session)
+        if self.product_cache is not None:
+            self.products = repositories.CachedRepository(
+                repository=self.products, cache=self.product_cache
+            )
+        self.allocations_view = repositories.SqlAlchemyAllocationsView(
+            session=self.session
+        )
         return await super().__aenter__()
 
-    async def __exit__(self, *args: Any) -> None:
-        await super().__aexit__(*args)
-        self.session.close()
+    async def __aexit__(self, *args: Any) -> None:
+        try:
+            await super().__aexit__(*args)
+        finally:
+            self.session.close()
 
     async def _commit(self) -> None:
+        outbox.add_events(self.session, self._outbox_events())
         self.session.commit()
 
     async def rollback(self) -> None:
         self.session.rollback()
 
 
+class AsyncSqlAlchemyUnitOfWork(AbstractUnitOfWork):
+    def __init__(
+        self,
+        session_factory: Optional[AsyncSessionFactory] = None,
+        product_cache: Optional[repositories.ProductCache] = None,
+    ) -> None:
+        self.session_factory = session_factory or get_default_async_session_factory()
+        self.product_cache = product_cache or get_product_cache()
+        super().__init__()
+
+    async def __aenter__(self) -> AbstractUnitOfWork:
+        self.session: AsyncSession = self.session_factory()
+        self.products = repositories.AsyncSqlAlchemyRepository(session=self.session)
+        if self.product_cache is not None:
+            self.products = repositories.CachedRepository(
+                repository=self.products, cache=self.product_cache
+            )
+        self.allocations_view = repositories.AsyncSqlAlchemyAllocationsView(
+            session=self.session
+        )
+        return await super().__aenter__()
+
+    async def __aexit__(self, *args: Any) -> None:
+        try:
+            await super().__aexit__(*args)
+        finally:
+            await self.session.close()
+
+    async def _commit(self) -> None:
+        await self.session.run_sync(outbox.add_events, self._outbox_events())
+        await self.session.commit()
+
+    async def rollback(self) -> None:
+        await self.session.rollback()
+
+
 class FakeUnitOfWork(AbstractUnitOfWork):
     def __init__(self) -> None:
         self.products = repositories.FakeRepository(set())
+        self.allocations_view = repositories.FakeAllocationsView()
         self.committed = False
         super().__init__()
         self.events_published: List[base_types.Event] = []
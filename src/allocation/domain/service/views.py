@@ -0,0 +1,28 @@
+from typing import List
+
+from src.allocation.domain.model import dto
+from src.allocation.domain.service import unit_of_work
+from src.allocation.repositories import allocations_view
+
+
+def allocations(
+    order_id: str, session_factory: unit_of_work.SessionFactory
+) -> List[dto.AllocationOutput]:
+    """Service to read where the lines of an order are allocated, from the read
+    model and without loading any product
+
+    Args:
+        order_id (str): Unique order identifier
+        session_factory (SessionFactory): Factory of the read sessions
+
+    Returns:
+        allocations (List[AllocationOutput]): Allocated lines of the order, empty
+        when the order is unknown
+    """
+    with session_factory() as session:
+        return [
+            dto.AllocationOutput(sku=sku, batch_ref=batch_ref)
+            for sku, batch_ref in allocations_view.get_allocations(
+                session=session, order_id=order_id
+            )
+        ]
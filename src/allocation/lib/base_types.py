@@ -1,45 +1,308 @@
-from typing import Any, Callable, List
+import dataclasses
+import operator
+import typing
+from typing import (
+    Any,
+    Callable,
+    ClassVar,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Type,
+)
 
 import pydantic
-import pydash
+
+_Slotted = typing.TypeVar("_Slotted", bound="SlottedModel")
+
+
+@dataclasses.dataclass(frozen=True)
+class ModelMetadata:
+    """Field metadata computed once when a domain model class is created
+
+    Attributes:
+        primary_key (Optional[str]): Field declared with ``primary_key=True``.
+        fields (Tuple[str, ...]): Every field declared on the model.
+        column_fields (Tuple[str, ...]): Fields holding plain values, the ones
+            stored as columns by the ORM mappers.
+        identity_fields (Tuple[str, ...]): Fields defining the model identity.
+        hash (Callable[[Any], int]): ``__hash__`` built from the identity fields.
+        eq (Callable[[Any, object], bool]): ``__eq__`` built from the identity
+            fields.
+        values (Callable[[Any], Tuple[Any, ...]]): Reads the fields of an
+            object, in declaration order.
+    """
+
+    primary_key: Optional[str]
+    fields: Tuple[str, ...]
+    column_fields: Tuple[str, ...]
+    identity_fields: Tuple[str, ...]
+    hash: Callable[[Any], int] = dataclasses.field(repr=False, compare=False)
+    eq: Callable[[Any, object], bool] = dataclasses.field(repr=False, compare=False)
+    values: Callable[[Any], Tuple[Any, ...]] = dataclasses.field(
+        repr=False, compare=False, default=lambda obj: ()
+    )
+
+    @classmethod
+    def for_model(
+        cls,
+        model: Type[pydantic.BaseModel],
+        identity_fields: Optional[Tuple[str, ...]] = None,
+    ) -> "ModelMetadata":
+        _fields = model.__fields__
+        _primary_key = next(
+            (
+                name
+                for name, field in _fields.items()
+                if field.field_info.extra.get("primary_key") is True
+            ),
+            None,
+        )
+        _column_fields = tuple(
+            name
+            for name, field in _fields.items()
+            if not _is_nested_model(field.type_)
+        )
+        if identity_fields is None:
+            identity_fields = (_primary_key,) if _primary_key else ()
+        _hash, _eq = _identity_functions(model, tuple(_fields), identity_fields)
+
+        return cls(
+            primary_key=_primary_key,
+            fields=tuple(_fields),
+            column_fields=_column_fields,
+            identity_fields=identity_fields,
+            hash=_hash,
+            eq=_eq,
+        )
+
+    @classmethod
+    def for_slotted_model(
+        cls,
+        model: Type["SlottedModel"],
+        identity_fields: Optional[Tuple[str, ...]] = None,
+    ) -> "ModelMetadata":
+        # Public annotations of the class and its bases, in declaration order
+        _annotations: Dict[str, Any] = {}
+        for klass in reversed(model.__mro__):
+            _annotations.update(getattr(klass, "__annotations__", {}))
+        _fields = {
+            name: annotation
+            for name, annotation in _annotations.items()
+            if not name.startswith("_")
+            and typing.get_origin(annotation) is not ClassVar
+        }
+        if identity_fields is None:
+            identity_fields = tuple(_fields)
+        _hash, _eq = _identity_functions(model, (), identity_fields)
+
+        return cls(
+            primary_key=None,
+            fields=tuple(_fields),
+            column_fields=tuple(
+                name
+                for name, annotation in _fields.items()
+                if not _is_nested_model(annotation)
+            ),
+            identity_fields=identity_fields,
+            hash=_hash,
+            eq=_eq,
+            values=_field_values(tuple(_fields)),
+        )
+
+
+def _is_nested_model(annotation: Any) -> bool:
+    return isinstance(annotation, type) and issubclass(
+        annotation, (pydantic.BaseModel, SlottedModel)
+    )
+
+
+def _field_values(fields: Tuple[str, ...]) -> Callable[[Any], Tuple[Any, ...]]:
+    if not fields:
+        return lambda obj: ()
+    if len(fields) == 1:
+        _getter = operator.attrgetter(fields[0])
+        return lambda obj: (_getter(obj),)
+    return operator.attrgetter(*fields)
+
+
+def _identity_functions(
+    model: Type[Any], dict_fields: Tuple[str, ...], identity_fields: Tuple[str, ...]
+) -> Tuple[Callable[[Any], int], Callable[[Any, object], bool]]:
+    """Builds ``__hash__`` and ``__eq__`` from the identity fields
+
+    Args:
+        model (Type[Any]): Model receiving the functions
+        dict_fields (Tuple[str, ...]): Fields held by the instance dict, in
+            order, empty for the slotted models
+        identity_fields (Tuple[str, ...]): Fields defining the model identity
+    """
+    if not identity_fields:
+
+        def _missing_identity(*args: Any) -> Any:
+            raise AssertionError(f"{model.__name__} object must have a primary_key")
+
+        return _missing_identity, _missing_identity
+
+    if identity_fields == dict_fields:
+        # Every field is part of the identity, the instance dict holds them in order
+        def _hash(self: Any) -> int:
+            return hash((type(self), *self.__dict__.values()))
+
+        def _eq(self: Any, other: object) -> bool:
+            return type(other) is type(self) and self.__dict__ == other.__dict__
+
+        return _hash, _eq
+
+    if len(identity_fields) == 1 and dict_fields:
+        (_name,) = identity_fields
+
+        def _hash_key(self: Any) -> int:
+            return hash((type(self), self.__dict__[_name]))
+
+        def _eq_key(self: Any, other: object) -> bool:
+            return (
+                type(other) is type(self)
+                and self.__dict__[_name] == other.__dict__[_name]
+            )
+
+        return _hash_key, _eq_key
+
+    _identity = operator.attrgetter(*identity_fields)
+
+    def _hash_identity(self: Any) -> int:
+        return hash((type(self), _identity(self)))
+
+    def _eq_identity(self: Any, other: object) -> bool:
+        return type(other) is type(self) and _identity(self) == _identity(other)
+
+    return _hash_identity, _eq_identity
 
 
 class DomainBaseModel(pydantic.BaseModel):
+    __domain_metadata__: ClassVar[ModelMetadata]
+
     class Config(pydantic.BaseConfig):
         frozen: bool = True
         orm_mode: bool = True
         from_attributes: bool = True
+        copy_on_model_validation: str = "none"
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        _metadata = ModelMetadata.for_model(
+            cls, identity_fields=cls._identity_fields()
+        )
+        cls.__domain_metadata__ = _metadata
+        setattr(cls, "__hash__", _metadata.hash)
+        setattr(cls, "__eq__", _metadata.eq)
+
+    @classmethod
+    def _identity_fields(cls) -> Optional[Tuple[str, ...]]:
+        return tuple(cls.__fields__)
+
+    def column_values(self) -> Dict[str, Any]:
+        """Plain valued fields of the model, keyed by field name
+
+        Returns:
+            values (Dict[str, Any]): Values stored as columns by the ORM mappers.
+        """
+        return {
+            name: getattr(self, name)
+            for name in self.__domain_metadata__.column_fields
+        }
 
-    def __hash__(self) -> int:  # pyright: ignore[reportIncompatibleVariableOverride]
-        return hash((type(self),) + tuple(self.__dict__.values()))
+
+class SlottedModel:
+    """Domain model on ``__slots__``, without validation
+
+    Subclasses are dataclasses declared with ``slots=True`` and ``eq=False``,
+    they keep the identity based ``__hash__`` and ``__eq__`` installed here.
+    The values are validated by the DTOs at the HTTP edge and by the database
+    schema, never again on each construction or hydration.
+    """
+
+    __slots__ = ()
+    __domain_metadata__: ClassVar[ModelMetadata]
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        _metadata = ModelMetadata.for_slotted_model(
+            cls, identity_fields=cls._identity_fields()
+        )
+        cls.__domain_metadata__ = _metadata
+        setattr(cls, "__hash__", _metadata.hash)
+        setattr(cls, "__eq__", _metadata.eq)
+
+    @classmethod
+    def _identity_fields(cls) -> Optional[Tuple[str, ...]]:
+        return None
+
+    @classmethod
+    def __get_validators__(cls) -> Iterator[Callable[[Any], Any]]:
+        # Only the type is checked when nested in a pydantic model
+        yield cls._validate_type
+
+    @classmethod
+    def _validate_type(cls: Type[_Slotted], value: Any) -> _Slotted:
+        if not isinstance(value, cls):
+            raise TypeError(f"{cls.__name__} expected")
+        return value
+
+    @classmethod
+    def __modify_schema__(cls, field_schema: Dict[str, Any]) -> None:
+        field_schema.update(
+            title=cls.__name__,
+            type="object",
+            required=list(cls.__domain_metadata__.fields),
+        )
+
+    @classmethod
+    def from_orm(cls: Type[_Slotted], obj: Any) -> _Slotted:
+        """Builds the model from the attributes of an ORM object
+
+        Args:
+            obj (Any): ORM object exposing every field of the model
+
+        Returns:
+            model (SlottedModel): Model with the values of the object
+        """
+        return cls(*cls.__domain_metadata__.values(obj))
+
+    def column_values(self) -> Dict[str, Any]:
+        """Plain valued fields of the model, keyed by field name
+
+        Returns:
+            values (Dict[str, Any]): Values stored as columns by the ORM mappers.
+        """
+        return {
+            name: getattr(self, name)
+            for name in self.__domain_metadata__.column_fields
+        }
 
 
 class Event(pydantic.BaseModel):
     ...
 
 
-class ValueObject(DomainBaseModel):
-    def __hash__(self) -> int:
-        return super().__hash__()
+@dataclasses.dataclass(frozen=True, eq=False, slots=True)
+class ValueObject(SlottedModel):
+    ...
 
 
-class Entity(DomainBaseModel):
+@dataclasses.dataclass(eq=False, slots=True)
+class Entity(SlottedModel):
     id: str
 
-    class Config(DomainBaseModel.Config):
-        frozen: bool = False
+    @classmethod
+    def _identity_fields(cls) -> Optional[Tuple[str, ...]]:
+        return ("id",)
 
     def __repr__(self) -> str:
         return f"<{self.__class__.__name__} {self.id}>"
 
-    def __hash__(self) -> int:
-        return hash(self.__class__) + hash(self.id)
-
-    def __eq__(self, other: object) -> bool:
-        if not isinstance(other, self.__class__):
-            return False
-        return other.id == self.id
-
 
 class Aggregate(DomainBaseModel):
     version_number: int = pydantic.Field(default=0)
@@ -48,23 +311,9 @@ class Aggregate(DomainBaseModel):
     class Config(DomainBaseModel.Config):
         frozen: bool = False
 
-    def __hash__(self) -> int:
-        _pk = self._get_primary_key()
-        return hash(self.__class__) + hash(_pk)
+    @classmethod
+    def _identity_fields(cls) -> Optional[Tuple[str, ...]]:
+        return None
 
     def _update_version(self) -> None:
         self.version_number += 1
-
-    def _get_primary_key(self) -> str:
-        _properties = self.schema().get("properties")
-        assert (
-            _properties is not None
-        ), "Aggregate object must have at least one field"
-
-        _fields: List[str] = _properties.keys()
-        _filter: Callable[[str], bool] = (
-            lambda x: _properties[x].get("primary_key") is True
-        )
-        _pk: Any = pydash.collections.find(_fields, _filter)
-        assert _pk is not None, "Aggregate object must have a primary_key"
-        return _pk
@@ -3,23 +3,84 @@ from contextlib import asynccontextmanager
 import structlog
 from fastapi import FastAPI
 
+from src.allocation.adapters import (
+    database,
+    leak_detection,
+    notifications,
+    outbox,
+    statement_tracking,
+)
 from src.allocation.domain.service import unit_of_work
 from src.allocation.lib import settings
 
+_LOGGER = structlog.get_logger()
 _SETTINGS = settings.get_settings()
 
 
 def get_default_uow() -> unit_of_work.AbstractUnitOfWork:
+    if _SETTINGS.database.use_async_driver:
+        return unit_of_work.AsyncSqlAlchemyUnitOfWork()
     return unit_of_work.SqlAlchemyUnitOfWork()
 
 
+def get_default_uow_factory() -> unit_of_work.UnitOfWorkFactory:
+    return get_default_uow
+
+
+def get_read_session_factory() -> unit_of_work.SessionFactory:
+    return unit_of_work.get_read_session_factory()
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await configure_logging()
+    _database = database.get_database()
+    await _database.warm_up()
+    app.state.database = _database
+    _notifier = notifications.get_notifier()
+    await _notifier.start()
+    app.state.notifier = _notifier
+    _relay = outbox.get_relay()
+    if _SETTINGS.outbox.relay_enabled:
+        await _relay.start()
+    elif _SETTINGS.outbox.enabled:
+        # Only fine when the relay of another process drains the shared outbox
+        _LOGGER.warning(
+            "outbox_without_relay",
+            detail="events are written to the outbox but this process doesn't "
+            "relay them, the table grows unless another process does",
+        )
+    app.state.outbox_relay = _relay
+    _leak_detector = None
+    if _SETTINGS.database.session_leak_threshold is not None:
+        _leak_detector = leak_detection.SessionLeakDetector(
+            threshold=_SETTINGS.database.session_leak_threshold,
+            sweep_interval=_SETTINGS.database.session_leak_sweep_interval,
+        )
+        _leak_detector.install()
+        await _leak_detector.start()
+        app.state.session_leak_detector = _leak_detector
+
+    _statement_tracker = None
+    if _SETTINGS.database.statement_tracking:
+        _statement_tracker = statement_tracking.StatementTracker(
+            n_plus_one_threshold=_SETTINGS.database.n_plus_one_threshold,
+            slow_statements=_SETTINGS.database.slow_statements,
+        )
+        _statement_tracker.install()
+        app.state.statement_tracker = _statement_tracker
 
     yield
 
     # Clean Services
+    await _relay.stop()
+    await _notifier.stop()
+    if _leak_detector is not None:
+        await _leak_detector.stop()
+        _leak_detector.uninstall()
+    if _statement_tracker is not None:
+        _statement_tracker.uninstall()
+    await _database.dispose()
 
 
 async def configure_logging() -> None:
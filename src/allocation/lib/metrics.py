@@ -0,0 +1,280 @@
+import bisect
+import math
+import threading
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# Seconds, from a cached read to a slow commit
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+_Labels = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    _pairs = ",".join(
+        '{}="{}"'.format(
+            name,
+            value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for name, value in zip(names, values)
+    )
+    return "{" + _pairs + "}"
+
+
+class _Metric:
+    """Metric family, one series per combination of label values
+
+    Args:
+        name (str): Metric name
+        documentation (str): Help text of the metric
+        labelnames (Sequence[str]): Names of the labels of its series
+    """
+
+    kind = "untyped"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Sequence[str] = ()
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def render(self) -> List[str]:
+        _lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        with self._lock:
+            _lines.extend(self._samples())
+        return _lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Value that only goes up, such as the events handled"""
+
+    kind = "counter"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Sequence[str] = ()
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[_Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} "
+            f"{_format_value(value)}"
+            for labels, value in self._values.items()
+        ]
+
+
+class Gauge(Counter):
+    """Value that goes up and down, such as the events waiting on the bus"""
+
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+
+class _HistogramSeries:
+    __slots__ = ("buckets", "count", "sum")
+
+    def __init__(self, size: int) -> None:
+        self.buckets = [0] * size
+        self.count = 0
+        self.sum = 0.0
+
+
+class Histogram(_Metric):
+    """Distribution of observed values counted on cumulative buckets
+
+    Args:
+        name (str): Metric name
+        documentation (str): Help text of the metric
+        labelnames (Sequence[str]): Names of the labels of its series
+        buckets (Sequence[float]): Upper bounds of the buckets, in ascending
+            order, ``+Inf`` is added when missing
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.bounds = tuple(sorted(buckets))
+        if self.bounds[-1] != math.inf:
+            self.bounds += (math.inf,)
+        self._series: Dict[_Labels, _HistogramSeries] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        _index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            _series = self._series.get(labels)
+            if _series is None:
+                _series = self._series[labels] = _HistogramSeries(len(self.bounds))
+            _series.buckets[_index] += 1
+            _series.count += 1
+            _series.sum += value
+
+    def count(self, *labels: str) -> int:
+        _series = self._series.get(labels)
+        return 0 if _series is None else _series.count
+
+    def _samples(self) -> List[str]:
+        _names = self.labelnames + ("le",)
+        _lines: List[str] = []
+        for labels, series in self._series.items():
+            _cumulative = 0
+            for bound, count in zip(self.bounds, series.buckets):
+                _cumulative += count
+                _lines.append(
+                    f"{self.name}_bucket"
+                    f"{_format_labels(_names, labels + (_format_value(bound),))}"
+                    f" {_cumulative}"
+                )
+            _suffix = _format_labels(self.labelnames, labels)
+            _lines.append(f"{self.name}_sum{_suffix} {_format_value(series.sum)}")
+            _lines.append(f"{self.name}_count{_suffix} {series.count}")
+        return _lines
+
+
+# Builds metrics on each scrape, for the figures the components keep themselves
+Collector = Callable[[], Iterable[_Metric]]
+
+
+class Registry:
+    """Metrics of the process, rendered in the Prometheus text format"""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> None:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+
+    def counter(
+        self, name: str, documentation: str, labelnames: Sequence[str] = ()
+    ) -> Counter:
+        _metric = Counter(name, documentation, labelnames)
+        self.register(_metric)
+        return _metric
+
+    def gauge(
+        self, name: str, documentation: str, labelnames: Sequence[str] = ()
+    ) -> Gauge:
+        _metric = Gauge(name, documentation, labelnames)
+        self.register(_metric)
+        return _metric
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        _metric = Histogram(name, documentation, labelnames, buckets)
+        self.register(_metric)
+        return _metric
+
+    def render(self, collectors: Iterable[Collector] = ()) -> str:
+        """Exposes the registered metrics, then the collected ones
+
+        Args:
+            collectors (Iterable[Collector]): Builders of the metrics read at
+                scrape time
+
+        Returns:
+            text (str): Metrics in the Prometheus text exposition format
+        """
+        _lines: List[str] = []
+        for metric in self._metrics.values():
+            _lines.extend(metric.render())
+        for collector in collectors:
+            for metric in collector():
+                _lines.extend(metric.render())
+        return "\n".join(_lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    "allocation_http_request_duration_seconds",
+    "Time to answer an HTTP request",
+    labelnames=("method", "route", "status"),
+)
+MESSAGEBUS_HANDLER_DURATION = REGISTRY.histogram(
+    "allocation_messagebus_handler_duration_seconds",
+    "Time spent in a message bus handler, retries included",
+    labelnames=("handler",),
+)
+MESSAGEBUS_EVENTS = REGISTRY.counter(
+    "allocation_messagebus_events_total",
+    "Events handled by the message bus",
+    labelnames=("event",),
+)
+MESSAGEBUS_QUEUE_DEPTH = REGISTRY.gauge(
+    "allocation_messagebus_queue_depth",
+    "Events waiting on the message bus queues",
+)
+MESSAGEBUS_CASCADED_EVENTS = REGISTRY.histogram(
+    "allocation_messagebus_cascaded_events",
+    "Events handled for each event put on the message bus, itself included",
+    buckets=(1, 2, 3, 4, 6, 8, 16, 32, 64),
+)
+UOW_COMMIT_DURATION = REGISTRY.histogram(
+    "allocation_uow_commit_duration_seconds",
+    "Time to commit a unit of work",
+    labelnames=("unit_of_work",),
+)
+UOW_ROLLBACK_DURATION = REGISTRY.histogram(
+    "allocation_uow_rollback_duration_seconds",
+    "Time to roll back a unit of work",
+    labelnames=("unit_of_work",),
+)
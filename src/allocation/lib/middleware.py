@@ -0,0 +1,186 @@
+import asyncio
+import contextlib
+import time
+import uuid
+from typing import Any, Callable, ContextManager, Dict, Optional
+
+import structlog
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.allocation.adapters import leak_detection, statement_tracking
+from src.allocation.lib import metrics, profiling
+
+_LOGGER = structlog.get_logger()
+
+
+class RequestContextMiddleware:
+    """Binds a request id to the structlog context of each HTTP request
+
+    The id comes from the request header when the caller sends one and is
+    returned on the response. When the session leak detector is installed, the
+    sessions the request left open are logged once it's over. When the
+    statement tracker is installed, the statements of the request are counted
+    and timed, returned on a ``Server-Timing`` header and logged once it's
+    over.
+
+    Args:
+        app (ASGIApp): Application to wrap
+        header_name (str): Header carrying the request id
+    """
+
+    def __init__(self, app: ASGIApp, header_name: str = "X-Request-ID") -> None:
+        self.app = app
+        self.header_name = header_name
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        _request_id = Headers(scope=scope).get(self.header_name) or uuid.uuid4().hex
+        _statements: Optional[statement_tracking.RequestStatements] = None
+
+        async def _send(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                _headers = MutableHeaders(scope=message)
+                _headers[self.header_name] = _request_id
+                if _statements is not None:
+                    _headers["Server-Timing"] = _server_timing(_statements)
+            await send(message)
+
+        with structlog.contextvars.bound_contextvars(
+            request_id=_request_id
+        ), _track_statements(scope) as _statements:
+            try:
+                await self.app(scope, receive, _send)
+            finally:
+                _detector = _leak_detector(scope)
+                if _detector is not None:
+                    _detector.check_request(_request_id)
+                if _statements is not None:
+                    _LOGGER.info(
+                        "request_statements",
+                        statements=_statements.count,
+                        db_time_ms=round(_statements.duration * 1e3, 3),
+                        slowest=[
+                            (round(duration * 1e3, 3), statement)
+                            for duration, statement in _statements.slowest
+                        ],
+                    )
+
+
+class MetricsMiddleware:
+    """Records the latency of each HTTP request by route template, so the paths
+    of different batches or orders share their series
+
+    Args:
+        app (ASGIApp): Application to wrap
+        histogram (Histogram): Labelled by method, route and status
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        histogram: metrics.Histogram = metrics.HTTP_REQUEST_DURATION,
+    ) -> None:
+        self.app = app
+        self.histogram = histogram
+        self._routes: Dict[Callable[..., Any], str] = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        _status = 500
+
+        async def _send(message: Message) -> None:
+            nonlocal _status
+            if message["type"] == "http.response.start":
+                _status = message["status"]
+            await send(message)
+
+        _started = time.perf_counter()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            self.histogram.observe(
+                time.perf_counter() - _started,
+                scope["method"],
+                self._route(scope),
+                str(_status),
+            )
+
+    def _route(self, scope: Scope) -> str:
+        """Template of the matched route, the router sets its endpoint on the
+        scope"""
+        _endpoint = scope.get("endpoint")
+        if _endpoint is None:
+            return "unmatched"
+        _route = self._routes.get(_endpoint)
+        if _route is None:
+            _paths = {
+                getattr(route, "endpoint", None): getattr(route, "path", "")
+                for route in getattr(scope.get("app"), "routes", [])
+            }
+            _route = self._routes[_endpoint] = _paths.get(_endpoint, "unmatched")
+        return _route
+
+
+class ProfilingMiddleware:
+    """Profiles the requests the profiler picks, writing each profile off the
+    event loop once the request is over
+
+    Args:
+        app (ASGIApp): Application to wrap
+        profiler (RequestProfiler): Picks the requests and writes the profiles
+    """
+
+    def __init__(self, app: ASGIApp, profiler: profiling.RequestProfiler) -> None:
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        _profile = self.profiler.start(Headers(scope=scope))
+        if _profile is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.profiler.stop(_profile)
+            _request_id = structlog.contextvars.get_contextvars().get(
+                "request_id", uuid.uuid4().hex
+            )
+            _path = await asyncio.to_thread(
+                self.profiler.dump, _profile, _request_id
+            )
+            _LOGGER.info("request_profiled", path=str(_path), route=scope["path"])
+
+
+def _server_timing(statements: statement_tracking.RequestStatements) -> str:
+    _duration = statements.duration * 1e3
+    return f'db;dur={_duration:.3f};desc="{statements.count} statements"'
+
+
+def _track_statements(
+    scope: Scope,
+) -> ContextManager[Optional[statement_tracking.RequestStatements]]:
+    _app = scope.get("app")
+    _tracker: Optional[statement_tracking.StatementTracker] = getattr(
+        getattr(_app, "state", None), "statement_tracker", None
+    )
+    if _tracker is None:
+        return contextlib.nullcontext()
+    return _tracker.track()
+
+
+def _leak_detector(scope: Scope) -> Optional[leak_detection.SessionLeakDetector]:
+    _app = scope.get("app")
+    return getattr(getattr(_app, "state", None), "session_leak_detector", None)
@@ -0,0 +1,241 @@
+import abc
+import collections
+import cProfile
+import datetime
+import hashlib
+import hmac
+import pathlib
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from types import FrameType
+from typing import Callable, Counter, List, Optional
+
+from starlette.datastructures import Headers
+
+from src.allocation.lib import settings
+
+HEADER_NAME = "X-Profile-Request"
+
+# Characters kept from the request identifier in the profile file names
+_UNSAFE_NAME = re.compile(r"[^A-Za-z0-9_-]")
+_NAME_LENGTH = 64
+
+
+def sign(secret: str, timestamp: Optional[int] = None) -> str:
+    """Value of the profiling header, for the callers holding the secret
+
+    Args:
+        secret (str): Secret of the profiling settings
+        timestamp (Optional[int]): Unix time of the signature, now by default
+
+    Returns:
+        value (str): Timestamp and its HMAC-SHA256, colon separated
+    """
+    _timestamp = int(time.time()) if timestamp is None else timestamp
+    _digest = hmac.new(
+        secret.encode(), str(_timestamp).encode(), hashlib.sha256
+    ).hexdigest()
+    return f"{_timestamp}:{_digest}"
+
+
+def verify(value: str, secret: str, max_age: float, now: float) -> bool:
+    """Whether the header was signed with the secret less than max_age ago"""
+    _timestamp = value.partition(":")[0]
+    if not _timestamp.isdigit() or abs(now - int(_timestamp)) > max_age:
+        return False
+    return hmac.compare_digest(sign(secret, int(_timestamp)), value)
+
+
+class Profile(abc.ABC):
+    suffix: str
+
+    @abc.abstractmethod
+    def start(self) -> None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def stop(self) -> None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def dump(self, path: pathlib.Path) -> None:
+        raise NotImplementedError
+
+
+class DeterministicProfile(Profile):
+    """Every call of the current thread through cProfile, dumped as pstats
+
+    Calls of the other tasks interleaved on the event loop are recorded too.
+    """
+
+    suffix = ".pstats"
+
+    def __init__(self) -> None:
+        self._profile = cProfile.Profile()
+
+    def start(self) -> None:
+        self._profile.enable()
+
+    def stop(self) -> None:
+        self._profile.disable()
+
+    def dump(self, path: pathlib.Path) -> None:
+        self._profile.dump_stats(path)
+
+
+class SamplingProfile(Profile):
+    """Stacks of the current thread sampled from a background thread, dumped
+    as collapsed stacks ready for flamegraph.pl or speedscope
+
+    Started on the event loop, it samples the async code of every task and not
+    the sync endpoints running on the thread pool.
+
+    Args:
+        interval (float): Seconds between two samples
+    """
+
+    suffix = ".collapsed"
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self.stacks: Counter[str] = collections.Counter()
+        self._thread_id = threading.get_ident()
+        self._stopped = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+
+    def start(self) -> None:
+        self._thread_id = threading.get_ident()
+        self._sampler.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._sampler.join()
+
+    def dump(self, path: pathlib.Path) -> None:
+        path.write_text(
+            "".join(f"{stack} {count}\n" for stack, count in self.stacks.items())
+        )
+
+    def _sample(self) -> None:
+        while not self._stopped.wait(self.interval):
+            _frame = sys._current_frames().get(self._thread_id)  # pyright: ignore
+            if _frame is not None:
+                self.stacks[_collapse(_frame)] += 1
+
+
+def _collapse(frame: Optional[FrameType]) -> str:
+    _names: List[str] = []
+    while frame is not None:
+        _code = frame.f_code
+        _names.append(
+            f"{_code.co_name} ({_code.co_filename}:{_code.co_firstlineno})"
+        )
+        frame = frame.f_back
+    return ";".join(reversed(_names))
+
+
+class RequestProfiler:
+    """Picks the requests to profile and writes their profiles
+
+    A request is profiled when it carries a header signed with the secret, or
+    on one request in ``sample_every``. Only one request is profiled at a time
+    and at most one every ``min_interval`` seconds, the other ones run without
+    overhead.
+
+    Args:
+        profiling_settings (_ProfilingSettings): Triggers, profiler and limits
+        clock (Callable[[], float]): Unix time source
+    """
+
+    def __init__(
+        self,
+        profiling_settings: settings._ProfilingSettings,  # pyright: ignore
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.settings = profiling_settings
+        self.output_dir = pathlib.Path(profiling_settings.output_dir)
+        self._clock = clock
+        self._random = random.Random()
+        self._lock = threading.Lock()
+        self._active = False
+        self._last_started: Optional[float] = None
+        self.profiled = 0
+        self.throttled = 0
+
+    def start(self, headers: Headers) -> Optional[Profile]:
+        """Starts profiling the current request when it's picked and the rate
+        limit allows it
+
+        Args:
+            headers (Headers): Headers of the request
+
+        Returns:
+            profile (Optional[Profile]): Running profile, None when the request
+            isn't profiled
+        """
+        if not self._picked(headers):
+            return None
+        _now = self._clock()
+        with self._lock:
+            if self._active or (
+                self._last_started is not None
+                and _now - self._last_started < self.settings.min_interval
+            ):
+                self.throttled += 1
+                return None
+            self._active = True
+            self._last_started = _now
+        _profile: Profile = (
+            DeterministicProfile()
+            if self.settings.profiler == "deterministic"
+            else SamplingProfile(interval=self.settings.sampling_interval)
+        )
+        _profile.start()
+        return _profile
+
+    def stop(self, profile: Profile) -> None:
+        """Stops the profile, on the thread that started it"""
+        try:
+            profile.stop()
+        finally:
+            with self._lock:
+                self._active = False
+                self.profiled += 1
+
+    def dump(self, profile: Profile, name: str) -> pathlib.Path:
+        """Writes a stopped profile to the output directory
+
+        Args:
+            profile (Profile): Stopped profile
+            name (str): Identifies the request in the file name, reduced to
+                letters, digits, dashes and underscores as it may come from
+                the client
+
+        Returns:
+            path (Path): Written file
+        """
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        _now = datetime.datetime.utcfromtimestamp(self._clock())
+        _name = _UNSAFE_NAME.sub("", name)[:_NAME_LENGTH] or uuid.uuid4().hex
+        _path = self.output_dir / f"{_now:%Y%m%dT%H%M%S}-{_name}{profile.suffix}"
+        profile.dump(_path)
+        return _path
+
+    def _picked(self, headers: Headers) -> bool:
+        _signature = headers.get(HEADER_NAME)
+        if _signature is not None and self.settings.header_secret is not None:
+            if verify(
+                _signature,
+                secret=self.settings.header_secret,
+                max_age=self.settings.header_max_age,
+                now=self._clock(),
+            ):
+                return True
+        return (
+            self.settings.sample_every > 0
+            and self._random.randrange(self.settings.sample_every) == 0
+        )
@@ -1,8 +1,10 @@
 from functools import lru_cache
-from typing import List, Optional
+from typing import List, Literal, Optional
 
 import pydantic
 
+from src.allocation.domain.model import deallocation
+
 
 class _ProjectSettings(pydantic.BaseModel):
     title: str = "Allocation API"
@@ -37,6 +39,25 @@ class _DatabaseSettings(pydantic.BaseModel):
     user: str = "allocation"
     password: str = "abc123"
     database: str = "allocation"
+    use_async_driver: bool = False
+    # Replace the MySQL URLs, e.g. a SQLite file for local load tests
+    url: Optional[str] = None
+    async_url: Optional[str] = None
+    isolation_level: str = "REPEATABLE READ"
+    # Keep pool_size + max_overflow times the workers under MySQL max_connections
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_pre_ping: bool = True
+    pool_recycle: int = 3600
+    pool_timeout: float = 30.0
+    # Seconds a session may hold a connection before being logged, None disables
+    session_leak_threshold: Optional[float] = None
+    # Seconds between two checks of the open sessions, even on an idle worker
+    session_leak_sweep_interval: float = 5.0
+    # Count and time the statements of each request, warn on repeated shapes
+    statement_tracking: bool = False
+    n_plus_one_threshold: int = 10
+    slow_statements: int = 3
 
     @property
     def mysql_uri(self) -> str:
@@ -44,12 +65,89 @@ class _DatabaseSettings(pydantic.BaseModel):
             "mysql+mysqlconnector://{user}:{password}@{host}:{port}/{database}"
         ).format(**self.dict())
 
+    @property
+    def mysql_async_uri(self) -> str:
+        return (
+            "mysql+aiomysql://{user}:{password}@{host}:{port}/{database}"
+        ).format(**self.dict())
+
+
+class _AllocationSettings(pydantic.BaseModel):
+    deallocation_policy: deallocation.DeallocationPolicy = (
+        deallocation.DeallocationPolicy.FEWEST_LINES
+    )
+
+
+class _NotificationSettings(pydantic.BaseModel):
+    # Messages are printed on the console while no SMTP server is configured
+    smtp_host: Optional[str] = None
+    smtp_port: int = 25
+    smtp_timeout: float = 10.0
+    sender: str = "allocation@made.com"
+    out_of_stock_recipient: str = "stock@made.com"
+    queue_size: int = 1000
+    workers: int = 2
+    batch_size: int = 20
+    retries: int = 3
+    retry_backoff_base: float = 0.5
+    retry_backoff_max: float = 10.0
+    shutdown_timeout: float = 5.0
+
+
+class _OutboxSettings(pydantic.BaseModel):
+    enabled: bool = True
+    # Disable on the workers not relaying, as long as one process still does
+    relay_enabled: bool = True
+    relay_batch_size: int = 100
+    relay_poll_interval: float = 1.0
+    # Seconds a relay owns the events it claimed, before another one may retry
+    relay_lease: float = 30.0
+
+
+class _ProductCacheSettings(pydantic.BaseModel):
+    enabled: bool = False
+    max_size: int = 1024
+    ttl: float = 60.0
+
+
+class _MessageBusSettings(pydantic.BaseModel):
+    # Queue the handlers writing the same product instead of racing on its row
+    serialize_by_sku: bool = True
+    # Opt-in, allocations of a sku arriving within the window share a commit
+    group_commit: bool = False
+    group_commit_window: float = 0.002
+    group_commit_max_size: int = 64
+    conflict_retries: int = 5
+    retry_backoff_base: float = 0.005
+    retry_backoff_max: float = 0.2
+
+
+class _ProfilingSettings(pydantic.BaseModel):
+    # Opt-in, the middleware isn't installed otherwise
+    enabled: bool = False
+    # Profile one request in sample_every, 0 only profiles the signed requests
+    sample_every: int = 0
+    # Requests carrying a header signed with the secret are profiled
+    header_secret: Optional[str] = None
+    header_max_age: float = 60.0
+    profiler: Literal["sampling", "deterministic"] = "sampling"
+    sampling_interval: float = 0.001
+    output_dir: str = "profiles"
+    # Seconds between two profiled requests of a worker
+    min_interval: float = 10.0
+
 
 class _Settings(pydantic.BaseSettings):
     project: _ProjectSettings = _ProjectSettings()
     cors: _CorsSettings = _CorsSettings()
     logging: _LoggingSettings = _LoggingSettings()
     database: _DatabaseSettings = _DatabaseSettings()
+    allocation: _AllocationSettings = _AllocationSettings()
+    messagebus: _MessageBusSettings = _MessageBusSettings()
+    product_cache: _ProductCacheSettings = _ProductCacheSettings()
+    notifications: _NotificationSettings = _NotificationSettings()
+    outbox: _OutboxSettings = _OutboxSettings()
+    profiling: _ProfilingSettings = _ProfilingSettings()
 
     is_local_environment: Optional[bool] = False
 
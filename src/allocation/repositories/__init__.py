@@ -1,5 +1,20 @@
-from src.allocation.repositories.abstract import AbstractRepository
+from src.allocation.repositories.abstract import (
+    AbstractRepository,
+    ConcurrencyConflictException,
+)
+from src.allocation.repositories.allocations_view import (
+    AbstractAllocationsView,
+    AsyncSqlAlchemyAllocationsView,
+    FakeAllocationsView,
+    SqlAlchemyAllocationsView,
+)
+from src.allocation.repositories.cache import (
+    CachedRepository,
+    CacheStatistics,
+    ProductCache,
+)
 from src.allocation.repositories.sqlalchemy_repository import (
+    AsyncSqlAlchemyRepository,
     FakeRepository,
     SqlAlchemyRepository,
 )
@@ -7,5 +22,14 @@ from src.allocation.repositories.sqlalchemy_repository import (
 __all__ = [
     "AbstractRepository",
     "SqlAlchemyRepository",
+    "AsyncSqlAlchemyRepository",
     "FakeRepository",
+    "ConcurrencyConflictException",
+    "AbstractAllocationsView",
+    "SqlAlchemyAllocationsView",
+    "AsyncSqlAlchemyAllocationsView",
+    "FakeAllocationsView",
+    "ProductCache",
+    "CacheStatistics",
+    "CachedRepository",
 ]
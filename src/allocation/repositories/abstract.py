@@ -1,38 +1,97 @@
 import abc
-from typing import Optional, Set
+from typing import Dict, Optional, Sequence, Set
 
 from src.allocation.domain.model import aggregate
 
 
+class ConcurrencyConflictException(Exception):
+    """Raise when the product changed since it was loaded by this unit of work"""
+
+
 class AbstractRepository(abc.ABC):
     def __init__(self) -> None:
         self.seen: Set[aggregate.Product] = set()
+        # Written on the transaction of the unit of work, not committed yet
+        self._written: Set[aggregate.Product] = set()
         super().__init__()
 
-    def add(self, product: aggregate.Product) -> None:
-        self._add(product)
+    async def add(self, product: aggregate.Product) -> None:
+        await self._add(product)
         self.seen.add(product)
+        self._written.add(product)
 
-    def get(self, sku: str) -> Optional[aggregate.Product]:
-        product = self._get(sku)
+    async def get(self, sku: str) -> Optional[aggregate.Product]:
+        product = await self._get(sku)
         if product:
             self.seen.add(product)
         return product
 
-    def get_by_batchref(self, ref: str) -> Optional[aggregate.Product]:
-        product = self._get_by_batchref(ref)
+    async def get_by_batchref(self, ref: str) -> Optional[aggregate.Product]:
+        product = await self._get_by_batchref(ref)
         if product:
             self.seen.add(product)
         return product
 
+    async def get_allocated_batchrefs(
+        self, sku: str, order_ids: Sequence[str]
+    ) -> Dict[str, str]:
+        """Looks up where the order lines of a product are already allocated,
+        without loading the product
+
+        Args:
+            sku (str): Unique product identifier
+            order_ids (Sequence[str]): Orders to look up
+
+        Returns:
+            batch_refs (Dict[str, str]): Batch reference keyed by order id, only
+            for the orders already allocated
+        """
+        if not order_ids:
+            return {}
+        return await self._get_allocated_batchrefs(sku, order_ids)
+
+    async def get_version(self, sku: str) -> Optional[int]:
+        """Reads the stored version of a product, without loading the product
+
+        Args:
+            sku (str): Unique product identifier
+
+        Returns:
+            version_number (Optional[int]): Stored version, None when the product
+            doesn't exist
+        """
+        return await self._get_version(sku)
+
+    def committed(self) -> None:
+        """Called by the unit of work once its changes are committed, the
+        products written are in sync with storage from then on"""
+        for product in self._written:
+            product.mark_persisted()
+        self._written.clear()
+
+    def rolled_back(self) -> None:
+        """Called by the unit of work once its changes are rolled back, the
+        products written keep their changes so a retry writes them again"""
+        self._written.clear()
+
+    @abc.abstractmethod
+    async def _add(self, product: aggregate.Product) -> None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def _get(self, sku: str) -> Optional[aggregate.Product]:
+        raise NotImplementedError
+
     @abc.abstractmethod
-    def _add(self, product: aggregate.Product) -> None:
+    async def _get_by_batchref(self, ref: str) -> Optional[aggregate.Product]:
         raise NotImplementedError
 
     @abc.abstractmethod
-    def _get(self, sku: str) -> Optional[aggregate.Product]:
+    async def _get_allocated_batchrefs(
+        self, sku: str, order_ids: Sequence[str]
+    ) -> Dict[str, str]:
         raise NotImplementedError
 
     @abc.abstractmethod
-    def _get_by_batchref(self, ref: str) -> Optional[aggregate.Product]:
+    async def _get_version(self, sku: str) -> Optional[int]:
         raise NotImplementedError
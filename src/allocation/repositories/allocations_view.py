@@ -0,0 +1,108 @@
+import abc
+from typing import Dict, List, Tuple
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from src.allocation.adapters import orm
+
+_view = orm.allocations_view_table
+
+
+class AbstractAllocationsView(abc.ABC):
+    """Write side of the allocations read model, keyed by order and product"""
+
+    @abc.abstractmethod
+    async def add(self, order_id: str, sku: str, batch_ref: str) -> None:
+        """Records where an order line is allocated, replacing the previous batch"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def remove(self, order_id: str, sku: str, batch_ref: str) -> None:
+        """Forgets an allocation, unless the line was allocated elsewhere since"""
+        raise NotImplementedError
+
+
+def _add_allocation(
+    session: Session, order_id: str, sku: str, batch_ref: str
+) -> None:
+    # Events of a reallocation may arrive in any order, the newest batch wins
+    _updated = session.execute(
+        update(_view)
+        .where(_view.c.order_id == order_id, _view.c.sku == sku)
+        .values(batch_ref=batch_ref)
+    )
+    if _updated.rowcount == 0:
+        session.execute(
+            insert(_view).values(order_id=order_id, sku=sku, batch_ref=batch_ref)
+        )
+
+
+def _remove_allocation(
+    session: Session, order_id: str, sku: str, batch_ref: str
+) -> None:
+    session.execute(
+        delete(_view).where(
+            _view.c.order_id == order_id,
+            _view.c.sku == sku,
+            _view.c.batch_ref == batch_ref,
+        )
+    )
+
+
+def get_allocations(session: Session, order_id: str) -> List[Tuple[str, str]]:
+    """Reads where the lines of an order are allocated, with a single query on
+    the primary key of the read model
+
+    Args:
+        session (Session): Session used for the query
+        order_id (str): Unique order identifier
+
+    Returns:
+        allocations (List[Tuple[str, str]]): Sku and batch reference of each
+        allocated line
+    """
+    _rows = session.execute(
+        select(_view.c.sku, _view.c.batch_ref)
+        .where(_view.c.order_id == order_id)
+        .order_by(_view.c.sku)
+    )
+    return [(sku, batch_ref) for sku, batch_ref in _rows]
+
+
+class SqlAlchemyAllocationsView(AbstractAllocationsView):
+    def __init__(self, session: Session) -> None:
+        self.session = session
+        super().__init__()
+
+    async def add(self, order_id: str, sku: str, batch_ref: str) -> None:
+        _add_allocation(self.session, order_id, sku, batch_ref)
+
+    async def remove(self, order_id: str, sku: str, batch_ref: str) -> None:
+        _remove_allocation(self.session, order_id, sku, batch_ref)
+
+
+class AsyncSqlAlchemyAllocationsView(AbstractAllocationsView):
+    def __init__(self, session: AsyncSession) -> None:
+        self.session = session
+        super().__init__()
+
+    async def add(self, order_id: str, sku: str, batch_ref: str) -> None:
+        await self.session.run_sync(_add_allocation, order_id, sku, batch_ref)
+
+    async def remove(self, order_id: str, sku: str, batch_ref: str) -> None:
+        await self.session.run_sync(_remove_allocation, order_id, sku, batch_ref)
+
+
+class FakeAllocationsView(AbstractAllocationsView):
+    def __init__(self) -> None:
+        self.rows: Dict[Tuple[str, str], str] = {}
+        super().__init__()
+
+    async def add(self, order_id: str, sku: str, batch_ref: str) -> None:
+        self.rows[(order_id, sku)] = batch_ref
+
+    async def remove(self, order_id: str, sku: str, batch_ref: str) -> None:
+        if self.rows.get((order_id, sku)) == batch_ref:
+            del self.rows[(order_id, sku)]
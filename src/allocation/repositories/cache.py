@@ -0,0 +1,195 @@
+import collections
+import copy
+import dataclasses
+import threading
+import time
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+from src.allocation.domain.model import aggregate
+from src.allocation.repositories.abstract import AbstractRepository
+
+# Cached product and the monotonic time when it expires
+_Entry = Tuple[aggregate.Product, float]
+
+
+@dataclasses.dataclass(frozen=True)
+class CacheStatistics:
+    """Snapshot of the counters of a product cache
+
+    Attributes:
+        size (int): Products currently cached.
+        max_size (int): Products kept before evicting the least recently used.
+        hits (int): Loads answered from the cache.
+        misses (int): Loads that went to the repository.
+        evictions (int): Products dropped for the size limit or their TTL.
+        invalidations (int): Products dropped because they changed in storage
+            or on an uncommitted unit of work.
+    """
+
+    size: int
+    max_size: int
+    hits: int
+    misses: int
+    evictions: int
+    invalidations: int
+
+
+class ProductCache:
+    """Bounded LRU of hydrated products keyed by sku, shared by the units of
+    work of a worker
+
+    Products are stored and handed out as copies, so a unit of work never sees
+    the changes of another one. Each entry remembers the persisted version of
+    its product, the repository compares it with the stored one before using it.
+
+    Args:
+        max_size (int): Products kept before evicting the least recently used
+        ttl (float): Seconds a product may stay cached
+        clock (Callable[[], float]): Monotonic time source
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "collections.OrderedDict[str, _Entry]" = (
+            collections.OrderedDict()
+        )
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def cached_version(self, sku: str) -> Optional[int]:
+        """Version of the cached product, None when missing or expired"""
+        with self._lock:
+            _entry = self._live_entry(sku)
+            return None if _entry is None else _entry[0].version_number
+
+    def get(self, sku: str, version: Optional[int]) -> Optional[aggregate.Product]:
+        """Copy of the cached product when it's still at the stored version
+
+        Args:
+            sku (str): Unique product identifier
+            version (Optional[int]): Version of the stored product
+
+        Returns:
+            product (Optional[Product]): Cached product, None on a miss
+        """
+        with self._lock:
+            _entry = self._live_entry(sku)
+            if _entry is not None and _entry[0].version_number != version:
+                del self._entries[sku]
+                self.invalidations += 1
+                _entry = None
+            if _entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(sku)
+            self.hits += 1
+            return copy.deepcopy(_entry[0])
+
+    def put(self, product: aggregate.Product) -> None:
+        """Caches a copy of a product matching its stored state, the product is
+        dropped instead when it has changes not persisted yet"""
+        if not product.pending_changes().is_empty:
+            self.invalidate(product.sku)
+            return
+        _snapshot = copy.deepcopy(product)
+        _snapshot.events.clear()
+        with self._lock:
+            self._entries[product.sku] = (_snapshot, self._clock() + self.ttl)
+            self._entries.move_to_end(product.sku)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, sku: str) -> None:
+        with self._lock:
+            if self._entries.pop(sku, None) is not None:
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def statistics(self) -> CacheStatistics:
+        with self._lock:
+            return CacheStatistics(
+                size=len(self._entries),
+                max_size=self.max_size,
+                hits=self.hits,
+                misses=self.misses,
+                evictions=self.evictions,
+                invalidations=self.invalidations,
+            )
+
+    def _live_entry(self, sku: str) -> Optional[_Entry]:
+        _entry = self._entries.get(sku)
+        if _entry is not None and _entry[1] <= self._clock():
+            del self._entries[sku]
+            self.evictions += 1
+            return None
+        return _entry
+
+
+class CachedRepository(AbstractRepository):
+    """Repository answering the product loads from a ``ProductCache``
+
+    A cached product is used only when its version matches the stored one,
+    checked with a single query on the products table. The products written
+    by the unit of work replace their cached copy once committed.
+
+    Args:
+        repository (AbstractRepository): Repository of the unit of work
+        cache (ProductCache): Cache shared by the units of work of the worker
+    """
+
+    def __init__(self, repository: AbstractRepository, cache: ProductCache) -> None:
+        self.repository = repository
+        self.cache = cache
+        super().__init__()
+
+    def committed(self) -> None:
+        self.repository.committed()
+        _written = set(self._written)
+        super().committed()
+        for product in _written:
+            self.cache.put(product)
+
+    def rolled_back(self) -> None:
+        self.repository.rolled_back()
+        for product in self._written:
+            self.cache.invalidate(product.sku)
+        super().rolled_back()
+
+    async def _add(self, product: aggregate.Product) -> None:
+        await self.repository.add(product)
+
+    async def _get(self, sku: str) -> Optional[aggregate.Product]:
+        _version = None
+        if self.cache.cached_version(sku) is not None:
+            _version = await self.repository.get_version(sku)
+        _product = self.cache.get(sku, version=_version)
+        if _product is None:
+            _product = await self.repository.get(sku)
+            if _product is not None:
+                self.cache.put(_product)
+        return _product
+
+    async def _get_by_batchref(self, ref: str) -> Optional[aggregate.Product]:
+        return await self.repository.get_by_batchref(ref)
+
+    async def _get_allocated_batchrefs(
+        self, sku: str, order_ids: Sequence[str]
+    ) -> Dict[str, str]:
+        return await self.repository.get_allocated_batchrefs(sku, order_ids)
+
+    async def _get_version(self, sku: str) -> Optional[int]:
+        return await self.repository.get_version(sku)
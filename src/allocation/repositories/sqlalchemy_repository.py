@@ -1,11 +1,194 @@
-from typing import Any, Callable, Optional, Set
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
 
 import pydash
-from sqlalchemy.orm import Session
+from sqlalchemy import String, bindparam, delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
 
 from src.allocation.adapters import orm
 from src.allocation.domain.model import aggregate
-from src.allocation.repositories.abstract import AbstractRepository
+from src.allocation.repositories.abstract import (
+    AbstractRepository,
+    ConcurrencyConflictException,
+)
+
+# Loads the whole aggregate in three queries whatever the number of batches:
+# products, then batches, then allocations joined with their order lines
+_PRODUCT_LOADER_OPTIONS = (
+    selectinload(orm.ProductMapper.batches).selectinload(
+        orm.BatchMapper._allocations  # pyright: ignore[reportPrivateUsage]
+    ),
+)
+
+
+def _add_product(session: Session, product: aggregate.Product) -> None:
+    """Writes only the rows changed since the product was loaded or persisted,
+    the product keeps its changes until the repository learns of the commit
+
+    The statements run at the Core level, so the cost of a commit follows the
+    size of the change instead of the size of the aggregate. The product row is
+    written first as a compare-and-swap on its version number.
+
+    Raises:
+        ConcurrencyConflictException: Raise when another transaction created or
+        changed the product since it was loaded
+    """
+    _changes = product.pending_changes()
+    if _changes.is_empty:
+        return
+
+    _connection = session.connection()
+    if _changes.is_new:
+        try:
+            _connection.execute(insert(orm.ProductMapper), [product.column_values()])
+        except IntegrityError as error:
+            raise ConcurrencyConflictException(
+                f"Product {_changes.sku} was created concurrently"
+            ) from error
+    else:
+        _swapped = _connection.execute(
+            update(orm.ProductMapper)
+            .where(
+                orm.ProductMapper.sku == _changes.sku,
+                orm.ProductMapper.version_number == _changes.persisted_version,
+            )
+            .values(version_number=_changes.version_number)
+        )
+        if _swapped.rowcount != 1:
+            raise ConcurrencyConflictException(
+                f"Product {_changes.sku} changed since version "
+                f"{_changes.persisted_version}"
+            )
+    if _changes.new_batches:
+        _connection.execute(
+            insert(orm.BatchMapper),
+            [batch.column_values() for batch in _changes.new_batches],
+        )
+    if _changes.resized_batches:
+        _connection.execute(
+            update(orm.BatchMapper)
+            .where(orm.BatchMapper.id == bindparam("batch_ref"))
+            .values(purchased_quantity=bindparam("batch_qty")),
+            [
+                {"batch_ref": batch.id, "batch_qty": batch.purchased_quantity}
+                for batch in _changes.resized_batches
+            ],
+        )
+    if _changes.removed_allocations:
+        _delete_allocations(session, _changes.removed_allocations)
+    if _changes.added_allocations:
+        _insert_allocations(session, _changes.added_allocations)
+
+
+def _allocation_params(
+    allocations: List[Tuple[str, aggregate.OrderLine]]
+) -> List[Dict[str, Any]]:
+    return [
+        {
+            "batch_ref": batch_ref,
+            "line_order_id": line.order_id,
+            "line_sku": line.sku,
+            "line_qty": line.qty,
+        }
+        for batch_ref, line in allocations
+    ]
+
+
+# Order lines are unique per order and product
+_LINE_MATCHES = (orm.OrderLineMapper.order_id == bindparam("line_order_id")) & (
+    orm.OrderLineMapper.sku == bindparam("line_sku")
+)
+
+
+def _insert_allocations(
+    session: Session, allocations: List[Tuple[str, aggregate.OrderLine]]
+) -> None:
+    _connection = session.connection()
+    _params = _allocation_params(allocations)
+    _connection.execute(
+        insert(orm.OrderLineMapper).values(
+            order_id=bindparam("line_order_id"),
+            sku=bindparam("line_sku"),
+            qty=bindparam("line_qty"),
+        ),
+        _params,
+    )
+    _connection.execute(
+        insert(orm.allocations_table).from_select(
+            ["batch_id", "orderline_id"],
+            select(
+                bindparam("batch_ref", type_=String), orm.OrderLineMapper.id
+            ).where(_LINE_MATCHES),
+        ),
+        _params,
+    )
+
+
+def _delete_allocations(
+    session: Session, allocations: List[Tuple[str, aggregate.OrderLine]]
+) -> None:
+    _connection = session.connection()
+    _params = _allocation_params(allocations)
+    _connection.execute(
+        delete(orm.allocations_table).where(
+            orm.allocations_table.c.batch_id == bindparam("batch_ref"),
+            orm.allocations_table.c.orderline_id.in_(
+                select(orm.OrderLineMapper.id).where(_LINE_MATCHES)
+            ),
+        ),
+        _params,
+    )
+    _connection.execute(delete(orm.OrderLineMapper).where(_LINE_MATCHES), _params)
+
+
+def _get_allocated_batchrefs(
+    session: Session, sku: str, order_ids: Sequence[str]
+) -> Dict[str, str]:
+    _rows = session.execute(
+        select(orm.OrderLineMapper.order_id, orm.allocations_table.c.batch_id)
+        .join(
+            orm.allocations_table,
+            orm.allocations_table.c.orderline_id == orm.OrderLineMapper.id,
+        )
+        .where(
+            orm.OrderLineMapper.sku == sku,
+            orm.OrderLineMapper.order_id.in_(order_ids),
+        )
+    )
+    return {order_id: batch_ref for order_id, batch_ref in _rows}
+
+
+def _get_version(session: Session, sku: str) -> Optional[int]:
+    return session.scalar(
+        select(orm.ProductMapper.version_number).where(orm.ProductMapper.sku == sku)
+    )
+
+
+def _get_product(session: Session, sku: str) -> Optional[aggregate.Product]:
+    # Rows already in the session are refreshed, the writes bypass its identity map
+    _product = session.scalars(
+        select(orm.ProductMapper)
+        .where(orm.ProductMapper.sku == sku)
+        .options(*_PRODUCT_LOADER_OPTIONS)
+        .execution_options(populate_existing=True)
+    ).one_or_none()
+    if _product:
+        return aggregate.Product.from_orm(_product)
+
+
+def _get_product_by_batchref(
+    session: Session, ref: str
+) -> Optional[aggregate.Product]:
+    _product = session.scalars(
+        select(orm.ProductMapper)
+        .join(orm.ProductMapper.batches)
+        .where(orm.BatchMapper.id == ref)
+        .options(*_PRODUCT_LOADER_OPTIONS)
+        .execution_options(populate_existing=True)
+    ).one_or_none()
+    if _product:
+        return aggregate.Product.from_orm(_product)
 
 
 class SqlAlchemyRepository(AbstractRepository):
@@ -13,24 +196,48 @@ class SqlAlchemyRepository(AbstractRepository):
         self.session = session
         super().__init__()
 
-    def _add(self, product: aggregate.Product) -> None:
-        _new_product = orm.ProductMapper.from_domain(product)
-        self.session.merge(_new_product)
-
-    def _get(self, sku: str) -> Optional[aggregate.Product]:
-        _product = self.session.get(orm.ProductMapper, sku)
-        if _product:
-            return aggregate.Product.from_orm(_product)
-
-    def _get_by_batchref(self, ref: str) -> Optional[aggregate.Product]:
-        _product = (
-            self.session.query(orm.ProductMapper)
-            .join(orm.BatchMapper)
-            .filter(orm.BatchMapper.id == ref)
-            .first()
-        )
-        if _product:
-            return aggregate.Product.from_orm(_product)
+    async def _add(self, product: aggregate.Product) -> None:
+        _add_product(self.session, product)
+
+    async def _get(self, sku: str) -> Optional[aggregate.Product]:
+        return _get_product(self.session, sku)
+
+    async def _get_by_batchref(self, ref: str) -> Optional[aggregate.Product]:
+        return _get_product_by_batchref(self.session, ref)
+
+    async def _get_allocated_batchrefs(
+        self, sku: str, order_ids: Sequence[str]
+    ) -> Dict[str, str]:
+        return _get_allocated_batchrefs(self.session, sku, order_ids)
+
+    async def _get_version(self, sku: str) -> Optional[int]:
+        return _get_version(self.session, sku)
+
+
+class AsyncSqlAlchemyRepository(AbstractRepository):
+    """Repository on an AsyncSession, the queries and the ORM hydration run on
+    the session greenlet through ``run_sync`` so the event loop never blocks."""
+
+    def __init__(self, session: AsyncSession) -> None:
+        self.session = session
+        super().__init__()
+
+    async def _add(self, product: aggregate.Product) -> None:
+        await self.session.run_sync(_add_product, product)
+
+    async def _get(self, sku: str) -> Optional[aggregate.Product]:
+        return await self.session.run_sync(_get_product, sku)
+
+    async def _get_by_batchref(self, ref: str) -> Optional[aggregate.Product]:
+        return await self.session.run_sync(_get_product_by_batchref, ref)
+
+    async def _get_allocated_batchrefs(
+        self, sku: str, order_ids: Sequence[str]
+    ) -> Dict[str, str]:
+        return await self.session.run_sync(_get_allocated_batchrefs, sku, order_ids)
+
+    async def _get_version(self, sku: str) -> Optional[int]:
+        return await self.session.run_sync(_get_version, sku)
 
 
 class FakeRepository(AbstractRepository):
@@ -38,18 +245,35 @@ class FakeRepository(AbstractRepository):
         self._products = set(products)
         super().__init__()
 
-    def _add(self, product: aggregate.Product) -> None:
+    async def _add(self, product: aggregate.Product) -> None:
         self._products.add(product)
 
-    def _get(self, sku: str) -> Optional[aggregate.Product]:
+    async def _get(self, sku: str) -> Optional[aggregate.Product]:
         _product: Any = pydash.collections.find(self._products, {"sku": sku})
         if isinstance(_product, aggregate.Product):
             return _product
 
-    def _get_by_batchref(self, ref: str) -> Optional[aggregate.Product]:
+    async def _get_by_batchref(self, ref: str) -> Optional[aggregate.Product]:
         batches_filter: Callable[[aggregate.Product], bool] = (
             lambda p: pydash.collections.find(p.batches, {"id": ref}) is not None
         )
         _product: Any = pydash.collections.find(self._products, batches_filter)
         if isinstance(_product, aggregate.Product):
             return _product
+
+    async def _get_allocated_batchrefs(
+        self, sku: str, order_ids: Sequence[str]
+    ) -> Dict[str, str]:
+        _order_ids = set(order_ids)
+        return {
+            line.order_id: batch.id
+            for product in self._products
+            if product.sku == sku
+            for batch in product.batches
+            for line in batch.allocations
+            if line.order_id in _order_ids
+        }
+
+    async def _get_version(self, sku: str) -> Optional[int]:
+        _product = await self._get(sku)
+        return None if _product is None else _product.version_number
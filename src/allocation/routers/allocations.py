@@ -0,0 +1,27 @@
+from fastapi import APIRouter, HTTPException, status
+
+from src.allocation.domain.model import dto
+from src.allocation.domain.service import views
+from src.allocation.routers import commons
+
+app_router = APIRouter(prefix="/allocations", tags=["Allocations"])
+
+
+@app_router.get(
+    path="/{order_id}",
+    status_code=status.HTTP_200_OK,
+    response_model=dto.OrderAllocationsOutput,
+)
+def get_allocations(
+    order_id: str,
+    session_factory: commons.ReadSessionFactory,
+) -> dto.OrderAllocationsOutput:
+    _allocations = views.allocations(
+        order_id=order_id, session_factory=session_factory
+    )
+    if not _allocations:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No allocations for order {order_id}",
+        )
+    return dto.OrderAllocationsOutput(order_id=order_id, allocations=_allocations)
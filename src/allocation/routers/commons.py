@@ -8,3 +8,9 @@ from src.allocation.lib import config
 DefaultUnitOfWork = Annotated[
     unit_of_work.AbstractUnitOfWork, Depends(config.get_default_uow)
 ]
+DefaultUnitOfWorkFactory = Annotated[
+    unit_of_work.UnitOfWorkFactory, Depends(config.get_default_uow_factory)
+]
+ReadSessionFactory = Annotated[
+    unit_of_work.SessionFactory, Depends(config.get_read_session_factory)
+]
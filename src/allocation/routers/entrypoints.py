@@ -1,9 +1,15 @@
+from typing import Any
+
 from fastapi import APIRouter, HTTPException, status
 
+from src.allocation import repositories
 from src.allocation.domain.model import aggregate, dto, events
-from src.allocation.domain.service import handlers, messagebus
+from src.allocation.domain.service import group_commit, handlers, messagebus
+from src.allocation.lib import settings
 from src.allocation.routers import commons
 
+_SETTINGS = settings.get_settings()
+
 app_router = APIRouter(prefix="/batches", tags=["Batches"])
 
 
@@ -26,6 +32,28 @@ async def add_batch(
     )
 
 
+@app_router.put(
+    path="/{reference}/quantity",
+    status_code=status.HTTP_204_NO_CONTENT,
+)
+async def change_batch_quantity(
+    reference: str,
+    payload: dto.BatchQuantityInput,
+    uow: commons.DefaultUnitOfWork,
+) -> None:
+    try:
+        await messagebus.handle(
+            uow=uow,
+            event=events.BatchQuantityChanged(
+                ref=reference, qty=payload.purchased_quantity
+            ),
+        )
+    except handlers.InvalidBatchReferenceException as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except repositories.ConcurrencyConflictException as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+
 @app_router.post(
     path="/allocate/",
     status_code=status.HTTP_201_CREATED,
@@ -34,13 +62,65 @@ async def add_batch(
 async def allocate(
     payload: dto.OrderLineInput,
     uow: commons.DefaultUnitOfWork,
+    uow_factory: commons.DefaultUnitOfWorkFactory,
 ) -> dto.OrderLineOutput:
+    _event = events.AllocationRequired(**payload.dict())
     try:
-        results = await messagebus.handle(
-            event=events.AllocationRequired(**payload.dict()), uow=uow
-        )
-        batch_ref = results.pop(0)
+        if _SETTINGS.messagebus.group_commit:
+            batch_ref = await group_commit.get_group_committer().allocate(
+                event=_event, uow_factory=uow_factory
+            )
+        else:
+            results = await messagebus.handle(event=_event, uow=uow)
+            batch_ref = results.pop(0)
     except (aggregate.OutOfStockException, handlers.InvalidSkuException) as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except repositories.ConcurrencyConflictException as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
 
     return dto.OrderLineOutput(batch_ref=batch_ref)
+
+
+@app_router.post(
+    path="/allocate/bulk",
+    status_code=status.HTTP_201_CREATED,
+    response_model=dto.BulkAllocationOutput,
+)
+async def allocate_bulk(
+    payload: dto.BulkOrderLinesInput,
+    uow_factory: commons.DefaultUnitOfWorkFactory,
+) -> dto.BulkAllocationOutput:
+    results = await messagebus.handle_many(
+        event_list=[
+            events.AllocationRequired(**line.dict()) for line in payload.lines
+        ],
+        uow_factory=uow_factory,
+    )
+    return dto.BulkAllocationOutput(
+        results=[
+            _to_allocation_output(line=line, result=result)
+            for line, result in zip(payload.lines, results)
+        ]
+    )
+
+
+def _to_allocation_output(
+    line: dto.OrderLineInput, result: Any
+) -> dto.OrderLineAllocationOutput:
+    if isinstance(result, handlers.InvalidSkuException):
+        _status = dto.AllocationStatus.INVALID_SKU
+    elif isinstance(result, repositories.ConcurrencyConflictException):
+        _status = dto.AllocationStatus.CONFLICT
+    elif isinstance(result, BaseException):
+        raise result
+    elif result is None:
+        _status = dto.AllocationStatus.OUT_OF_STOCK
+    else:
+        _status = dto.AllocationStatus.ALLOCATED
+
+    return dto.OrderLineAllocationOutput(
+        order_id=line.order_id,
+        sku=line.sku,
+        batch_ref=result if _status is dto.AllocationStatus.ALLOCATED else None,
+        status=_status,
+    )
@@ -0,0 +1,93 @@
+import dataclasses
+from typing import Any, Dict, Iterable, List, Optional
+
+from fastapi import APIRouter, Request, Response, status
+
+from src.allocation.domain.service import scheduler, unit_of_work
+from src.allocation.lib import metrics
+
+app_router = APIRouter(tags=["Metrics"])
+
+# Keys exposed one by one, the series stay bounded whatever the catalogue size
+_BUSIEST_KEYS = 10
+
+
+@app_router.get(
+    path="/metrics",
+    status_code=status.HTTP_200_OK,
+    response_class=Response,
+)
+def get_metrics(request: Request) -> Response:
+    _state = request.app.state
+    return Response(
+        content=metrics.REGISTRY.render(
+            collectors=[
+                lambda: _keyed_statistics(
+                    "db_pool",
+                    _state_call(_state, "database", "pool_statistics") or {},
+                    label="engine",
+                ),
+                lambda: _statistics("product_cache", _cache_statistics()),
+                lambda: _statistics(
+                    "scheduler", scheduler.get_scheduler().statistics()
+                ),
+                lambda: _keyed_statistics(
+                    "scheduler_key",
+                    scheduler.get_scheduler().busiest_keys(limit=_BUSIEST_KEYS),
+                ),
+                lambda: _statistics(
+                    "notifier", _state_call(_state, "notifier", "statistics")
+                ),
+                lambda: _statistics(
+                    "outbox_relay",
+                    _state_call(_state, "outbox_relay", "statistics"),
+                ),
+            ]
+        ),
+        media_type=metrics.CONTENT_TYPE,
+    )
+
+
+def _state_call(state: Any, component: str, method: str) -> Optional[Any]:
+    """Statistics of a component the lifespan started, None when it didn't"""
+    _component = getattr(state, component, None)
+    return None if _component is None else getattr(_component, method)()
+
+
+def _cache_statistics() -> Optional[Any]:
+    _cache = unit_of_work.get_product_cache()
+    return None if _cache is None else _cache.statistics()
+
+
+def _statistics(component: str, snapshot: Optional[Any]) -> Iterable[metrics.Gauge]:
+    """One gauge per field of the statistics snapshot of a component"""
+    if snapshot is None:
+        return []
+    _gauges: List[metrics.Gauge] = []
+    for field in dataclasses.fields(snapshot):
+        _gauge = metrics.Gauge(
+            name=f"allocation_{component}_{field.name}",
+            documentation=f"{component} {field.name.replace('_', ' ')}",
+        )
+        _gauge.set(getattr(snapshot, field.name))
+        _gauges.append(_gauge)
+    return _gauges
+
+
+def _keyed_statistics(
+    component: str, snapshots: Dict[str, Any], label: str = "key"
+) -> Iterable[metrics.Gauge]:
+    """One gauge per field of the snapshots, with a series per key"""
+    if not snapshots:
+        return []
+    _gauges: List[metrics.Gauge] = []
+    for field in dataclasses.fields(next(iter(snapshots.values()))):
+        _gauge = metrics.Gauge(
+            name=f"allocation_{component}_{field.name}",
+            documentation=f"{component} {field.name.replace('_', ' ')}",
+            labelnames=(label,),
+        )
+        for key, snapshot in snapshots.items():
+            _gauge.set(getattr(snapshot, field.name), key)
+        _gauges.append(_gauge)
+    return _gauges
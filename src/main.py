@@ -1,7 +1,8 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from src.allocation.lib import config, settings
+from src.allocation.lib import config, middleware, profiling, settings
+from src.allocation.routers import allocations, metrics
 from src.allocation.routers.entrypoints import app_router
 
 _SETTINGS = settings.get_settings()
@@ -9,4 +10,13 @@ _SETTINGS = settings.get_settings()
 
 app = FastAPI(lifespan=config.lifespan, **_SETTINGS.project.dict())
 app.add_middleware(middleware_class=CORSMiddleware, **_SETTINGS.cors.dict())
+if _SETTINGS.profiling.enabled:
+    app.add_middleware(
+        middleware_class=middleware.ProfilingMiddleware,
+        profiler=profiling.RequestProfiler(profiling_settings=_SETTINGS.profiling),
+    )
+app.add_middleware(middleware_class=middleware.RequestContextMiddleware)
+app.add_middleware(middleware_class=middleware.MetricsMiddleware)
 app.include_router(app_router, prefix="/api")
+app.include_router(allocations.app_router, prefix="/api")
+app.include_router(metrics.app_router)
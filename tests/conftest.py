@@ -5,7 +5,13 @@ import httpx
 import pytest
 from sqlalchemy import create_engine
 from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import (
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import NullPool
 
 from src.allocation.adapters.orm import Base
 
@@ -38,6 +44,16 @@ def file_session_factory(
     yield sessionmaker(bind=file_db)
 
 
+@pytest.fixture
+def async_session_factory(
+    file_db: Engine,
+) -> Generator[async_sessionmaker[AsyncSession], None, None]:
+    engine = create_async_engine(
+        file_db.url.set(drivername="sqlite+aiosqlite"), poolclass=NullPool
+    )
+    yield async_sessionmaker(bind=engine, expire_on_commit=False)
+
+
 @pytest.fixture
 def session(in_memory_db: Engine) -> Generator[Session, None, None]:
     yield sessionmaker(bind=in_memory_db)()
@@ -48,7 +64,11 @@ def client(file_session_factory: sessionmaker[Session]) -> httpx.Client:
     from fastapi.testclient import TestClient
 
     from src.allocation.domain.service import unit_of_work
-    from src.allocation.lib.config import get_default_uow
+    from src.allocation.lib.config import (
+        get_default_uow,
+        get_default_uow_factory,
+        get_read_session_factory,
+    )
     from src.main import app
 
     def get_default_uow_override() -> unit_of_work.AbstractUnitOfWork:
@@ -57,5 +77,26 @@ def client(file_session_factory: sessionmaker[Session]) -> httpx.Client:
         )
 
     app.dependency_overrides[get_default_uow] = get_default_uow_override
+    app.dependency_overrides[get_default_uow_factory] = lambda: (
+        get_default_uow_override
+    )
+    app.dependency_overrides[get_read_session_factory] = lambda: (
+        file_session_factory
+    )
 
     return TestClient(app=app)
+
+
+@pytest.fixture
+def statement_tracker() -> Generator[None, None, None]:
+    """Returns the statements of each request on its Server-Timing header, so
+    tests can assert the query budget of an endpoint"""
+    from src.allocation.adapters import statement_tracking
+    from src.main import app
+
+    _tracker = statement_tracking.StatementTracker()
+    _tracker.install()
+    app.state.statement_tracker = _tracker
+    yield
+    del app.state.statement_tracker
+    _tracker.uninstall()
@@ -0,0 +1,7 @@
+import httpx
+
+
+def statements_run(response: httpx.Response) -> int:
+    """Statements the request ran, read from its Server-Timing header"""
+    _description = response.headers["Server-Timing"].split('desc="')[1]
+    return int(_description.split()[0])
@@ -0,0 +1,65 @@
+import asyncio
+from typing import List, Optional
+
+
+class LocalSmtpServer:
+    """Minimal SMTP server recording the messages of each session, standing in
+    for the mail server on the tests
+
+    Args:
+        rejected_sessions (int): First sessions answered with a 421 greeting
+    """
+
+    def __init__(self, rejected_sessions: int = 0) -> None:
+        self.rejected_sessions = rejected_sessions
+        self.sessions: List[List[str]] = []
+        self.port = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def __aenter__(self) -> "LocalSmtpServer":
+        self._server = await asyncio.start_server(self._session, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *args: object) -> None:
+        assert self._server is not None
+        self._server.close()
+        await self._server.wait_closed()
+
+    @property
+    def messages(self) -> List[str]:
+        return [message for session in self.sessions for message in session]
+
+    async def _session(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        if self.rejected_sessions:
+            self.rejected_sessions -= 1
+            await self._reply(writer, "421 Service not available")
+            writer.close()
+            return
+
+        _messages: List[str] = []
+        await self._reply(writer, "220 localhost ESMTP")
+        while line := (await reader.readline()).decode():
+            _command = line.strip().upper()
+            if _command.startswith(("EHLO", "HELO")):
+                await self._reply(writer, "250 localhost")
+            elif _command == "DATA":
+                await self._reply(writer, "354 End data with <CR><LF>.<CR><LF>")
+                _data: List[str] = []
+                while (_line := (await reader.readline()).decode()) != ".\r\n":
+                    _data.append(_line)
+                _messages.append("".join(_data))
+                await self._reply(writer, "250 OK")
+            elif _command == "QUIT":
+                await self._reply(writer, "221 Bye")
+                break
+            else:
+                await self._reply(writer, "250 OK")
+        self.sessions.append(_messages)
+        writer.close()
+
+    async def _reply(self, writer: asyncio.StreamWriter, reply: str) -> None:
+        writer.write(f"{reply}\r\n".encode())
+        await writer.drain()
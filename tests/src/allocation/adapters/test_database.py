@@ -0,0 +1,75 @@
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import exc as sa_exc
+
+from src.allocation.adapters import database
+from src.allocation.lib import settings
+
+
+def make_database(tmpdir: str, **pool_settings: object) -> database.Database:
+    return database.Database(
+        db_settings=settings._DatabaseSettings(  # pyright: ignore
+            isolation_level="SERIALIZABLE", **pool_settings
+        ),
+        url=f"sqlite:///{tmpdir}/pool.db",
+        async_url=f"sqlite+aiosqlite:///{tmpdir}/pool.db",
+    )
+
+
+@pytest.mark.asyncio
+async def test_warm_up_opens_the_pool_connections(tmpdir: str) -> None:
+    db = make_database(tmpdir, pool_size=3)
+    assert db.pool_statistics() == {}
+
+    await db.warm_up()
+
+    statistics = db.pool_statistics()["sync"]
+    assert (statistics.checked_in, statistics.checked_out) == (3, 0)
+    assert statistics.checkouts == 3
+
+
+def test_pool_statistics_report_overflow_and_timeouts(tmpdir: str) -> None:
+    db = make_database(tmpdir, pool_size=1, max_overflow=1, pool_timeout=0.05)
+    connections = [db.engine.connect(), db.engine.connect()]
+
+    with pytest.raises(sa_exc.TimeoutError):
+        db.engine.connect()
+
+    statistics = db.pool_statistics()["sync"]
+    assert (statistics.checked_out, statistics.overflow) == (2, 1)
+    assert (statistics.checkouts, statistics.timeouts) == (2, 1)
+    assert statistics.wait_time_max >= 0.05
+    for connection in connections:
+        connection.close()
+
+
+@pytest.mark.asyncio
+async def test_pool_statistics_report_both_engines_with_the_async_driver(
+    tmpdir: str,
+) -> None:
+    db = make_database(tmpdir, pool_size=2, use_async_driver=True)
+
+    await db.warm_up()
+    with db.read_engine.connect():
+        statistics = db.pool_statistics()
+    await db.dispose()
+
+    assert (statistics["async"].checked_in, statistics["async"].checkouts) == (2, 2)
+    assert (statistics["sync"].checked_out, statistics["sync"].checkouts) == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_lifespan_warms_up_and_disposes_the_database(
+    tmpdir: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    from src.allocation.lib import config
+
+    db = make_database(tmpdir, pool_size=2)
+    monkeypatch.setattr(database, "get_database", lambda: db)
+    app = FastAPI()
+
+    async with config.lifespan(app):
+        assert app.state.database is db
+        assert db.pool_statistics()["sync"].checked_in == 2
+
+    assert db.pool_statistics()["sync"].checked_in == 0
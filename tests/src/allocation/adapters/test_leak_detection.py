@@ -0,0 +1,100 @@
+import asyncio
+from typing import Generator
+
+import pytest
+import structlog
+from sqlalchemy import text
+from structlog.testing import CapturingLogger
+
+from src.allocation.adapters import leak_detection
+from src.allocation.domain.service import unit_of_work
+
+
+@pytest.fixture
+def logger(monkeypatch: pytest.MonkeyPatch) -> CapturingLogger:
+    _logger = CapturingLogger()
+    monkeypatch.setattr(leak_detection, "_LOGGER", _logger)
+    return _logger
+
+
+@pytest.fixture
+def detector() -> Generator[leak_detection.SessionLeakDetector, None, None]:
+    _detector = leak_detection.SessionLeakDetector(threshold=1.0)
+    _detector.install()
+    yield _detector
+    _detector.uninstall()
+
+
+def open_and_forget(session_factory: unit_of_work.SessionFactory) -> object:
+    session = session_factory()
+    session.execute(text("SELECT 1"))
+    return session
+
+
+def test_logs_sessions_alive_past_the_threshold_with_their_stack(
+    session_factory: unit_of_work.SessionFactory,
+    detector: leak_detection.SessionLeakDetector,
+    logger: CapturingLogger,
+) -> None:
+    session = open_and_forget(session_factory)
+    [open_session] = detector.open_sessions()
+
+    assert detector.sweep(now=open_session.opened_at + 0.5) == []
+    assert detector.sweep(now=open_session.opened_at + 2) == [open_session]
+    assert detector.sweep(now=open_session.opened_at + 3) == []
+
+    [call] = logger.calls
+    assert call.args == ("session_alive_past_threshold",)
+    assert "open_and_forget" in call.kwargs["stack"]
+    del session
+
+
+def test_stops_tracking_sessions_once_closed(
+    session_factory: unit_of_work.SessionFactory,
+    detector: leak_detection.SessionLeakDetector,
+) -> None:
+    session = session_factory()
+    session.execute(text("SELECT 1"))
+    session.commit()
+    session.execute(text("SELECT 1"))
+    session.close()
+
+    assert detector.open_sessions() == []
+
+
+def test_logs_sessions_left_open_by_a_request(
+    session_factory: unit_of_work.SessionFactory,
+    detector: leak_detection.SessionLeakDetector,
+    logger: CapturingLogger,
+) -> None:
+    with structlog.contextvars.bound_contextvars(request_id="request-1"):
+        session = open_and_forget(session_factory)
+
+    assert detector.check_request("request-2") == []
+    [leaked] = detector.check_request("request-1")
+
+    assert leaked.request_id == "request-1"
+    assert logger.calls[0].args == ("session_open_after_request",)
+    del session
+
+
+@pytest.mark.asyncio
+async def test_periodic_sweeps_log_the_leaks_of_an_idle_worker(
+    session_factory: unit_of_work.SessionFactory,
+    logger: CapturingLogger,
+) -> None:
+    detector = leak_detection.SessionLeakDetector(
+        threshold=0.01, sweep_interval=0.01
+    )
+    detector.install()
+    try:
+        session = open_and_forget(session_factory)
+        await detector.start()
+        await asyncio.sleep(0.1)
+        await detector.stop()
+    finally:
+        detector.uninstall()
+
+    [call] = logger.calls
+    assert call.args == ("session_alive_past_threshold",)
+    del session
@@ -0,0 +1,216 @@
+from typing import Any, Dict, Set, Tuple
+
+from sqlalchemy import (
+    Column,
+    Date,
+    ForeignKey,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    create_engine,
+    inspect,
+    text,
+)
+from sqlalchemy.engine import Engine
+
+from src.allocation.adapters import migrations, orm
+
+
+def create_legacy_schema(engine: Engine) -> None:
+    """Tables as created by the application before the migrations"""
+    metadata = MetaData()
+    Table(
+        "products",
+        metadata,
+        Column("sku", String(255), primary_key=True),
+        Column("version_number", Integer, server_default="0", nullable=False),
+    )
+    Table(
+        "batches",
+        metadata,
+        Column("id", String(255), primary_key=True),
+        Column("sku", String(255), ForeignKey("products.sku")),
+        Column("purchased_quantity", Integer, nullable=False),
+        Column("eta", Date, nullable=True),
+    )
+    Table(
+        "order_lines",
+        metadata,
+        Column("id", Integer, primary_key=True),
+        Column("sku", String(255)),
+        Column("qty", Integer, nullable=False),
+        Column("order_id", String(255)),
+    )
+    Table(
+        "allocations",
+        metadata,
+        Column("id", Integer, primary_key=True, autoincrement=True),
+        Column("orderline_id", Integer, ForeignKey("order_lines.id")),
+        Column("batch_id", Integer, ForeignKey("batches.id")),
+    )
+    metadata.create_all(engine)
+
+
+def schema_of(engine: Engine) -> Dict[str, Tuple[Set[str], Set[Any]]]:
+    inspector = inspect(engine)
+    return {
+        table: (
+            {column["name"] for column in inspector.get_columns(table)},
+            {
+                (index["name"], tuple(index["column_names"]), bool(index["unique"]))
+                for index in inspector.get_indexes(table)
+            },
+        )
+        for table in inspector.get_table_names()
+        if table != "schema_migrations"
+    }
+
+
+def test_upgrade_builds_the_schema_declared_by_the_orm() -> None:
+    migrated = create_engine("sqlite://")
+    declared = create_engine("sqlite://")
+    orm.Base.metadata.create_all(declared)
+
+    applied = migrations.upgrade(migrated)
+
+    assert [migration.version for migration in applied] == [1, 2, 3, 4]
+    assert schema_of(migrated) == schema_of(declared)
+    with migrated.connect() as connection:
+        assert migrations.current_version(connection) == migrations.LATEST_VERSION
+
+
+def test_upgrade_only_applies_pending_migrations() -> None:
+    engine = create_engine("sqlite://")
+    migrations.upgrade(engine, target=1)
+
+    applied = migrations.upgrade(engine)
+
+    assert [migration.version for migration in applied] == [2, 3, 4]
+    assert migrations.upgrade(engine) == []
+
+
+def test_downgrade_reverts_migrations_newest_first() -> None:
+    engine = create_engine("sqlite://")
+    migrations.upgrade(engine)
+
+    reverted = migrations.downgrade(engine, target=1)
+
+    assert [migration.version for migration in reverted] == [4, 3, 2]
+    assert inspect(engine).get_indexes("batches") == []
+    migrations.downgrade(engine, target=0)
+    assert inspect(engine).get_table_names() == ["schema_migrations"]
+    with engine.connect() as connection:
+        assert migrations.current_version(connection) == 0
+
+
+def test_upgrade_adopts_tables_created_before_the_migrations() -> None:
+    engine = create_engine("sqlite://")
+    orm.Base.metadata.tables["products"].create(engine)
+
+    migrations.upgrade(engine, target=1)
+
+    assert set(inspect(engine).get_table_names()) == {
+        "products",
+        "batches",
+        "order_lines",
+        "allocations",
+        "schema_migrations",
+        "schema_adopted_tables",
+    }
+
+
+def test_upgrade_converts_the_legacy_batch_references() -> None:
+    engine = create_engine("sqlite://")
+    create_legacy_schema(engine)
+    with engine.begin() as connection:
+        connection.execute(text("INSERT INTO products VALUES ('S', 0)"))
+        connection.execute(text("INSERT INTO batches VALUES ('b1', 'S', 10, NULL)"))
+        connection.execute(text("INSERT INTO order_lines VALUES (1, 'S', 2, 'o1')"))
+        connection.execute(text("INSERT INTO allocations VALUES (1, 1, 'b1')"))
+
+    migrations.upgrade(engine)
+
+    batch_id = next(
+        column
+        for column in inspect(engine).get_columns("allocations")
+        if column["name"] == "batch_id"
+    )
+    assert isinstance(batch_id["type"], String)
+    with engine.connect() as connection:
+        assert connection.execute(
+            text("SELECT orderline_id, batch_id FROM allocations")
+        ).all() == [(1, "b1")]
+
+
+def test_downgrade_keeps_the_adopted_tables_and_their_data() -> None:
+    engine = create_engine("sqlite://")
+    create_legacy_schema(engine)
+    with engine.begin() as connection:
+        connection.execute(text("INSERT INTO products VALUES ('S', 0)"))
+
+    migrations.upgrade(engine)
+    migrations.downgrade(engine, target=0)
+
+    assert set(inspect(engine).get_table_names()) == {
+        "products",
+        "batches",
+        "order_lines",
+        "allocations",
+        "schema_migrations",
+    }
+    with engine.connect() as connection:
+        assert connection.scalar(text("SELECT count(*) FROM products")) == 1
+
+
+def test_upgrade_merges_the_duplicate_order_lines() -> None:
+    engine = create_engine("sqlite://")
+    migrations.upgrade(engine, target=1)
+    with engine.begin() as connection:
+        connection.execute(text("INSERT INTO products VALUES ('S', 0)"))
+        connection.execute(text("INSERT INTO batches VALUES ('b1', 'S', 10, NULL)"))
+        connection.execute(text("INSERT INTO batches VALUES ('b2', 'S', 10, NULL)"))
+        connection.execute(
+            text(
+                "INSERT INTO order_lines VALUES "
+                "(1, 'S', 2, 'o1'), (2, 'S', 2, 'o1'), (3, 'S', 2, 'o1'), "
+                "(4, 'S', 1, 'o2')"
+            )
+        )
+        connection.execute(
+            text(
+                "INSERT INTO allocations VALUES "
+                "(1, 2, 'b1'), (2, 3, 'b2'), (3, 1, 'b1'), (4, 4, 'b2')"
+            )
+        )
+
+    migrations.upgrade(engine)
+
+    with engine.connect() as connection:
+        assert connection.execute(
+            text("SELECT id, order_id FROM order_lines ORDER BY id")
+        ).all() == [(1, "o1"), (4, "o2")]
+        assert connection.execute(
+            text("SELECT orderline_id, batch_id FROM allocations ORDER BY id")
+        ).all() == [(1, "b1"), (4, "b2")]
+
+
+def test_upgrade_backfills_the_allocations_read_model() -> None:
+    engine = create_engine("sqlite://")
+    migrations.upgrade(engine, target=2)
+    with engine.begin() as connection:
+        connection.execute(text("INSERT INTO products VALUES ('S', 0)"))
+        connection.execute(text("INSERT INTO batches VALUES ('b1', 'S', 10, NULL)"))
+        connection.execute(
+            text(
+                "INSERT INTO order_lines VALUES (1, 'S', 2, 'o1'), (2, 'S', 1, 'o2')"
+            )
+        )
+        connection.execute(text("INSERT INTO allocations VALUES (1, 1, 'b1')"))
+
+    migrations.upgrade(engine)
+
+    with engine.connect() as connection:
+        assert connection.execute(
+            text("SELECT order_id, sku, batch_ref FROM allocations_view")
+        ).all() == [("o1", "S", "b1")]
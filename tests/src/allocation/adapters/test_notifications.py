@@ -0,0 +1,145 @@
+from typing import Any, List, Sequence
+
+import pytest
+
+from src.allocation.adapters import email, notifications
+from src.allocation.lib import settings
+from tests.smtp_server import LocalSmtpServer
+
+
+def make_notifier(port: int, **overrides: Any) -> notifications.Notifier:
+    _settings = settings._NotificationSettings(  # pyright: ignore
+        smtp_host="127.0.0.1",
+        smtp_port=port,
+        retry_backoff_base=0.01,
+        **overrides,
+    )
+    return notifications.Notifier(
+        mailer=email.SmtpMailer(
+            host="127.0.0.1", port=port, sender=_settings.sender, timeout=5
+        ),
+        notification_settings=_settings,
+    )
+
+
+def out_of_stock(sku: str) -> email.Message:
+    return email.Message(to="stock@made.com", subject=f"Out of stock for {sku}")
+
+
+@pytest.mark.asyncio
+async def test_queued_messages_share_a_single_smtp_session() -> None:
+    async with LocalSmtpServer() as server:
+        notifier = make_notifier(server.port, workers=1)
+        for sku in ("LAMP-1", "LAMP-2", "LAMP-3"):
+            assert notifier.publish(out_of_stock(sku))
+
+        await notifier.start()
+        await notifier.stop()
+
+    assert len(server.sessions) == 1
+    assert len(server.messages) == 3
+    assert "Subject: Out of stock for LAMP-2" in server.messages[1]
+    assert notifier.statistics().sent == 3
+
+
+@pytest.mark.asyncio
+async def test_failed_sessions_are_retried() -> None:
+    async with LocalSmtpServer(rejected_sessions=2) as server:
+        notifier = make_notifier(server.port)
+        notifier.publish(out_of_stock("LAMP-1"))
+
+        await notifier.start()
+        await notifier.stop()
+
+    assert len(server.messages) == 1
+    assert notifier.statistics().sent == 1
+    assert notifier.statistics().failed == 0
+
+
+@pytest.mark.asyncio
+async def test_messages_are_given_up_after_the_last_retry() -> None:
+    async with LocalSmtpServer(rejected_sessions=3) as server:
+        notifier = make_notifier(server.port, retries=2)
+        notifier.publish(out_of_stock("LAMP-1"))
+
+        await notifier.start()
+        await notifier.stop()
+
+    assert server.messages == []
+    assert notifier.statistics().failed == 1
+
+
+@pytest.mark.asyncio
+async def test_invalid_headers_fail_the_delivery() -> None:
+    async with LocalSmtpServer() as server:
+        notifier = make_notifier(server.port, retries=0)
+        notifier.publish(out_of_stock("LAMP-1\nBcc: someone@example.com"))
+
+        await notifier.start()
+        await notifier.stop()
+
+    assert server.sessions == []
+    assert notifier.statistics().failed == 1
+
+
+@pytest.mark.asyncio
+async def test_workers_survive_unexpected_mailer_errors() -> None:
+    class FlakyMailer(email.AbstractMailer):
+        def __init__(self) -> None:
+            self.delivered: List[email.Message] = []
+
+        async def send(self, messages: Sequence[email.Message]) -> None:
+            if any("BROKEN" in message.subject for message in messages):
+                raise ValueError("Unexpected mailer error")
+            self.delivered.extend(messages)
+
+    mailer = FlakyMailer()
+    notifier = notifications.Notifier(
+        mailer=mailer,
+        notification_settings=settings._NotificationSettings(  # pyright: ignore
+            workers=1, batch_size=1
+        ),
+    )
+    notifier.publish(out_of_stock("BROKEN"))
+    notifier.publish(out_of_stock("LAMP-1"))
+
+    await notifier.start()
+    await notifier.stop()
+
+    assert mailer.delivered == [out_of_stock("LAMP-1")]
+    assert notifier.statistics() == notifications.NotifierStatistics(
+        queued=0, sent=1, failed=1, dropped=0
+    )
+
+
+def test_messages_are_dropped_when_the_queue_is_full() -> None:
+    notifier = make_notifier(port=25, queue_size=1)
+
+    assert notifier.publish(out_of_stock("LAMP-1"))
+    assert not notifier.publish(out_of_stock("LAMP-2"))
+    assert notifier.statistics().dropped == 1
+    assert notifier.statistics().queued == 1
+
+
+@pytest.mark.asyncio
+async def test_out_of_stock_handler_does_not_wait_for_the_mail_server(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    from src.allocation.domain.model import events
+    from src.allocation.domain.service import handlers, unit_of_work
+
+    class UnreachableMailer(email.AbstractMailer):
+        async def send(self, messages: Sequence[email.Message]) -> None:
+            raise AssertionError("The handler must not deliver the message")
+
+    notifier = notifications.Notifier(
+        mailer=UnreachableMailer(),
+        notification_settings=settings._NotificationSettings(),  # pyright: ignore
+    )
+    monkeypatch.setattr(notifications, "get_notifier", lambda: notifier)
+
+    await handlers.send_out_of_stock_notification(
+        event=events.OutOfStock(sku="LAMP-1"), uow=unit_of_work.FakeUnitOfWork()
+    )
+
+    assert notifier.statistics().queued == 1
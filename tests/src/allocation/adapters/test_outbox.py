@@ -0,0 +1,204 @@
+import asyncio
+import datetime
+import json
+from typing import List, Sequence
+
+import pytest
+from sqlalchemy import exc, func, select
+from sqlalchemy.engine import Engine
+
+from src.allocation.adapters import orm, outbox
+from src.allocation.domain.model import aggregate, events
+from src.allocation.domain.service import unit_of_work
+from src.allocation.lib import settings
+
+
+class RecordingSink(outbox.AbstractEventSink):
+    def __init__(self, failures: int = 0) -> None:
+        self.failures = failures
+        self.records: List[outbox.OutboxRecord] = []
+
+    async def publish(self, records: Sequence[outbox.OutboxRecord]) -> None:
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("Broker unavailable")
+        self.records.extend(records)
+
+
+def make_relay(
+    engine: Engine,
+    sink: outbox.AbstractEventSink,
+    now: List[datetime.datetime],
+    batch_size: int = 100,
+    poll_interval: float = 1.0,
+) -> outbox.OutboxRelay:
+    return outbox.OutboxRelay(
+        engine=engine,
+        sink=sink,
+        outbox_settings=settings._OutboxSettings(  # pyright: ignore
+            relay_batch_size=batch_size,
+            relay_lease=30,
+            relay_poll_interval=poll_interval,
+        ),
+        clock=lambda: now[0],
+    )
+
+
+def outbox_size(engine: Engine) -> int:
+    with engine.connect() as connection:
+        return (
+            connection.scalar(select(func.count()).select_from(orm.outbox_table))
+            or 0
+        )
+
+
+async def allocate_orders(engine: Engine, *order_ids: str) -> None:
+    from sqlalchemy.orm import sessionmaker
+
+    uow = unit_of_work.SqlAlchemyUnitOfWork(
+        session_factory=sessionmaker(bind=engine)
+    )
+    async with uow:
+        product = aggregate.Product(
+            sku="LOUD-LAMP",
+            batches=[
+                aggregate.Batch(
+                    id="batch1", sku="LOUD-LAMP", purchased_quantity=10, eta=None
+                )
+            ],
+        )
+        for order_id in order_ids:
+            product.allocate(
+                aggregate.OrderLine(order_id=order_id, sku="LOUD-LAMP", qty=1)
+            )
+        await uow.products.add(product)
+        await uow.commit()
+
+
+@pytest.mark.asyncio
+async def test_events_are_committed_with_the_aggregate(in_memory_db: Engine) -> None:
+    await allocate_orders(in_memory_db, "order1", "order2")
+
+    with in_memory_db.connect() as connection:
+        rows = connection.execute(
+            select(orm.outbox_table.c.event_type, orm.outbox_table.c.payload)
+        ).all()
+    assert [event_type for event_type, _ in rows] == ["Allocated", "Allocated"]
+    assert json.loads(rows[1][1]) == {
+        "order_id": "order2",
+        "sku": "LOUD-LAMP",
+        "qty": 1,
+        "batch_ref": "batch1",
+    }
+
+
+@pytest.mark.asyncio
+async def test_events_are_rolled_back_with_the_aggregate(
+    in_memory_db: Engine,
+) -> None:
+    from sqlalchemy.orm import sessionmaker
+
+    uow = unit_of_work.SqlAlchemyUnitOfWork(
+        session_factory=sessionmaker(bind=in_memory_db)
+    )
+    async with uow:
+        product = aggregate.Product(sku="LOUD-LAMP")
+        product.events.append(events.OutOfStock(sku="LOUD-LAMP"))
+        await uow.products.add(product)
+
+    assert outbox_size(in_memory_db) == 0
+
+
+@pytest.mark.asyncio
+async def test_relay_publishes_in_batches_and_deletes(file_db: Engine) -> None:
+    await allocate_orders(file_db, "order1", "order2", "order3")
+    now = [datetime.datetime.utcnow() + datetime.timedelta(seconds=2)]
+    sink = RecordingSink()
+    relay = make_relay(file_db, sink, now, batch_size=2)
+
+    assert await relay.relay_once() == 2
+    assert await relay.relay_once() == 1
+    assert await relay.relay_once() == 0
+
+    assert [json.loads(r.payload)["order_id"] for r in sink.records] == [
+        "order1",
+        "order2",
+        "order3",
+    ]
+    assert outbox_size(file_db) == 0
+    statistics = relay.statistics()
+    assert (statistics.published, statistics.batches) == (3, 2)
+    assert statistics.lag_max >= 2
+
+
+@pytest.mark.asyncio
+async def test_relay_keeps_running_after_a_database_error(
+    file_db: Engine, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    await allocate_orders(file_db, "order1")
+    now = [datetime.datetime.utcnow()]
+    sink = RecordingSink()
+    relay = make_relay(file_db, sink, now, poll_interval=0.01)
+    claim = relay._claim  # pyright: ignore[reportPrivateUsage]
+    attempts: List[str] = []
+
+    def failing_once(claim_id: str) -> List[outbox.OutboxRecord]:
+        attempts.append(claim_id)
+        if len(attempts) == 1:
+            raise exc.OperationalError("SELECT", {}, Exception("Database gone"))
+        return claim(claim_id)
+
+    monkeypatch.setattr(relay, "_claim", failing_once)
+
+    await relay.start()
+    for _ in range(100):
+        if sink.records:
+            break
+        await asyncio.sleep(0.01)
+    await relay.stop()
+
+    assert len(attempts) >= 2
+    assert [json.loads(r.payload)["order_id"] for r in sink.records] == ["order1"]
+    assert relay.statistics().failures == 1
+
+
+@pytest.mark.asyncio
+async def test_claimed_events_are_retried_once_the_lease_expires(
+    file_db: Engine,
+) -> None:
+    await allocate_orders(file_db, "order1")
+    now = [datetime.datetime.utcnow()]
+    failing_sink, sink = RecordingSink(failures=1), RecordingSink()
+    failing = make_relay(file_db, failing_sink, now)
+    other = make_relay(file_db, sink, now)
+
+    assert await failing.relay_once() == 0
+    assert await other.relay_once() == 0
+
+    now[0] += datetime.timedelta(seconds=31)
+    assert await other.relay_once() == 1
+    assert failing.statistics().failures == 1
+    assert [r.event_type for r in sink.records] == ["Allocated"]
+    assert outbox_size(file_db) == 0
+
+
+@pytest.mark.asyncio
+async def test_lifespan_warns_when_no_relay_drains_the_outbox(
+    tmpdir: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    from fastapi import FastAPI
+    from structlog.testing import CapturingLogger
+
+    from src.allocation.adapters import database
+    from src.allocation.lib import config
+    from tests.src.allocation.adapters.test_database import make_database
+
+    logger = CapturingLogger()
+    monkeypatch.setattr(config, "_LOGGER", logger)
+    monkeypatch.setattr(config._SETTINGS.outbox, "relay_enabled", False)
+    monkeypatch.setattr(database, "get_database", lambda: make_database(tmpdir))
+
+    async with config.lifespan(FastAPI()):
+        pass
+
+    assert [call.args for call in logger.calls] == [("outbox_without_relay",)]
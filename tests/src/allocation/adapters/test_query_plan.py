@@ -0,0 +1,105 @@
+from typing import Any, List, Tuple
+
+import pytest
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker
+
+from src.allocation import repositories
+from src.allocation.adapters import migrations, orm, query_plan
+from src.allocation.domain.model import aggregate
+
+
+async def record_repository_reads(engine: Engine) -> List[Tuple[str, Any]]:
+    session_factory = sessionmaker(bind=engine)
+    product = aggregate.Product(
+        sku="FAST-LAMP",
+        batches=[
+            aggregate.Batch(
+                id="batch1", sku="FAST-LAMP", purchased_quantity=10, eta=None
+            )
+        ],
+    )
+    product.allocate(aggregate.OrderLine(order_id="o1", sku="FAST-LAMP", qty=1))
+    session = session_factory()
+    await repositories.SqlAlchemyRepository(session=session).add(product)
+    session.commit()
+
+    statements: List[Tuple[str, Any]] = []
+
+    def _record(*args: Any) -> None:
+        statements.append((args[2], args[3]))
+
+    event.listen(engine, "before_cursor_execute", _record)
+    repo = repositories.SqlAlchemyRepository(session=session_factory())
+    await repo.get(sku="FAST-LAMP")
+    await repo.get_by_batchref(ref="batch1")
+    await repo.get_allocated_batchrefs(sku="FAST-LAMP", order_ids=["o1"])
+    event.remove(engine, "before_cursor_execute", _record)
+    return statements
+
+
+@pytest.mark.asyncio
+async def test_repository_reads_use_indexes() -> None:
+    engine = create_engine("sqlite://")
+    migrations.upgrade(engine)
+
+    statements = await record_repository_reads(engine)
+
+    with engine.connect() as connection:
+        plans = [
+            query_plan.explain(connection, statement, parameters)
+            for statement, parameters in statements
+        ]
+    assert len(plans) == 7
+    assert all(plan.full_scans == set() for plan in plans), [
+        plan.steps for plan in plans
+    ]
+
+
+@pytest.mark.asyncio
+async def test_reports_full_scans_without_the_indexes() -> None:
+    engine = create_engine("sqlite://")
+    migrations.upgrade(engine, target=1)
+
+    statements = await record_repository_reads(engine)
+
+    with engine.connect() as connection:
+        full_scans = set().union(
+            *(
+                query_plan.explain(connection, statement, parameters).full_scans
+                for statement, parameters in statements
+            )
+        )
+    assert "batches" in full_scans
+
+
+def test_explains_compiled_statements() -> None:
+    engine = create_engine("sqlite://")
+    migrations.upgrade(engine)
+
+    with engine.connect() as connection:
+        plan = query_plan.explain(
+            connection,
+            select(orm.BatchMapper.id).where(orm.BatchMapper.sku == "FAST-LAMP"),
+        )
+
+    assert plan.indexes == {"ix_batches_sku"}
+    assert plan.full_scans == set()
+
+
+def test_allocations_view_is_read_through_its_primary_key() -> None:
+    engine = create_engine("sqlite://")
+    migrations.upgrade(engine)
+    _view = orm.allocations_view_table
+
+    with engine.connect() as connection:
+        plan = query_plan.explain(
+            connection,
+            select(_view.c.sku, _view.c.batch_ref)
+            .where(_view.c.order_id == "o1")
+            .order_by(_view.c.sku),
+        )
+
+    assert plan.full_scans == set()
+    assert plan.indexes
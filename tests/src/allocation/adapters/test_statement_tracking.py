@@ -0,0 +1,102 @@
+from typing import Generator
+
+import pytest
+from sqlalchemy import exc, select, text
+from structlog.testing import CapturingLogger
+
+from src.allocation.adapters import orm, statement_tracking
+from src.allocation.domain.service import unit_of_work
+from tests.src.allocation.repositories.test_sqlalchemy_repository import (
+    add_product_with_batches,
+)
+
+
+@pytest.fixture
+def logger(monkeypatch: pytest.MonkeyPatch) -> CapturingLogger:
+    _logger = CapturingLogger()
+    monkeypatch.setattr(statement_tracking, "_LOGGER", _logger)
+    return _logger
+
+
+@pytest.fixture
+def tracker() -> Generator[statement_tracking.StatementTracker, None, None]:
+    _tracker = statement_tracking.StatementTracker(
+        n_plus_one_threshold=3, slow_statements=2
+    )
+    _tracker.install()
+    yield _tracker
+    _tracker.uninstall()
+
+
+def test_shapes_ignore_whitespace_and_in_list_lengths() -> None:
+    assert statement_tracking.statement_shape(
+        "SELECT id\n  FROM batches WHERE id IN (?, ?, ?)"
+    ) == statement_tracking.statement_shape("SELECT id FROM batches WHERE id IN (?)")
+    assert statement_tracking.statement_shape(
+        "SELECT id FROM batches WHERE id IN (%s, %s)"
+    ) == ("SELECT id FROM batches WHERE id IN (?)")
+
+
+def test_counts_and_times_the_statements_of_a_request(
+    session_factory: unit_of_work.SessionFactory,
+    tracker: statement_tracking.StatementTracker,
+) -> None:
+    with session_factory() as session:
+        session.execute(text("SELECT 1"))
+        with tracker.track() as statements:
+            for _ in range(3):
+                session.execute(text("SELECT 2"))
+        session.execute(text("SELECT 3"))
+
+    assert statements.count == 3
+    assert statements.duration > 0
+    assert [statement for _, statement in statements.slowest] == ["SELECT 2"] * 2
+
+
+@pytest.mark.asyncio
+async def test_warns_once_when_a_session_lazy_loads_in_a_loop(
+    session_factory: unit_of_work.SessionFactory,
+    tracker: statement_tracking.StatementTracker,
+    logger: CapturingLogger,
+) -> None:
+    with session_factory() as session:
+        await add_product_with_batches(session, sku="LAMP", batches_count=6)
+
+    with session_factory() as session:
+        for batch in session.scalars(select(orm.BatchMapper)):
+            assert len(batch._allocations) == 1  # pyright: ignore
+
+    [call] = logger.calls
+    assert call.args == ("n_plus_one_statements",)
+    assert "allocations" in call.kwargs["statement"]
+    assert call.kwargs["runs"] == 4
+    assert "test_warns_once_when_a_session_lazy_loads_in_a_loop" in (
+        call.kwargs["stack"]
+    )
+
+
+def test_counts_shapes_per_session(
+    session_factory: unit_of_work.SessionFactory,
+    tracker: statement_tracking.StatementTracker,
+    logger: CapturingLogger,
+) -> None:
+    for _ in range(2):
+        with session_factory() as session:
+            for _ in range(3):
+                session.execute(text("SELECT 1"))
+
+    assert logger.calls == []
+
+
+def test_failed_statements_leave_no_start_time_on_the_connection(
+    session_factory: unit_of_work.SessionFactory,
+    tracker: statement_tracking.StatementTracker,
+) -> None:
+    with session_factory() as session:
+        with pytest.raises(exc.OperationalError):
+            session.execute(text("SELECT * FROM missing_table"))
+        connection = session.connection()
+
+        started = statement_tracking._STARTED  # pyright: ignore[reportPrivateUsage]
+
+        assert connection.info.get(started) == []
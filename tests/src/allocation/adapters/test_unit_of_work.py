@@ -1,7 +1,8 @@
-from typing import Optional
+import asyncio
+from typing import List, Optional
 
 import pytest
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy.sql import text
 
 from src.allocation.domain.model import aggregate
@@ -31,6 +32,25 @@ def insert_batch(
     )
 
 
+def insert_allocation(
+    session: Session, ref: str, order_id: str, sku: str, qty: int
+) -> None:
+    [[order_line_id]] = session.execute(
+        statement=text(
+            "INSERT INTO order_lines (sku, qty, order_id)"
+            " VALUES (:sku, :qty, :order_id) RETURNING id",
+        ),
+        params=dict(sku=sku, qty=qty, order_id=order_id),
+    )
+    session.execute(
+        statement=text(
+            "INSERT INTO allocations (orderline_id, batch_id)"
+            " VALUES (:order_line_id, :ref)",
+        ),
+        params=dict(order_line_id=order_line_id, ref=ref),
+    )
+
+
 def get_allocated_batch_ref(session: Session, order_id: str, sku: str) -> str:
     [[order_line_id]] = session.execute(
         statement=text(
@@ -61,13 +81,13 @@ async def test_uow_can_retrieve_a_batch_and_allocate_to_it(
 
     uow = unit_of_work.SqlAlchemyUnitOfWork(session_factory=session_factory)
     async with uow:
-        product = uow.products.get(sku="HIPSTER-WORKBENCH")
+        product = await uow.products.get(sku="HIPSTER-WORKBENCH")
         if not product:
             raise aggregate.OutOfStockException()
         product.allocate(
             line=aggregate.OrderLine(order_id="o1", sku="HIPSTER-WORKBENCH", qty=10)
         )
-        uow.products.add(product)
+        await uow.products.add(product)
         await uow.commit()
 
     batch_ref = get_allocated_batch_ref(
@@ -76,6 +96,30 @@ async def test_uow_can_retrieve_a_batch_and_allocate_to_it(
     assert batch_ref == "batch1"
 
 
+@pytest.mark.asyncio
+async def test_uow_hydrates_batch_allocations(
+    session_factory: unit_of_work.SessionFactory,
+) -> None:
+    session = session_factory()
+    insert_batch(session=session, ref="batch1", sku="TIDY-SHELF", qty=100, eta=None)
+    insert_allocation(
+        session=session, ref="batch1", order_id="o1", sku="TIDY-SHELF", qty=30
+    )
+    insert_allocation(
+        session=session, ref="batch1", order_id="o2", sku="TIDY-SHELF", qty=20
+    )
+    session.commit()
+
+    uow = unit_of_work.SqlAlchemyUnitOfWork(session_factory=session_factory)
+    async with uow:
+        product = await uow.products.get(sku="TIDY-SHELF")
+        assert product is not None
+        [batch] = product.batches
+        assert len(batch.allocations) == 2
+        assert batch.allocated_quantity == 50
+        assert batch.available_quantity == 50
+
+
 @pytest.mark.asyncio
 async def test_rolls_back_uncommitted_work_by_default(
     session_factory: unit_of_work.SessionFactory,
@@ -113,3 +157,129 @@ async def test_rolls_back_on_error(
     new_session = session_factory()
     rows = list(new_session.execute(statement=text('SELECT * FROM "batches"')))
     assert rows == []
+
+
+@pytest.mark.asyncio
+async def test_closes_the_session_on_exit_and_on_error(
+    session_factory: unit_of_work.SessionFactory,
+) -> None:
+    closed: List[Session] = []
+
+    class TrackedSession(Session):
+        def close(self) -> None:
+            closed.append(self)
+            super().close()
+
+    uow = unit_of_work.SqlAlchemyUnitOfWork(
+        session_factory=sessionmaker(
+            bind=session_factory.kw["bind"], class_=TrackedSession
+        )
+    )
+
+    async with uow:
+        await uow.products.get(sku="SHY-LAMP")
+    assert closed == [uow.session]
+
+    with pytest.raises(ValueError):
+        async with uow:
+            raise ValueError
+    assert closed[1:] == [uow.session]
+
+
+@pytest.mark.asyncio
+async def test_async_uow_can_retrieve_a_batch_and_allocate_to_it(
+    async_session_factory: unit_of_work.AsyncSessionFactory,
+    file_session_factory: unit_of_work.SessionFactory,
+) -> None:
+    session = file_session_factory()
+    insert_batch(session=session, ref="batch1", sku="QUIET-LAMP", qty=100, eta=None)
+    insert_allocation(
+        session=session, ref="batch1", order_id="o1", sku="QUIET-LAMP", qty=30
+    )
+    session.commit()
+
+    uow = unit_of_work.AsyncSqlAlchemyUnitOfWork(
+        session_factory=async_session_factory
+    )
+    async with uow:
+        product = await uow.products.get(sku="QUIET-LAMP")
+        assert product is not None
+        assert product.batches[0].available_quantity == 70
+        product.allocate(
+            line=aggregate.OrderLine(order_id="o2", sku="QUIET-LAMP", qty=10)
+        )
+        await uow.products.add(product)
+        await uow.commit()
+
+    batch_ref = get_allocated_batch_ref(
+        session=session, order_id="o2", sku="QUIET-LAMP"
+    )
+    assert batch_ref == "batch1"
+
+
+@pytest.mark.asyncio
+async def test_async_uow_rolls_back_uncommitted_work_by_default(
+    async_session_factory: unit_of_work.AsyncSessionFactory,
+    file_session_factory: unit_of_work.SessionFactory,
+) -> None:
+    uow = unit_of_work.AsyncSqlAlchemyUnitOfWork(
+        session_factory=async_session_factory
+    )
+    async with uow:
+        await uow.session.execute(
+            statement=text("INSERT INTO products (sku) VALUES ('SOFT-RUG')")
+        )
+
+    new_session = file_session_factory()
+    rows = list(new_session.execute(statement=text('SELECT * FROM "products"')))
+    assert rows == []
+
+
+@pytest.mark.slow
+@pytest.mark.asyncio
+@pytest.mark.parametrize("serialize_by_sku", [True, False])
+async def test_concurrent_allocations_never_oversell(
+    async_session_factory: unit_of_work.AsyncSessionFactory,
+    file_session_factory: unit_of_work.SessionFactory,
+    monkeypatch: pytest.MonkeyPatch,
+    serialize_by_sku: bool,
+) -> None:
+    from src.allocation.domain.model import events
+    from src.allocation.domain.service import messagebus
+
+    monkeypatch.setattr(messagebus._SETTINGS.messagebus, "conflict_retries", 100)
+    # Without the per-sku queue the handlers race on the version check
+    monkeypatch.setattr(
+        messagebus._SETTINGS.messagebus, "serialize_by_sku", serialize_by_sku
+    )
+    retries: List[int] = []
+    backoff_delay = messagebus._backoff_delay  # pyright: ignore[reportPrivateUsage]
+
+    def counted_backoff_delay(attempt: int) -> float:
+        retries.append(attempt)
+        return backoff_delay(attempt=attempt)
+
+    monkeypatch.setattr(messagebus, "_backoff_delay", counted_backoff_delay)
+    session = file_session_factory()
+    insert_batch(session=session, ref="batch1", sku="BUSY-LAMP", qty=10, eta=None)
+    session.commit()
+    orders = 25
+
+    results = await asyncio.gather(
+        *(
+            messagebus.handle(
+                event=events.AllocationRequired(
+                    order_id=f"order{i}", sku="BUSY-LAMP", qty=1
+                ),
+                uow=unit_of_work.AsyncSqlAlchemyUnitOfWork(
+                    session_factory=async_session_factory
+                ),
+            )
+            for i in range(orders)
+        )
+    )
+
+    allocated = [result for result in results if result[0] == "batch1"]
+    rows = session.execute(text("SELECT COUNT(*) FROM allocations")).scalar_one()
+    assert len(allocated) == rows == 10
+    assert bool(retries) is not serialize_by_sku
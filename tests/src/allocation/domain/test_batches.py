@@ -76,3 +76,45 @@ def test_can_only_deallocate_allocated_lines() -> None:
     batch, unallocated_line = make_batch_and_line("DECORATIVE-TRINKET", 20, 2)
     batch.deallocate(unallocated_line)
     assert batch.available_quantity == 20
+
+
+def test_deallocate_one_releases_its_quantity() -> None:
+    batch, line = make_batch_and_line("SHINY-CANDLESTICK", 20, 2)
+    batch.allocate(line)
+    assert batch.deallocate_one() == line
+    assert batch.allocated_quantity == 0
+    assert batch.available_quantity == 20
+
+
+def test_tracks_allocations_made_since_last_persisted() -> None:
+    batch, line = make_batch_and_line("ELEGANT-LAMP", 20, 2)
+    batch.mark_persisted()
+
+    batch.allocate(line)
+
+    assert set(batch.added_allocations) == {line}
+    assert not batch.removed_allocations
+
+
+def test_deallocating_an_unpersisted_allocation_leaves_no_change() -> None:
+    batch, line = make_batch_and_line("ELEGANT-LAMP", 20, 2)
+    batch.mark_persisted()
+
+    batch.allocate(line)
+    batch.deallocate(line)
+
+    assert not batch.added_allocations
+    assert not batch.removed_allocations
+
+
+def test_tracks_deallocations_and_resizes_of_persisted_batches() -> None:
+    batch, line = make_batch_and_line("ELEGANT-LAMP", 20, 2)
+    batch.allocate(line)
+    batch.mark_persisted()
+
+    batch.purchased_quantity = 1
+    batch.deallocate_excess()
+
+    assert batch.is_resized
+    assert set(batch.removed_allocations) == {line}
+    assert not batch.added_allocations
@@ -0,0 +1,117 @@
+from typing import List
+
+import pytest
+
+from src.allocation.domain.model import aggregate
+from src.allocation.domain.model.deallocation import (
+    DeallocationPolicy,
+    plan_deallocation,
+)
+
+
+def make_lines(*quantities: int) -> List[aggregate.OrderLine]:
+    return [
+        aggregate.OrderLine(order_id=f"order{i}", sku="WOBBLY-STOOL", qty=qty)
+        for i, qty in enumerate(quantities, start=1)
+    ]
+
+
+def quantities(lines: List[aggregate.OrderLine]) -> List[int]:
+    return [line.qty for line in lines]
+
+
+@pytest.mark.parametrize("policy", list(DeallocationPolicy))
+def test_nothing_is_released_without_shortfall(policy: DeallocationPolicy) -> None:
+    assert plan_deallocation(make_lines(5, 5), shortfall=0, policy=policy) == []
+
+
+@pytest.mark.parametrize("policy", list(DeallocationPolicy))
+def test_releases_at_least_the_shortfall(policy: DeallocationPolicy) -> None:
+    lines = make_lines(3, 8, 1, 4, 6, 2)
+    released = plan_deallocation(lines, shortfall=11, policy=policy)
+
+    assert sum(quantities(released)) >= 11
+    assert len(set(released)) == len(released)
+
+
+def test_fewest_lines_prefers_one_large_line_over_many_small_ones() -> None:
+    lines = make_lines(1, 1, 1, 1, 10, 1)
+    released = plan_deallocation(
+        lines, shortfall=4, policy=DeallocationPolicy.FEWEST_LINES
+    )
+    assert quantities(released) == [10]
+
+
+def test_fewest_lines_closes_the_gap_with_the_smallest_covering_line() -> None:
+    lines = make_lines(20, 9, 4, 7)
+    released = plan_deallocation(
+        lines, shortfall=25, policy=DeallocationPolicy.FEWEST_LINES
+    )
+    assert quantities(released) == [20, 7]
+
+
+def test_newest_first_releases_the_latest_allocations() -> None:
+    lines = make_lines(5, 5, 5, 5)
+    released = plan_deallocation(
+        lines, shortfall=7, policy=DeallocationPolicy.NEWEST_FIRST
+    )
+    assert released == [lines[3], lines[2]]
+
+
+def test_smallest_overshoot_fits_lines_to_the_shortfall() -> None:
+    lines = make_lines(9, 4, 3, 2)
+    released = plan_deallocation(
+        lines, shortfall=7, policy=DeallocationPolicy.SMALLEST_OVERSHOOT
+    )
+    assert sum(quantities(released)) == 7
+
+
+def test_change_batch_quantity_deallocates_just_enough_in_one_go() -> None:
+    from src.allocation.domain.model import events
+
+    batch = aggregate.Batch(
+        id="batch1", sku="WOBBLY-STOOL", purchased_quantity=100, eta=None
+    )
+    product = aggregate.Product(sku="WOBBLY-STOOL", batches=[batch])
+    for line in make_lines(10, 10, 10, 10, 40):
+        product.allocate(line)
+    product.events.clear()
+
+    product.change_batch_quantity(
+        ref="batch1", qty=50, policy=DeallocationPolicy.FEWEST_LINES
+    )
+
+    assert batch.available_quantity == 10
+    assert product.events == [
+        events.Deallocated(
+            order_id="order5", sku="WOBBLY-STOOL", qty=40, batch_ref="batch1"
+        ),
+        events.AllocationRequired(order_id="order5", sku="WOBBLY-STOOL", qty=40),
+    ]
+
+
+def test_change_batch_quantity_raises_deallocations_before_reallocations() -> None:
+    from src.allocation.domain.model import events
+
+    batch = aggregate.Batch(
+        id="batch1", sku="WOBBLY-STOOL", purchased_quantity=50, eta=None
+    )
+    product = aggregate.Product(sku="WOBBLY-STOOL", batches=[batch])
+    for line in make_lines(10, 10, 10, 10, 10):
+        product.allocate(line)
+    product.events.clear()
+
+    product.change_batch_quantity(
+        ref="batch1", qty=30, policy=DeallocationPolicy.NEWEST_FIRST
+    )
+
+    assert product.events == [
+        events.Deallocated(
+            order_id="order5", sku="WOBBLY-STOOL", qty=10, batch_ref="batch1"
+        ),
+        events.Deallocated(
+            order_id="order4", sku="WOBBLY-STOOL", qty=10, batch_ref="batch1"
+        ),
+        events.AllocationRequired(order_id="order5", sku="WOBBLY-STOOL", qty=10),
+        events.AllocationRequired(order_id="order4", sku="WOBBLY-STOOL", qty=10),
+    ]
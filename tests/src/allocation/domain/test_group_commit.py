@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from src.allocation.domain.model import aggregate, events
+from src.allocation.domain.service import group_commit, handlers, unit_of_work
+
+
+class CountingUnitOfWork(unit_of_work.FakeUnitOfWork):
+    commits = 0
+
+    async def _commit(self) -> None:
+        self.commits += 1
+        await super()._commit()
+
+
+async def make_uow(sku: str, qty: int) -> CountingUnitOfWork:
+    uow = CountingUnitOfWork()
+    await uow.products.add(
+        aggregate.Product(
+            sku=sku,
+            batches=[
+                aggregate.Batch(
+                    id="batch1", sku=sku, purchased_quantity=qty, eta=None
+                )
+            ],
+        )
+    )
+    return uow
+
+
+def order(order_id: str, sku: str = "BUSY-LAMP") -> events.AllocationRequired:
+    return events.AllocationRequired(order_id=order_id, sku=sku, qty=1)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_allocations_share_a_single_commit() -> None:
+    uow = await make_uow("BUSY-LAMP", qty=3)
+    subject = group_commit.GroupCommitter(window=0.01, max_size=100)
+
+    results = await asyncio.gather(
+        *(
+            subject.allocate(event=order(f"order{i}"), uow_factory=lambda: uow)
+            for i in range(4)
+        )
+    )
+
+    assert results == ["batch1", "batch1", "batch1", None]
+    assert uow.commits == 1
+
+
+@pytest.mark.asyncio
+async def test_full_groups_are_flushed_before_the_window() -> None:
+    uow = await make_uow("BUSY-LAMP", qty=10)
+    subject = group_commit.GroupCommitter(window=60, max_size=2)
+
+    results = await asyncio.wait_for(
+        asyncio.gather(
+            *(
+                subject.allocate(event=order(f"order{i}"), uow_factory=lambda: uow)
+                for i in range(2)
+            )
+        ),
+        timeout=1,
+    )
+
+    assert results == ["batch1", "batch1"]
+
+
+@pytest.mark.asyncio
+async def test_every_request_of_the_group_gets_the_error() -> None:
+    uow = CountingUnitOfWork()
+    subject = group_commit.GroupCommitter(window=0.01, max_size=100)
+
+    results = await asyncio.gather(
+        *(
+            subject.allocate(
+                event=order(f"order{i}", sku="MISSING-LAMP"), uow_factory=lambda: uow
+            )
+            for i in range(2)
+        ),
+        return_exceptions=True,
+    )
+
+    assert all(isinstance(r, handlers.InvalidSkuException) for r in results)
@@ -1,3 +1,5 @@
+from typing import List
+
 import pytest
 
 
@@ -16,7 +18,7 @@ class TestAddBatch:
                 ref="b1", sku="CRUNCHY-ARMCHAIR", qty=100, eta=None
             ),
         )
-        assert uow.products.get("CRUNCHY-ARMCHAIR") is not None
+        assert await uow.products.get("CRUNCHY-ARMCHAIR") is not None
         assert uow.committed
 
     @pytest.mark.asyncio
@@ -35,7 +37,7 @@ class TestAddBatch:
             uow=uow,
             event=events.BatchCreated(ref="b2", sku="GARISH-RUG", qty=99, eta=None),
         )
-        _product = uow.products.get("GARISH-RUG")
+        _product = await uow.products.get("GARISH-RUG")
         assert _product is not None
         assert "b2" in [b.id for b in _product.batches]
 
@@ -114,6 +116,118 @@ class TestAllocate:
 
         assert uow.committed
 
+    @pytest.mark.asyncio
+    async def test_should_return_the_existing_batch_when_order_is_repeated(
+        self,
+    ) -> None:
+        from src.allocation.domain.model import events
+        from src.allocation.domain.service import messagebus as subject
+        from src.allocation.domain.service import unit_of_work
+
+        uow = unit_of_work.FakeUnitOfWork()
+        await subject.handle(
+            uow=uow,
+            event=events.BatchCreated(
+                ref="batch1", sku="TWIN-LAMP", qty=10, eta=None
+            ),
+        )
+        event = events.AllocationRequired(order_id="o1", sku="TWIN-LAMP", qty=4)
+
+        [first_ref] = await subject.handle(uow=uow, event=event)
+        uow.committed = False
+        [second_ref] = await subject.handle(uow=uow, event=event)
+
+        product = await uow.products.get("TWIN-LAMP")
+        assert product is not None
+        assert first_ref == second_ref == "batch1"
+        assert product.batches[0].allocated_quantity == 4
+        assert not uow.committed
+
+    def test_should_reject_allocations_of_non_positive_quantities(self) -> None:
+        import pydantic
+
+        from src.allocation.domain.model import events
+
+        for qty in (0, -1):
+            with pytest.raises(pydantic.ValidationError):
+                events.AllocationRequired(
+                    sku="COMPLICATED-LAMP", order_id="o1", qty=qty
+                )
+
+
+class TestAllocateMany:
+    @pytest.mark.asyncio
+    async def test_should_allocate_lines_of_each_sku_on_a_single_commit(
+        self,
+    ) -> None:
+        from src.allocation.domain.model import events
+        from src.allocation.domain.service import handlers
+        from src.allocation.domain.service import messagebus as subject
+        from src.allocation.domain.service import unit_of_work
+
+        uow = unit_of_work.FakeUnitOfWork()
+        for event in [
+            events.BatchCreated(ref="batch1", sku="PLAIN-VASE", qty=10, eta=None),
+            events.BatchCreated(ref="batch2", sku="ODD-VASE", qty=10, eta=None),
+        ]:
+            await subject.handle(uow=uow, event=event)
+
+        uows: list[unit_of_work.FakeUnitOfWork] = []
+
+        def uow_factory() -> unit_of_work.AbstractUnitOfWork:
+            _uow = unit_of_work.FakeUnitOfWork()
+            _uow.products = uow.products
+            uows.append(_uow)
+            return _uow
+
+        results = await subject.handle_many(
+            event_list=[
+                events.AllocationRequired(sku="PLAIN-VASE", order_id="o1", qty=4),
+                events.AllocationRequired(sku="ODD-VASE", order_id="o1", qty=4),
+                events.AllocationRequired(sku="PLAIN-VASE", order_id="o2", qty=4),
+                events.AllocationRequired(sku="PLAIN-VASE", order_id="o3", qty=4),
+                events.AllocationRequired(sku="MISSING-VASE", order_id="o1", qty=4),
+            ],
+            uow_factory=uow_factory,
+        )
+
+        assert results[:4] == ["batch1", "batch2", "batch1", None]
+        assert isinstance(results[4], handlers.InvalidSkuException)
+        assert len(uows) == 3
+        assert all(_uow.committed for _uow in uows[:2])
+
+    @pytest.mark.asyncio
+    async def test_should_allocate_repeated_orders_once(self) -> None:
+        from src.allocation.domain.model import events
+        from src.allocation.domain.service import messagebus as subject
+        from src.allocation.domain.service import unit_of_work
+
+        uow = unit_of_work.FakeUnitOfWork()
+        await subject.handle(
+            uow=uow,
+            event=events.BatchCreated(
+                ref="batch1", sku="PLAIN-VASE", qty=10, eta=None
+            ),
+        )
+        await subject.handle(
+            uow=uow,
+            event=events.AllocationRequired(sku="PLAIN-VASE", order_id="o1", qty=4),
+        )
+
+        results = await subject.handle_many(
+            event_list=[
+                events.AllocationRequired(sku="PLAIN-VASE", order_id="o1", qty=4),
+                events.AllocationRequired(sku="PLAIN-VASE", order_id="o2", qty=4),
+                events.AllocationRequired(sku="PLAIN-VASE", order_id="o2", qty=4),
+            ],
+            uow_factory=lambda: uow,
+        )
+
+        product = await uow.products.get("PLAIN-VASE")
+        assert product is not None
+        assert results == ["batch1", "batch1", "batch1"]
+        assert product.batches[0].allocated_quantity == 8
+
 
 class TestChangeBatchQuantity:
     @pytest.mark.asyncio
@@ -132,7 +246,7 @@ class TestChangeBatchQuantity:
                 ref="batch1", sku="ADORABLE-SETTEE", qty=100, eta=None
             ),
         )
-        _product = uow.products.get(sku="ADORABLE-SETTEE")
+        _product = await uow.products.get(sku="ADORABLE-SETTEE")
         assert _product
         batch = _product.batches[0]
         assert batch.available_quantity == 100
@@ -175,3 +289,180 @@ class TestChangeBatchQuantity:
         assert isinstance(_published_event, events.AllocationRequired)
         assert _published_event.order_id in {"order1", "order2"}
         assert _published_event.sku == _process_sku
+
+
+class TestAllocationsView:
+    @pytest.mark.asyncio
+    async def test_should_publish_the_batch_when_order_is_allocated(self) -> None:
+        from src.allocation.domain.model import events
+        from src.allocation.domain.service import messagebus as subject
+        from src.allocation.domain.service import unit_of_work
+
+        uow = unit_of_work.FakeUnitOfWork()
+
+        await subject.handle(
+            uow=uow,
+            event=events.BatchCreated(
+                ref="batch1", sku="SHINY-MIRROR", qty=100, eta=None
+            ),
+        )
+        await subject.handle(
+            uow=uow,
+            event=events.AllocationRequired(
+                order_id="order1", sku="SHINY-MIRROR", qty=10
+            ),
+        )
+
+        assert uow.get_published_event_by_type(events.Allocated) == events.Allocated(
+            order_id="order1", sku="SHINY-MIRROR", qty=10, batch_ref="batch1"
+        )
+
+    @pytest.mark.asyncio
+    async def test_should_record_the_batch_of_each_order_line(self) -> None:
+        from src.allocation.domain.model import events
+        from src.allocation.domain.service import handlers as subject
+        from src.allocation.domain.service import unit_of_work
+
+        uow = unit_of_work.FakeUnitOfWork()
+
+        for sku in ("SHINY-MIRROR", "DULL-MIRROR"):
+            await subject.add_allocation_to_read_model(
+                event=events.Allocated(
+                    order_id="order1", sku=sku, qty=5, batch_ref="batch1"
+                ),
+                uow=uow,
+            )
+
+        assert uow.allocations_view.rows == {
+            ("order1", "SHINY-MIRROR"): "batch1",
+            ("order1", "DULL-MIRROR"): "batch1",
+        }
+        assert uow.committed
+
+    @pytest.mark.asyncio
+    async def test_should_keep_a_newer_allocation_when_removing_a_stale_one(
+        self,
+    ) -> None:
+        from src.allocation.domain.model import events
+        from src.allocation.domain.service import handlers as subject
+        from src.allocation.domain.service import unit_of_work
+
+        uow = unit_of_work.FakeUnitOfWork()
+
+        await subject.add_allocation_to_read_model(
+            event=events.Allocated(
+                order_id="order1", sku="LONELY-MIRROR", qty=5, batch_ref="batch2"
+            ),
+            uow=uow,
+        )
+        await subject.remove_allocation_from_read_model(
+            event=events.Deallocated(
+                order_id="order1", sku="LONELY-MIRROR", qty=5, batch_ref="batch1"
+            ),
+            uow=uow,
+        )
+
+        assert uow.allocations_view.rows == {("order1", "LONELY-MIRROR"): "batch2"}
+
+
+class TestSkuSerialization:
+    @pytest.mark.asyncio
+    async def test_should_queue_the_allocations_of_the_same_sku(self) -> None:
+        import asyncio
+
+        from src.allocation.domain.model import events
+        from src.allocation.domain.service import messagebus as subject
+        from src.allocation.domain.service import unit_of_work
+
+        running: List[int] = [0]
+        peak: List[int] = [0]
+
+        class SlowUnitOfWork(unit_of_work.FakeUnitOfWork):
+            async def _commit(self) -> None:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+                await asyncio.sleep(0.01)
+                running[0] -= 1
+                await super()._commit()
+
+        uow = SlowUnitOfWork()
+        await subject.handle(
+            uow=uow,
+            event=events.BatchCreated(
+                ref="batch1", sku="QUEUED-LAMP", qty=100, eta=None
+            ),
+        )
+
+        await asyncio.gather(
+            *(
+                subject.handle(
+                    uow=uow,
+                    event=events.AllocationRequired(
+                        order_id=f"order{i}", sku="QUEUED-LAMP", qty=1
+                    ),
+                )
+                for i in range(3)
+            )
+        )
+
+        assert peak[0] == 1
+
+
+class TestConflictRetry:
+    @pytest.mark.asyncio
+    async def test_should_retry_the_handler_when_the_commit_conflicts(
+        self,
+    ) -> None:
+        from src.allocation import repositories
+        from src.allocation.domain.model import events
+        from src.allocation.domain.service import messagebus as subject
+        from src.allocation.domain.service import unit_of_work
+
+        class ConflictingUnitOfWork(unit_of_work.FakeUnitOfWork):
+            conflicts = 2
+
+            async def _commit(self) -> None:
+                if self.conflicts:
+                    self.conflicts -= 1
+                    raise repositories.ConcurrencyConflictException
+                await super()._commit()
+
+        uow = ConflictingUnitOfWork()
+
+        await subject.handle(
+            uow=uow,
+            event=events.BatchCreated(
+                ref="batch1", sku="BUSY-LAMP", qty=10, eta=None
+            ),
+        )
+
+        assert uow.conflicts == 0
+        assert uow.committed
+
+    @pytest.mark.asyncio
+    async def test_should_raise_when_the_retry_budget_is_exhausted(
+        self, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        from src.allocation import repositories
+        from src.allocation.domain.model import events
+        from src.allocation.domain.service import messagebus as subject
+        from src.allocation.domain.service import unit_of_work
+
+        class ConflictingUnitOfWork(unit_of_work.FakeUnitOfWork):
+            attempts = 0
+
+            async def _commit(self) -> None:
+                self.attempts += 1
+                raise repositories.ConcurrencyConflictException
+
+        monkeypatch.setattr(subject._SETTINGS.messagebus, "conflict_retries", 2)
+        uow = ConflictingUnitOfWork()
+
+        with pytest.raises(repositories.ConcurrencyConflictException):
+            await subject.handle(
+                uow=uow,
+                event=events.BatchCreated(
+                    ref="batch1", sku="BUSY-LAMP", qty=10, eta=None
+                ),
+            )
+        assert uow.attempts == 3
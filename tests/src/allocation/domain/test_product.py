@@ -63,6 +63,40 @@ def test_prefers_earlier_batches() -> None:
     assert latest.available_quantity == 100
 
 
+def test_prefers_earlier_batches_added_after_creation() -> None:
+    product = aggregate.Product(
+        sku="DUSTY-LANTERN",
+        batches=[
+            aggregate.Batch(
+                id="slow-batch",
+                sku="DUSTY-LANTERN",
+                purchased_quantity=100,
+                eta=later,
+            )
+        ],
+    )
+    product.add_batch(
+        aggregate.Batch(
+            id="speedy-batch", sku="DUSTY-LANTERN", purchased_quantity=100, eta=today
+        )
+    )
+    product.add_batch(
+        aggregate.Batch(
+            id="in-stock-batch", sku="DUSTY-LANTERN", purchased_quantity=5, eta=None
+        )
+    )
+
+    first = product.allocate(
+        aggregate.OrderLine(order_id="order1", sku="DUSTY-LANTERN", qty=5)
+    )
+    second = product.allocate(
+        aggregate.OrderLine(order_id="order2", sku="DUSTY-LANTERN", qty=5)
+    )
+
+    assert first == "in-stock-batch"
+    assert second == "speedy-batch"
+
+
 def test_returns_allocated_batch_ref() -> None:
     in_stock_batch = aggregate.Batch(
         id="in-stock-batch-ref",
@@ -134,3 +168,48 @@ def test_increments_version_number() -> None:
     product.version_number = 7
     product.allocate(line)
     assert product.version_number == 8
+
+
+def test_allocate_many_records_a_single_out_of_stock_event() -> None:
+    from src.allocation.domain.model import events
+
+    batch = aggregate.Batch(
+        id="batch1", sku="SMALL-FORK", purchased_quantity=10, eta=today
+    )
+    product = aggregate.Product(sku="SMALL-FORK", batches=[batch])
+
+    allocations = product.allocate_many(
+        [
+            aggregate.OrderLine(order_id="order1", sku="SMALL-FORK", qty=8),
+            aggregate.OrderLine(order_id="order2", sku="SMALL-FORK", qty=5),
+            aggregate.OrderLine(order_id="order3", sku="SMALL-FORK", qty=2),
+            aggregate.OrderLine(order_id="order4", sku="SMALL-FORK", qty=5),
+        ]
+    )
+
+    assert allocations == ["batch1", None, "batch1", None]
+    assert [
+        event for event in product.events if isinstance(event, events.OutOfStock)
+    ] == [events.OutOfStock(sku="SMALL-FORK")]
+
+
+def test_pending_changes_of_a_loaded_product_cover_only_what_changed() -> None:
+    old_batch = aggregate.Batch(
+        id="old", sku="LAMP", purchased_quantity=10, eta=None
+    )
+    product = aggregate.Product(sku="LAMP", batches=[old_batch])
+    product.mark_persisted()
+    new_batch = aggregate.Batch(
+        id="new", sku="LAMP", purchased_quantity=10, eta=None
+    )
+    line = aggregate.OrderLine(order_id="order1", sku="LAMP", qty=2)
+
+    product.add_batch(new_batch)
+    product.allocate(line)
+    changes = product.pending_changes()
+
+    assert not changes.is_new
+    assert changes.new_batches == [new_batch]
+    assert changes.resized_batches == []
+    assert changes.added_allocations == [("old", line)]
+    assert changes.removed_allocations == []
@@ -0,0 +1,82 @@
+import asyncio
+from typing import List
+
+import pytest
+
+from src.allocation.domain.service import scheduler
+
+
+async def track_concurrency(
+    subject: scheduler.KeyedScheduler, key: str, running: List[int], peak: List[int]
+) -> None:
+    async with subject.serialize(key):
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+        await asyncio.sleep(0.01)
+        running[0] -= 1
+
+
+@pytest.mark.asyncio
+async def test_tasks_of_a_key_run_one_at_a_time() -> None:
+    subject = scheduler.KeyedScheduler()
+    running, peak = [0], [0]
+
+    await asyncio.gather(
+        *(track_concurrency(subject, "HOT-LAMP", running, peak) for _ in range(4))
+    )
+
+    statistics = subject.statistics()
+    assert peak[0] == 1
+    assert statistics.runs == 4
+    assert statistics.max_queue_depth == 4
+    assert statistics.queue_depth == 0
+    assert statistics.wait_time_max >= 0.02
+
+
+@pytest.mark.asyncio
+async def test_tasks_of_different_keys_run_concurrently() -> None:
+    subject = scheduler.KeyedScheduler()
+    running, peak = [0], [0]
+
+    await asyncio.gather(
+        *(track_concurrency(subject, f"LAMP-{i}", running, peak) for i in range(4))
+    )
+
+    assert peak[0] == 4
+    assert subject.statistics().max_queue_depth == 1
+    assert subject.statistics().runs == 4
+
+
+@pytest.mark.asyncio
+async def test_keys_release_their_lock_once_idle() -> None:
+    subject = scheduler.KeyedScheduler()
+
+    with pytest.raises(ValueError):
+        async with subject.serialize("HOT-LAMP"):
+            raise ValueError
+
+    assert subject._locks == {}  # pyright: ignore[reportPrivateUsage]
+    assert subject._counters == {}  # pyright: ignore[reportPrivateUsage]
+    assert subject.statistics().queue_depth == 0
+    assert subject.statistics().active_keys == 0
+    assert subject.statistics().runs == 1
+
+
+@pytest.mark.asyncio
+async def test_busiest_keys_report_the_active_queues() -> None:
+    subject = scheduler.KeyedScheduler()
+    running, peak = [0], [0]
+
+    tasks = [
+        asyncio.create_task(track_concurrency(subject, "HOT-LAMP", running, peak))
+        for _ in range(3)
+    ] + [asyncio.create_task(track_concurrency(subject, "COLD-LAMP", running, peak))]
+    await asyncio.sleep(0)
+
+    busiest = subject.busiest_keys(limit=1)
+    await asyncio.gather(*tasks)
+
+    assert list(busiest) == ["HOT-LAMP"]
+    assert busiest["HOT-LAMP"].queue_depth == 3
+    assert busiest["HOT-LAMP"].runs == 1
+    assert subject.busiest_keys(limit=10) == {}
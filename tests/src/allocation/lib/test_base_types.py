@@ -0,0 +1,57 @@
+from src.allocation.adapters import orm
+from src.allocation.domain.model import aggregate
+
+
+def test_metadata_is_computed_once_per_class() -> None:
+    metadata = aggregate.Product.__domain_metadata__
+
+    assert metadata.primary_key == "sku"
+    assert metadata.column_fields == ("version_number", "sku")
+    assert aggregate.Batch.__domain_metadata__.identity_fields == ("id",)
+
+
+def test_aggregates_are_identified_by_their_primary_key() -> None:
+    product = aggregate.Product(sku="CALM-SOFA")
+    same_product = aggregate.Product(sku="CALM-SOFA", version_number=3)
+
+    assert product == same_product
+    assert hash(product) == hash(same_product)
+    assert product != aggregate.Product(sku="LOUD-SOFA")
+
+
+def test_entities_are_identified_by_their_id() -> None:
+    batch = aggregate.Batch(
+        id="b1", sku="CALM-SOFA", purchased_quantity=10, eta=None
+    )
+    resized = aggregate.Batch(
+        id="b1", sku="CALM-SOFA", purchased_quantity=5, eta=None
+    )
+
+    assert batch == resized
+    assert hash(batch) == hash(resized)
+
+
+def test_value_objects_are_identified_by_all_their_fields() -> None:
+    line = aggregate.OrderLine(order_id="o1", sku="CALM-SOFA", qty=1)
+
+    assert line == aggregate.OrderLine(order_id="o1", sku="CALM-SOFA", qty=1)
+    assert line != aggregate.OrderLine(order_id="o1", sku="CALM-SOFA", qty=2)
+    assert (
+        len({line, aggregate.OrderLine(order_id="o1", sku="CALM-SOFA", qty=1)}) == 1
+    )
+
+
+def test_column_values_skip_nested_models() -> None:
+    product = aggregate.Product(sku="CALM-SOFA", version_number=2)
+
+    assert product.column_values() == {"version_number": 2, "sku": "CALM-SOFA"}
+
+
+def test_slotted_models_load_from_orm_without_an_instance_dict() -> None:
+    mapper = orm.OrderLineMapper(order_id="o1", sku="CALM-SOFA", qty=3)
+
+    line = aggregate.OrderLine.from_orm(mapper)
+
+    assert line == aggregate.OrderLine(order_id="o1", sku="CALM-SOFA", qty=3)
+    assert line.column_values() == {"sku": "CALM-SOFA", "order_id": "o1", "qty": 3}
+    assert not hasattr(line, "__dict__")
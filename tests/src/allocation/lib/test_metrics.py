@@ -0,0 +1,62 @@
+import pytest
+
+from src.allocation.lib import metrics
+
+
+def test_histogram_renders_cumulative_buckets() -> None:
+    registry = metrics.Registry()
+    histogram = registry.histogram(
+        "latency_seconds", "Latency", labelnames=("route",), buckets=(0.1, 1)
+    )
+
+    histogram.observe(0.05, "/a")
+    histogram.observe(0.1, "/a")
+    histogram.observe(0.5, "/a")
+    histogram.observe(3, "/a")
+
+    assert registry.render().splitlines() == [
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{route="/a",le="0.1"} 2',
+        'latency_seconds_bucket{route="/a",le="1"} 3',
+        'latency_seconds_bucket{route="/a",le="+Inf"} 4',
+        'latency_seconds_sum{route="/a"} 3.65',
+        'latency_seconds_count{route="/a"} 4',
+    ]
+
+
+def test_counters_and_gauges_render_a_series_per_label_values() -> None:
+    registry = metrics.Registry()
+    counter = registry.counter("events_total", "Events", labelnames=("event",))
+    gauge = registry.gauge("queue_depth", "Queue")
+
+    counter.inc("Allocated")
+    counter.inc("Allocated", amount=2)
+    counter.inc('Odd"Name')
+    gauge.inc(amount=3)
+    gauge.dec()
+
+    rendered = registry.render().splitlines()
+    assert 'events_total{event="Allocated"} 3' in rendered
+    assert 'events_total{event="Odd\\"Name"} 1' in rendered
+    assert "queue_depth 2" in rendered
+
+
+def test_collected_metrics_are_rendered_after_the_registered_ones() -> None:
+    registry = metrics.Registry()
+    registry.counter("registered_total", "Registered").inc()
+    collected = metrics.Gauge("collected", "Collected")
+    collected.set(1.5)
+
+    rendered = registry.render(collectors=[lambda: [collected]]).splitlines()
+
+    assert rendered[2:] == ["registered_total 1", *collected.render()]
+    assert rendered[-1] == "collected 1.5"
+
+
+def test_names_are_registered_once() -> None:
+    registry = metrics.Registry()
+    registry.counter("events_total", "Events")
+
+    with pytest.raises(ValueError):
+        registry.gauge("events_total", "Events")
@@ -0,0 +1,65 @@
+from typing import List
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from structlog.testing import CapturingLogger
+
+from src.allocation.adapters import leak_detection
+from src.allocation.domain.service import unit_of_work
+from src.allocation.lib import middleware
+
+
+def make_app(session_factory: unit_of_work.SessionFactory) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(middleware_class=middleware.RequestContextMiddleware)
+    forgotten: List[Session] = []
+
+    @app.get("/leak")
+    def leak() -> None:
+        session = session_factory()
+        session.execute(text("SELECT 1"))
+        forgotten.append(session)
+
+    @app.get("/context")
+    def context() -> str:
+        import structlog
+
+        return structlog.contextvars.get_contextvars()["request_id"]
+
+    return app
+
+
+def test_binds_and_returns_the_request_id(
+    session_factory: unit_of_work.SessionFactory,
+) -> None:
+    client = TestClient(make_app(session_factory))
+
+    sent = client.get("/context", headers={"X-Request-ID": "abc"})
+    generated = client.get("/context")
+
+    assert sent.json() == sent.headers["X-Request-ID"] == "abc"
+    assert generated.json() == generated.headers["X-Request-ID"] != "abc"
+
+
+def test_logs_sessions_left_open_by_the_request(
+    session_factory: unit_of_work.SessionFactory,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    logger = CapturingLogger()
+    monkeypatch.setattr(leak_detection, "_LOGGER", logger)
+    detector = leak_detection.SessionLeakDetector(threshold=60)
+    app = make_app(session_factory)
+    app.state.session_leak_detector = detector
+    detector.install()
+
+    try:
+        TestClient(app).get("/leak", headers={"X-Request-ID": "leaky"})
+    finally:
+        detector.uninstall()
+
+    [call] = logger.calls
+    assert call.args == ("session_open_after_request",)
+    assert call.kwargs["opened_by_request"] == "leaky"
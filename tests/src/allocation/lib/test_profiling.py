@@ -0,0 +1,155 @@
+import pathlib
+import pstats
+from typing import Any, List
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.datastructures import Headers
+
+from src.allocation.lib import middleware, profiling, settings
+
+
+class FakeClock:
+    def __init__(self, now: float = 1_700_000_000.0) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_profiler(
+    tmp_path: pathlib.Path, clock: FakeClock, **overrides: Any
+) -> profiling.RequestProfiler:
+    return profiling.RequestProfiler(
+        profiling_settings=settings._ProfilingSettings(  # pyright: ignore
+            **{
+                "enabled": True,
+                "header_secret": "s3cret",
+                "output_dir": str(tmp_path),
+                **overrides,
+            }
+        ),
+        clock=clock,
+    )
+
+
+def signed(secret: str, clock: FakeClock) -> Headers:
+    return Headers({profiling.HEADER_NAME: profiling.sign(secret, int(clock.now))})
+
+
+def test_only_fresh_signatures_of_the_secret_are_valid() -> None:
+    value = profiling.sign("s3cret", timestamp=1000)
+
+    assert profiling.verify(value, "s3cret", max_age=60, now=1030)
+    assert not profiling.verify(value, "s3cret", max_age=60, now=1100)
+    assert not profiling.verify(value, "other", max_age=60, now=1030)
+    assert not profiling.verify("1000:forged", "s3cret", max_age=60, now=1030)
+    assert not profiling.verify("garbage", "s3cret", max_age=60, now=1030)
+
+
+def test_profiles_signed_requests_within_the_rate_limit(
+    tmp_path: pathlib.Path,
+) -> None:
+    clock = FakeClock()
+    profiler = make_profiler(tmp_path, clock, min_interval=10)
+
+    assert profiler.start(Headers({})) is None
+    assert profiler.start(signed("other", clock)) is None
+    profile = profiler.start(signed("s3cret", clock))
+    assert profile is not None
+    # One profile at a time
+    assert profiler.start(signed("s3cret", clock)) is None
+    profiler.stop(profile)
+    clock.now += 5
+    assert profiler.start(signed("s3cret", clock)) is None
+    clock.now += 5
+    later = profiler.start(signed("s3cret", clock))
+    assert later is not None
+    profiler.stop(later)
+
+    assert (profiler.profiled, profiler.throttled) == (2, 2)
+
+
+def test_samples_one_request_in_sample_every(tmp_path: pathlib.Path) -> None:
+    profiler = make_profiler(
+        tmp_path, FakeClock(), header_secret=None, sample_every=4, min_interval=0
+    )
+    picked: List[bool] = []
+    for _ in range(400):
+        profile = profiler.start(Headers({}))
+        picked.append(profile is not None)
+        if profile is not None:
+            profiler.stop(profile)
+
+    assert 50 < sum(picked) < 150
+
+
+@pytest.mark.parametrize(
+    "profiler_kind, suffix",
+    [("sampling", ".collapsed"), ("deterministic", ".pstats")],
+)
+def test_middleware_writes_the_profile_of_the_request(
+    tmp_path: pathlib.Path, profiler_kind: str, suffix: str
+) -> None:
+    clock = FakeClock()
+    app = FastAPI()
+    app.add_middleware(
+        middleware_class=middleware.ProfilingMiddleware,
+        profiler=make_profiler(tmp_path, clock, profiler=profiler_kind),
+    )
+    app.add_middleware(middleware_class=middleware.RequestContextMiddleware)
+
+    @app.get("/busy")
+    async def busy() -> int:
+        return sum(i * i for i in range(300_000))
+
+    client = TestClient(app)
+    client.get(
+        "/busy",
+        headers={
+            "X-Request-ID": "slow",
+            profiling.HEADER_NAME: profiling.sign("s3cret", int(clock.now)),
+        },
+    )
+    client.get("/busy", headers={"X-Request-ID": "unsigned"})
+
+    [path] = tmp_path.iterdir()
+    assert path.name.endswith(f"-slow{suffix}")
+    if suffix == ".pstats":
+        assert "busy" in {name for _, _, name in pstats.Stats(str(path)).stats}
+    else:
+        assert "busy (" in path.read_text()
+
+
+def test_profile_names_only_keep_safe_characters(tmp_path: pathlib.Path) -> None:
+    profiler = make_profiler(tmp_path / "profiles", FakeClock())
+    profile = profiler.start(signed("s3cret", FakeClock()))
+    assert profile is not None
+    profiler.stop(profile)
+
+    path = profiler.dump(profile, "../../etc/x")
+
+    assert path.parent == tmp_path / "profiles"
+    assert path.name.endswith("-etcx.collapsed")
+
+
+def test_a_failing_stop_releases_the_profiler(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    def broken_stop() -> None:
+        raise RuntimeError("Profiler already disabled")
+
+    profiler = make_profiler(tmp_path, FakeClock(), min_interval=0)
+    profile = profiler.start(signed("s3cret", FakeClock()))
+    assert profile is not None
+    working_stop = profile.stop
+    monkeypatch.setattr(profile, "stop", broken_stop)
+
+    with pytest.raises(RuntimeError):
+        profiler.stop(profile)
+    working_stop()
+
+    later = profiler.start(signed("s3cret", FakeClock()))
+    assert later is not None
+    profiler.stop(later)
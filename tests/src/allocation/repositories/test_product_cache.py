@@ -0,0 +1,182 @@
+from typing import Any, Generator, List
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from src.allocation import repositories
+from src.allocation.domain.model import aggregate
+from src.allocation.domain.service import unit_of_work
+
+
+@pytest.fixture
+def statements(in_memory_db: Engine) -> Generator[List[str], None, None]:
+    _statements: List[str] = []
+
+    def _record(*args: Any) -> None:
+        _statements.append(args[2])
+
+    event.listen(in_memory_db, "before_cursor_execute", _record)
+    yield _statements
+    event.remove(in_memory_db, "before_cursor_execute", _record)
+
+
+def make_product(sku: str) -> aggregate.Product:
+    return aggregate.Product(
+        sku=sku,
+        batches=[
+            aggregate.Batch(
+                id=f"{sku}-batch", sku=sku, purchased_quantity=100, eta=None
+            )
+        ],
+    )
+
+
+def make_persisted_product(sku: str) -> aggregate.Product:
+    product = make_product(sku)
+    product.mark_persisted()
+    return product
+
+
+async def add_product(
+    session_factory: unit_of_work.SessionFactory, product: aggregate.Product
+) -> None:
+    uow = unit_of_work.SqlAlchemyUnitOfWork(session_factory=session_factory)
+    async with uow:
+        await uow.products.add(product)
+        await uow.commit()
+
+
+async def allocate(
+    uow: unit_of_work.AbstractUnitOfWork, sku: str, order_id: str
+) -> aggregate.Product:
+    async with uow:
+        product = await uow.products.get(sku=sku)
+        assert product is not None
+        product.allocate(aggregate.OrderLine(order_id=order_id, sku=sku, qty=1))
+        await uow.products.add(product)
+        await uow.commit()
+    return product
+
+
+@pytest.mark.asyncio
+async def test_cached_product_is_validated_with_a_single_query(
+    session_factory: unit_of_work.SessionFactory, statements: List[str]
+) -> None:
+    cache = repositories.ProductCache(max_size=10, ttl=60)
+    await add_product(session_factory, make_product("HOT-LAMP"))
+    uow = unit_of_work.SqlAlchemyUnitOfWork(session_factory, product_cache=cache)
+    async with uow:
+        await uow.products.get(sku="HOT-LAMP")
+    statements.clear()
+
+    async with uow:
+        product = await uow.products.get(sku="HOT-LAMP")
+
+    assert product is not None
+    assert product.batches[0].id == "HOT-LAMP-batch"
+    assert len([s for s in statements if s.lstrip().startswith("SELECT")]) == 1
+    assert cache.statistics().hits == 1
+    assert cache.statistics().misses == 1
+
+
+@pytest.mark.asyncio
+async def test_committed_changes_replace_the_cached_product(
+    session_factory: unit_of_work.SessionFactory,
+) -> None:
+    cache = repositories.ProductCache(max_size=10, ttl=60)
+    await add_product(session_factory, make_product("HOT-LAMP"))
+    uow = unit_of_work.SqlAlchemyUnitOfWork(session_factory, product_cache=cache)
+
+    await allocate(uow, sku="HOT-LAMP", order_id="order1")
+    product = await allocate(uow, sku="HOT-LAMP", order_id="order2")
+
+    assert product.batches[0].allocated_quantity == 2
+    assert cache.statistics().hits == 1
+
+
+@pytest.mark.asyncio
+async def test_product_changed_by_another_worker_is_reloaded(
+    session_factory: unit_of_work.SessionFactory,
+) -> None:
+    cache = repositories.ProductCache(max_size=10, ttl=60)
+    await add_product(session_factory, make_product("HOT-LAMP"))
+    await allocate(
+        unit_of_work.SqlAlchemyUnitOfWork(session_factory, product_cache=cache),
+        sku="HOT-LAMP",
+        order_id="order1",
+    )
+
+    await allocate(
+        unit_of_work.SqlAlchemyUnitOfWork(
+            session_factory, product_cache=repositories.ProductCache(10, 60)
+        ),
+        sku="HOT-LAMP",
+        order_id="order2",
+    )
+    uow = unit_of_work.SqlAlchemyUnitOfWork(session_factory, product_cache=cache)
+    async with uow:
+        product = await uow.products.get(sku="HOT-LAMP")
+
+    assert product is not None
+    assert product.batches[0].allocated_quantity == 2
+    assert cache.statistics().invalidations == 1
+
+
+@pytest.mark.asyncio
+async def test_uncommitted_changes_invalidate_the_cached_product(
+    session_factory: unit_of_work.SessionFactory,
+) -> None:
+    cache = repositories.ProductCache(max_size=10, ttl=60)
+    await add_product(session_factory, make_product("HOT-LAMP"))
+    uow = unit_of_work.SqlAlchemyUnitOfWork(session_factory, product_cache=cache)
+
+    async with uow:
+        product = await uow.products.get(sku="HOT-LAMP")
+        assert product is not None
+        product.allocate(aggregate.OrderLine(order_id="o1", sku="HOT-LAMP", qty=1))
+        await uow.products.add(product)
+
+    assert cache.cached_version("HOT-LAMP") is None
+    async with uow:
+        product = await uow.products.get(sku="HOT-LAMP")
+    assert product is not None
+    assert product.batches[0].allocated_quantity == 0
+
+
+def test_cached_products_are_handed_out_as_copies() -> None:
+    cache = repositories.ProductCache(max_size=10, ttl=60)
+    cache.put(make_persisted_product("HOT-LAMP"))
+    product = cache.get("HOT-LAMP", version=0)
+    assert product is not None
+
+    product.allocate(aggregate.OrderLine(order_id="o1", sku="HOT-LAMP", qty=1))
+
+    cached = cache.get("HOT-LAMP", version=0)
+    assert cached is not None
+    assert cached.batches[0].allocated_quantity == 0
+
+
+def test_evicts_the_least_recently_used_product() -> None:
+    cache = repositories.ProductCache(max_size=2, ttl=60)
+    for sku in ("LAMP-1", "LAMP-2"):
+        cache.put(make_persisted_product(sku))
+    cache.get("LAMP-1", version=0)
+
+    cache.put(make_persisted_product("LAMP-3"))
+
+    assert cache.cached_version("LAMP-1") == 0
+    assert cache.cached_version("LAMP-2") is None
+    assert cache.statistics().evictions == 1
+
+
+def test_evicts_products_past_their_ttl() -> None:
+    now = [0.0]
+    cache = repositories.ProductCache(max_size=2, ttl=5, clock=lambda: now[0])
+    cache.put(make_persisted_product("HOT-LAMP"))
+
+    now[0] = 5.0
+
+    assert cache.get("HOT-LAMP", version=0) is None
+    assert cache.statistics().evictions == 1
+    assert cache.statistics().misses == 1
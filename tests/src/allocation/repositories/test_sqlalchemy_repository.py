@@ -0,0 +1,252 @@
+from typing import Any, Generator, List
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from src.allocation import repositories
+from src.allocation.domain.model import aggregate
+from src.allocation.domain.service import unit_of_work
+
+
+@pytest.fixture
+def statements(in_memory_db: Engine) -> Generator[List[str], None, None]:
+    _statements: List[str] = []
+
+    def _record(*args: Any) -> None:
+        _statements.append(args[2])
+
+    event.listen(in_memory_db, "before_cursor_execute", _record)
+    yield _statements
+    event.remove(in_memory_db, "before_cursor_execute", _record)
+
+
+async def add_product_with_batches(
+    session: Session, sku: str, batches_count: int
+) -> None:
+    product = aggregate.Product(
+        sku=sku,
+        batches=[
+            aggregate.Batch(
+                id=f"{sku}-batch{i}", sku=sku, purchased_quantity=100, eta=None
+            )
+            for i in range(batches_count)
+        ],
+    )
+    for i, batch in enumerate(product.batches):
+        batch.allocate(aggregate.OrderLine(order_id=f"order{i}", sku=sku, qty=1))
+    await repositories.SqlAlchemyRepository(session=session).add(product)
+    session.commit()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("batches_count", [1, 5, 25])
+async def test_get_loads_the_aggregate_in_constant_queries(
+    session_factory: unit_of_work.SessionFactory,
+    statements: List[str],
+    batches_count: int,
+) -> None:
+    await add_product_with_batches(
+        session=session_factory(), sku="SLEEK-DESK", batches_count=batches_count
+    )
+    statements.clear()
+
+    repo = repositories.SqlAlchemyRepository(session=session_factory())
+    product = await repo.get(sku="SLEEK-DESK")
+
+    assert product is not None
+    assert len(product.batches) == batches_count
+    assert all(batch.allocated_quantity == 1 for batch in product.batches)
+    assert len(statements) == 3
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("batches_count", [1, 5, 25])
+async def test_get_by_batchref_loads_the_aggregate_in_constant_queries(
+    session_factory: unit_of_work.SessionFactory,
+    statements: List[str],
+    batches_count: int,
+) -> None:
+    await add_product_with_batches(
+        session=session_factory(), sku="SLEEK-DESK", batches_count=batches_count
+    )
+    statements.clear()
+
+    repo = repositories.SqlAlchemyRepository(session=session_factory())
+    product = await repo.get_by_batchref(ref="SLEEK-DESK-batch0")
+
+    assert product is not None
+    assert len(product.batches) == batches_count
+    assert len(statements) == 3
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("batches_count", [1, 5, 25])
+async def test_add_writes_only_the_changed_rows(
+    session_factory: unit_of_work.SessionFactory,
+    statements: List[str],
+    batches_count: int,
+) -> None:
+    await add_product_with_batches(
+        session=session_factory(), sku="SLEEK-DESK", batches_count=batches_count
+    )
+    session = session_factory()
+    repo = repositories.SqlAlchemyRepository(session=session)
+    product = await repo.get(sku="SLEEK-DESK")
+    assert product is not None
+    statements.clear()
+
+    product.allocate(aggregate.OrderLine(order_id="new", sku="SLEEK-DESK", qty=1))
+    await repo.add(product)
+
+    assert [statement.split()[0] for statement in statements] == [
+        "UPDATE",
+        "INSERT",
+        "INSERT",
+    ]
+    assert not product.pending_changes().is_empty
+    session.commit()
+    repo.committed()
+    assert product.pending_changes().is_empty
+
+
+@pytest.mark.asyncio
+async def test_rolled_back_changes_are_written_again(
+    session_factory: unit_of_work.SessionFactory,
+) -> None:
+    await add_product_with_batches(
+        session=session_factory(), sku="SLEEK-DESK", batches_count=1
+    )
+    session = session_factory()
+    repo = repositories.SqlAlchemyRepository(session=session)
+    product = await repo.get(sku="SLEEK-DESK")
+    assert product is not None
+    product.allocate(aggregate.OrderLine(order_id="new", sku="SLEEK-DESK", qty=1))
+    await repo.add(product)
+    session.rollback()
+    repo.rolled_back()
+
+    retry = repositories.SqlAlchemyRepository(session=session_factory())
+    await retry.add(product)
+    retry.session.commit()
+    retry.committed()
+
+    reloaded = await repositories.SqlAlchemyRepository(
+        session=session_factory()
+    ).get(sku="SLEEK-DESK")
+    assert reloaded is not None
+    assert reloaded.version_number == 1
+    assert reloaded.batches[0].allocated_quantity == 2
+
+
+@pytest.mark.asyncio
+async def test_add_deletes_the_deallocated_rows(
+    session_factory: unit_of_work.SessionFactory,
+) -> None:
+    await add_product_with_batches(
+        session=session_factory(), sku="SLEEK-DESK", batches_count=2
+    )
+    session = session_factory()
+    repo = repositories.SqlAlchemyRepository(session=session)
+    product = await repo.get(sku="SLEEK-DESK")
+    assert product is not None
+
+    product.change_batch_quantity(ref="SLEEK-DESK-batch0", qty=0)
+    await repo.add(product)
+    session.commit()
+
+    reloaded = await repositories.SqlAlchemyRepository(
+        session=session_factory()
+    ).get(sku="SLEEK-DESK")
+    assert reloaded is not None
+    assert [
+        (batch.id, batch.purchased_quantity, batch.allocated_quantity)
+        for batch in reloaded.batches
+    ] == [("SLEEK-DESK-batch0", 0, 0), ("SLEEK-DESK-batch1", 100, 1)]
+
+
+@pytest.mark.asyncio
+async def test_add_rejects_a_product_changed_since_it_was_loaded(
+    session_factory: unit_of_work.SessionFactory,
+) -> None:
+    await add_product_with_batches(
+        session=session_factory(), sku="SLEEK-DESK", batches_count=1
+    )
+    first_repo = repositories.SqlAlchemyRepository(session=session_factory())
+    second_repo = repositories.SqlAlchemyRepository(session=session_factory())
+    first = await first_repo.get(sku="SLEEK-DESK")
+    second = await second_repo.get(sku="SLEEK-DESK")
+    assert first is not None and second is not None
+
+    first.allocate(aggregate.OrderLine(order_id="o1", sku="SLEEK-DESK", qty=1))
+    await first_repo.add(first)
+    first_repo.session.commit()
+
+    second.allocate(aggregate.OrderLine(order_id="o2", sku="SLEEK-DESK", qty=1))
+    with pytest.raises(repositories.ConcurrencyConflictException):
+        await second_repo.add(second)
+
+
+@pytest.mark.asyncio
+async def test_repeated_allocation_is_answered_without_writes(
+    session_factory: unit_of_work.SessionFactory,
+    statements: List[str],
+) -> None:
+    from src.allocation.domain.model import events
+    from src.allocation.domain.service import messagebus
+
+    await add_product_with_batches(
+        session=session_factory(), sku="SLEEK-DESK", batches_count=5
+    )
+    event = events.AllocationRequired(order_id="order0", sku="SLEEK-DESK", qty=1)
+    statements.clear()
+
+    results = await messagebus.handle(
+        event=event,
+        uow=unit_of_work.SqlAlchemyUnitOfWork(session_factory=session_factory),
+    )
+
+    assert results == ["SLEEK-DESK-batch0"]
+    assert [statement.split()[0] for statement in statements] == ["SELECT"]
+
+
+@pytest.mark.asyncio
+async def test_order_lines_are_unique_per_order_and_sku(
+    session_factory: unit_of_work.SessionFactory,
+) -> None:
+    from sqlalchemy.exc import IntegrityError
+
+    await add_product_with_batches(
+        session=session_factory(), sku="SLEEK-DESK", batches_count=2
+    )
+    repo = repositories.SqlAlchemyRepository(session=session_factory())
+    product = await repo.get(sku="SLEEK-DESK")
+    assert product is not None
+
+    product.batches[1].allocate(
+        aggregate.OrderLine(order_id="order0", sku="SLEEK-DESK", qty=2)
+    )
+    with pytest.raises(IntegrityError):
+        await repo.add(product)
+
+
+@pytest.mark.asyncio
+async def test_allocations_view_is_read_with_a_single_query(
+    session: Session, statements: List[str]
+) -> None:
+    from src.allocation.repositories import allocations_view
+
+    view = repositories.SqlAlchemyAllocationsView(session=session)
+    await view.add(order_id="order1", sku="SLEEK-DESK", batch_ref="batch1")
+    await view.add(order_id="order1", sku="ROUND-DESK", batch_ref="batch1")
+    await view.add(order_id="order1", sku="SLEEK-DESK", batch_ref="batch2")
+    await view.remove(order_id="order1", sku="ROUND-DESK", batch_ref="batch2")
+    session.commit()
+    statements.clear()
+
+    assert allocations_view.get_allocations(session=session, order_id="order1") == [
+        ("ROUND-DESK", "batch1"),
+        ("SLEEK-DESK", "batch2"),
+    ]
+    assert len([s for s in statements if s.lstrip().startswith("SELECT")]) == 1
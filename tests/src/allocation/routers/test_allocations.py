@@ -0,0 +1,41 @@
+from typing import Any, Dict
+
+import httpx
+
+from tests import random_refs
+from tests.src.allocation.routers.test_entrypoints import post_to_add_batch
+
+
+def test_allocated_order_is_served_from_the_read_model(client: httpx.Client) -> None:
+    sku, othersku = random_refs.random_sku(), random_refs.random_sku("other")
+    batch, otherbatch = random_refs.random_batchref(
+        "1"
+    ), random_refs.random_batchref("2")
+    orderid = random_refs.random_orderid()
+    post_to_add_batch(client=client, ref=batch, sku=sku, qty=100, eta=None)
+    post_to_add_batch(client=client, ref=otherbatch, sku=othersku, qty=100, eta=None)
+    for line_sku in (sku, othersku):
+        result = client.post(
+            "/api/batches/allocate/",
+            json={"order_id": orderid, "sku": line_sku, "qty": 3},
+        )
+        assert result.status_code == 201
+
+    result = client.get(f"/api/allocations/{orderid}")
+    result_data: Dict[str, Any] = result.json()
+
+    assert result.status_code == 200
+    assert result_data["order_id"] == orderid
+    assert sorted(result_data["allocations"], key=lambda a: a["sku"]) == sorted(
+        [
+            {"sku": sku, "batch_ref": batch},
+            {"sku": othersku, "batch_ref": otherbatch},
+        ],
+        key=lambda a: a["sku"],
+    )
+
+
+def test_unknown_order_returns_404(client: httpx.Client) -> None:
+    result = client.get(f"/api/allocations/{random_refs.random_orderid()}")
+
+    assert result.status_code == 404
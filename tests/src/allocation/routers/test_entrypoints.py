@@ -1,8 +1,10 @@
 from typing import Any, Dict, Optional
 
 import httpx
+import pytest
 
 from tests import random_refs
+from tests.server_timing import statements_run
 
 
 def post_to_add_batch(
@@ -43,3 +45,136 @@ def test_unhappy_path_returns_400_and_error_message(client: httpx.Client) -> Non
 
     assert result.status_code == 400
     assert result_data.get("detail") == f"Invalid sku {unknown_sku}"
+
+
+def test_bulk_allocation_returns_a_result_per_line(client: httpx.Client) -> None:
+    sku, othersku = random_refs.random_sku(), random_refs.random_sku("other")
+    unknown_sku = random_refs.random_sku("unknown")
+    batch = random_refs.random_batchref("1")
+    otherbatch = random_refs.random_batchref("2")
+    post_to_add_batch(client=client, ref=batch, sku=sku, qty=10, eta=None)
+    post_to_add_batch(client=client, ref=otherbatch, sku=othersku, qty=10, eta=None)
+
+    orderid = random_refs.random_orderid()
+    lines = [
+        {"order_id": orderid, "sku": sku, "qty": 6},
+        {"order_id": orderid, "sku": othersku, "qty": 3},
+        {"order_id": random_refs.random_orderid(), "sku": sku, "qty": 6},
+        {"order_id": orderid, "sku": unknown_sku, "qty": 1},
+    ]
+    result = client.post("/api/batches/allocate/bulk", json={"lines": lines})
+    result_data: Dict[str, Any] = result.json()
+
+    assert result.status_code == 201
+    assert [(r["batch_ref"], r["status"]) for r in result_data["results"]] == [
+        (batch, "allocated"),
+        (otherbatch, "allocated"),
+        (None, "out_of_stock"),
+        (None, "invalid_sku"),
+    ]
+
+
+def test_bulk_allocation_reports_a_conflict_on_the_lines_of_its_sku(
+    client: httpx.Client, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    from src.allocation import repositories
+    from src.allocation.domain.service import messagebus
+
+    sku, busysku = random_refs.random_sku(), random_refs.random_sku("busy")
+    batch, busybatch = random_refs.random_batchref("1"), random_refs.random_batchref(
+        "2"
+    )
+    post_to_add_batch(client=client, ref=batch, sku=sku, qty=10, eta=None)
+    post_to_add_batch(client=client, ref=busybatch, sku=busysku, qty=10, eta=None)
+
+    allocate_many = messagebus.handlers.allocate_many
+
+    async def conflicting_allocate_many(**kwargs: Any) -> Any:
+        if kwargs["event_list"][0].sku == busysku:
+            raise repositories.ConcurrencyConflictException(busysku)
+        return await allocate_many(**kwargs)
+
+    monkeypatch.setattr(messagebus._SETTINGS.messagebus, "conflict_retries", 0)
+    monkeypatch.setattr(
+        messagebus.handlers, "allocate_many", conflicting_allocate_many
+    )
+
+    orderid = random_refs.random_orderid()
+    lines = [
+        {"order_id": orderid, "sku": busysku, "qty": 2},
+        {"order_id": orderid, "sku": sku, "qty": 3},
+    ]
+    result = client.post("/api/batches/allocate/bulk", json={"lines": lines})
+    result_data: Dict[str, Any] = result.json()
+
+    assert result.status_code == 201
+    assert [(r["batch_ref"], r["status"]) for r in result_data["results"]] == [
+        (None, "conflict"),
+        (batch, "allocated"),
+    ]
+
+
+def test_group_commit_allocates_through_the_group_of_the_sku(
+    client: httpx.Client, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    from src.allocation.routers import entrypoints
+
+    monkeypatch.setattr(entrypoints._SETTINGS.messagebus, "group_commit", True)
+    sku, batch = random_refs.random_sku(), random_refs.random_batchref()
+    post_to_add_batch(client=client, ref=batch, sku=sku, qty=10, eta=None)
+
+    data = {"order_id": random_refs.random_orderid(), "sku": sku, "qty": 3}
+    result = client.post("/api/batches/allocate/", json=data)
+    unknown = {"order_id": random_refs.random_orderid(), "sku": "nope", "qty": 1}
+    unknown_result = client.post("/api/batches/allocate/", json=unknown)
+
+    assert result.status_code == 201
+    assert result.json().get("batch_ref") == batch
+    assert unknown_result.status_code == 400
+
+
+def test_batch_quantity_change_reallocates_the_orders(client: httpx.Client) -> None:
+    sku = random_refs.random_sku()
+    batch, laterbatch = random_refs.random_batchref(
+        "1"
+    ), random_refs.random_batchref("2")
+    post_to_add_batch(client=client, ref=batch, sku=sku, qty=10, eta=None)
+    post_to_add_batch(
+        client=client, ref=laterbatch, sku=sku, qty=10, eta="2011-01-02"
+    )
+    orderid = random_refs.random_orderid()
+    data = {"order_id": orderid, "sku": sku, "qty": 8}
+    assert client.post("/api/batches/allocate/", json=data).status_code == 201
+
+    result = client.put(f"/api/batches/{batch}/quantity", json={"qty": 5})
+    missing = client.put("/api/batches/missing-batch/quantity", json={"qty": 5})
+
+    assert result.status_code == 204
+    assert missing.status_code == 404
+    allocations = client.get(f"/api/allocations/{orderid}").json()["allocations"]
+    assert allocations == [{"sku": sku, "batch_ref": laterbatch}]
+
+
+def test_allocate_stays_within_its_query_budget(
+    client: httpx.Client, statement_tracker: None
+) -> None:
+    sku, batch = random_refs.random_sku(), random_refs.random_batchref()
+    post_to_add_batch(client=client, ref=batch, sku=sku, qty=100, eta=None)
+
+    statements = [
+        statements_run(
+            client.post(
+                "/api/batches/allocate/",
+                json={
+                    "order_id": random_refs.random_orderid(),
+                    "sku": sku,
+                    "qty": 1,
+                },
+            )
+        )
+        for _ in range(5)
+    ]
+
+    # Constant, however many lines the batch already holds
+    assert len(set(statements)) == 1
+    assert statements[0] <= 10
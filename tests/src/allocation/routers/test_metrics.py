@@ -0,0 +1,73 @@
+from types import SimpleNamespace
+from typing import Any
+
+import httpx
+import pytest
+
+from src.allocation.domain.service import scheduler
+from src.allocation.lib import metrics
+from src.allocation.routers import metrics as metrics_router
+from tests import random_refs
+from tests.src.allocation.routers.test_entrypoints import post_to_add_batch
+
+
+def test_metrics_expose_requests_handlers_and_units_of_work(
+    client: httpx.Client,
+) -> None:
+    sku, batch = random_refs.random_sku(), random_refs.random_batchref()
+    post_to_add_batch(client=client, ref=batch, sku=sku, qty=10, eta=None)
+    allocated = metrics.MESSAGEBUS_EVENTS.value("Allocated")
+    client.post(
+        "/api/batches/allocate/",
+        json={"order_id": random_refs.random_orderid(), "sku": sku, "qty": 3},
+    )
+    client.put(f"/api/batches/{batch}/quantity", json={"qty": 20})
+
+    result = client.get("/metrics")
+
+    assert result.status_code == 200
+    assert result.headers["content-type"].startswith(metrics.CONTENT_TYPE)
+    assert metrics.MESSAGEBUS_EVENTS.value("Allocated") == allocated + 1
+    assert metrics.MESSAGEBUS_QUEUE_DEPTH.value() == 0
+    assert (
+        'allocation_http_request_duration_seconds_count{method="PUT",'
+        'route="/api/batches/{reference}/quantity",status="204"}'
+    ) in result.text
+    assert (
+        'allocation_messagebus_handler_duration_seconds_count{handler="allocate"}'
+        in (result.text)
+    )
+    assert (
+        'allocation_uow_commit_duration_seconds_count{unit_of_work="SqlAlchemyUnitOfWork"}'
+        in result.text
+    )
+
+
+@pytest.mark.asyncio
+async def test_metrics_expose_the_queues_of_the_busiest_keys(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    subject = scheduler.KeyedScheduler()
+    monkeypatch.setattr(scheduler, "get_scheduler", lambda: subject)
+    request: Any = SimpleNamespace(app=SimpleNamespace(state=SimpleNamespace()))
+
+    async with subject.serialize("HOT-LAMP"):
+        result = metrics_router.get_metrics(request)
+
+    assert b'allocation_scheduler_key_queue_depth{key="HOT-LAMP"} 1' in result.body
+    assert b"allocation_scheduler_active_keys 1" in result.body
+
+
+def test_metrics_expose_the_pool_of_each_engine(tmpdir: str) -> None:
+    from tests.src.allocation.adapters.test_database import make_database
+
+    db = make_database(tmpdir, pool_size=1, use_async_driver=True)
+    request: Any = SimpleNamespace(app=SimpleNamespace(state=SimpleNamespace()))
+    request.app.state.database = db
+
+    with db.engine.connect():
+        result = metrics_router.get_metrics(request)
+    db.engine.dispose()
+
+    assert b'allocation_db_pool_checked_out{engine="sync"} 1' in result.body
+    assert b'engine="async"' not in result.body